@@ -0,0 +1,432 @@
+import os
+import re
+import sys
+import json
+import html
+import time
+import shutil
+import sqlite3
+import hashlib
+import zipfile
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+from urllib.parse import unquote
+
+from deck import TIME_FORMAT, open_deck
+from media import IMAGE, MEDIA_KINDS, MEDIA_PATTERN, MediaStore, media_reference
+from schedulers import SRS_KEYS, MAX_MEM_LEVEL, get_srs_interval
+
+# notes and cards written to an exported collection at a time
+BATCH_SIZE = 5000
+
+# report progress every this many cards on large exports
+PROGRESS_INTERVAL = 100000
+
+# bytes copied out of a package at a time
+CHUNK_SIZE = 1 << 20
+
+# collections in the older SQLite layout, which Anki writes when exporting
+# with "Support older Anki versions", in order of preference
+COLLECTION_NAMES = ("collection.anki21", "collection.anki2")
+
+# newer Anki versions write a compressed collection in another layout
+NEWER_COLLECTION_NAME = "collection.anki21b"
+
+# separator of a note's fields
+FIELD_SEPARATOR = "\x1f"
+
+# Anki note types of cloze deletions
+CLOZE_MODEL = 1
+MISSING_MODEL = (0, [])
+
+# Anki card types
+NEW_CARD = 0
+REVIEW_CARD = 2
+RELEARNING_CARD = 3
+
+# days of exported collections are counted from this day
+COLLECTION_CREATED = datetime(2000, 1, 1)
+
+IMAGE_TAG_PATTERN = re.compile(r"""<img[^>]*?\bsrc\s*=\s*["']?([^"'>]+)["']?[^>]*>""", re.IGNORECASE)
+LINE_BREAK_PATTERN = re.compile(r"<br\s*/?>|</?(?:div|p|li|tr|h\d)\b[^>]*>", re.IGNORECASE)
+TAG_PATTERN = re.compile(r"<[^>]*>")
+ANKI_SOUND_PATTERN = re.compile(r"\[sound:([^\]]+)\]")
+CLOZE_PATTERN = re.compile(r"\{\{c\d+::(.*?)(?:::(.*?))?\}\}", re.DOTALL)
+
+def interval_to_mem_level(days):
+    """
+    Return the highest Fibonacci mem level whose interval is at most an
+    Anki interval, so a card is never due later than Anki would show it.
+    """
+
+    srs_key = SRS_KEYS["Fibonacci"]
+    return max(level for level in range(MAX_MEM_LEVEL + 1) if get_srs_interval(srs_key, level) <= max(days, 0))
+
+def html_to_text(field, media_names):
+    """
+    Convert the HTML of an Anki field to a card's text, with its images
+    and sounds as references to the stored media. media_names maps the
+    package's file names to their names in the media store.
+    """
+
+    def reference(file_name, kind):
+        # newer Anki versions escape spaces and other characters in src
+        name = media_names.get(file_name) or media_names.get(unquote(file_name))
+        if name is None:
+            return "[{}:{}]".format(kind, file_name)
+        return media_reference(name)
+
+    text = IMAGE_TAG_PATTERN.sub(lambda m: " " + reference(m.group(1), "image") + " ", field)
+    text = ANKI_SOUND_PATTERN.sub(lambda m: " " + reference(m.group(1), "sound") + " ", text)
+    text = LINE_BREAK_PATTERN.sub("\n", text)
+    text = html.unescape(TAG_PATTERN.sub("", text)).replace("\xa0", " ")
+
+    lines = (" ".join(line.split()) for line in text.split("\n"))
+    return "\n".join(line for line in lines if line)
+
+def cloze_sides(field):
+    """ return the question and answer of a cloze field, every deletion hidden or shown """
+
+    question = CLOZE_PATTERN.sub(lambda m: "[" + (m.group(2) or "...") + "]", field)
+    answer = CLOZE_PATTERN.sub(lambda m: m.group(1), field)
+    return question, answer
+
+def read_models(conn):
+    """ return the note types of a collection, id -> (type, field names) """
+
+    models = json.loads(conn.execute("SELECT models FROM col").fetchone()[0])
+
+    return {
+        int(model_id): (model.get('type', 0), [field['name'] for field in sorted(model['flds'], key=lambda f: f['ord'])])
+        for model_id, model in models.items()
+    }
+
+def store_package_media(package, store):
+    """
+    Copy the media of a package into the media store, one file at a time,
+    and return the map of their file names in the package to their names
+    in the store. Files that aren't images or sounds are skipped.
+    """
+
+    try:
+        with package.open("media") as f:
+            members = json.load(f)
+    except KeyError:
+        return {}
+
+    media_names = {}
+    for member, file_name in members.items():
+        extension = os.path.splitext(file_name)[1].lower()
+        if extension not in MEDIA_KINDS:
+            continue
+
+        try:
+            with package.open(member) as f:
+                media_names[file_name] = store.add_stream(f, extension)
+        except KeyError:
+            # listed, but left out of the package
+            continue
+
+    return media_names
+
+def note_to_row(model, fields, tags, card, media_names, created):
+    """ return the importer row of an Anki note, and of the review state of its first card """
+
+    model_type, field_names = model
+    fields = [html_to_text(field, media_names) for field in fields]
+    field_names = field_names + ["Field {}".format(i + 1) for i in range(len(field_names), len(fields))]
+
+    if model_type == CLOZE_MODEL:
+        front, back = cloze_sides(fields[0])
+        extra = list(zip(field_names[1:], fields[1:]))
+    else:
+        front = fields[0]
+        back = fields[1] if len(fields) > 1 else ""
+        extra = list(zip(field_names[2:], fields[2:]))
+
+    # fields beyond the front and back, and the tags, are kept in the notes
+    notes = [value if name == "Notes" else name + ": " + value for name, value in extra if value]
+    if tags.strip():
+        notes.append("Tags: " + " ".join(tags.split()))
+
+    row = {'front': front, 'back': back, 'notes': "\n".join(notes)}
+
+    card_type, due, interval, last_review_ms = card
+    if card_type is None or card_type == NEW_CARD:
+        return row
+
+    # the time of the last answer is in the review log, and for review
+    # cards exported without it, it is their due day less their interval
+    if last_review_ms is not None:
+        row['last_review'] = datetime.fromtimestamp(last_review_ms / 1000).strftime(TIME_FORMAT)
+    elif card_type in (REVIEW_CARD, RELEARNING_CARD) and interval > 0:
+        row['last_review'] = (created + timedelta(days=due - interval)).strftime(TIME_FORMAT)
+
+    if card_type in (REVIEW_CARD, RELEARNING_CARD):
+        row['mem_level'] = interval_to_mem_level(interval)
+
+    return row
+
+def read_apkg_rows(file_name, store=None):
+    """
+    Yield (note number, row dict) pairs for importer.import_cards from an
+    Anki package, one per note, taking the review state of the note's
+    first card. The media are stored first, then the notes are read from
+    a copy of the collection one row at a time, so neither the package
+    nor the collection is ever held in memory.
+    """
+
+    store = store or MediaStore()
+
+    with zipfile.ZipFile(file_name) as package, tempfile.TemporaryDirectory() as tmp_directory:
+        names = set(package.namelist())
+        collection_name = next((name for name in COLLECTION_NAMES if name in names), None)
+
+        # the collection.anki2 of a newer package only holds a note asking
+        # to update Anki
+        if NEWER_COLLECTION_NAME in names and collection_name != "collection.anki21":
+            raise ValueError(file_name + " was exported by a newer version of Anki, export it again with "
+                             "\"Support older Anki versions\" checked")
+        if collection_name is None:
+            raise ValueError(file_name + " is not an Anki package")
+
+        # SQLite can only open a file, copy the collection out of the zip
+        collection_file_name = os.path.join(tmp_directory, "collection.sqlite")
+        with package.open(collection_name) as f, open(collection_file_name, "wb") as out:
+            shutil.copyfileobj(f, out, CHUNK_SIZE)
+
+        media_names = store_package_media(package, store)
+
+        conn = sqlite3.connect(collection_file_name)
+        try:
+            models = read_models(conn)
+            created = datetime.fromtimestamp(conn.execute("SELECT crt FROM col").fetchone()[0])
+
+            rows = conn.execute(
+                "SELECT n.mid, n.flds, n.tags, c.type, c.due, c.ivl,"
+                " (SELECT MAX(r.id) FROM revlog r WHERE r.cid = c.id)"
+                " FROM notes n LEFT JOIN cards c"
+                " ON c.id = (SELECT id FROM cards WHERE nid = n.id ORDER BY ord LIMIT 1)"
+                " ORDER BY n.id"
+            )
+            for note_number, (model_id, fields, tags, *card) in enumerate(rows, 1):
+                # a note whose note type is gone is read as a basic note
+                model = models.get(model_id, MISSING_MODEL)
+                yield note_number, note_to_row(model, fields.split(FIELD_SEPARATOR), tags, card, media_names, created)
+        finally:
+            conn.close()
+
+COLLECTION_SCHEMA = """
+CREATE TABLE col (
+    id integer PRIMARY KEY, crt integer NOT NULL, mod integer NOT NULL, scm integer NOT NULL,
+    ver integer NOT NULL, dty integer NOT NULL, usn integer NOT NULL, ls integer NOT NULL,
+    conf text NOT NULL, models text NOT NULL, decks text NOT NULL, dconf text NOT NULL, tags text NOT NULL
+);
+CREATE TABLE notes (
+    id integer PRIMARY KEY, guid text NOT NULL, mid integer NOT NULL, mod integer NOT NULL,
+    usn integer NOT NULL, tags text NOT NULL, flds text NOT NULL, sfld integer NOT NULL,
+    csum integer NOT NULL, flags integer NOT NULL, data text NOT NULL
+);
+CREATE TABLE cards (
+    id integer PRIMARY KEY, nid integer NOT NULL, did integer NOT NULL, ord integer NOT NULL,
+    mod integer NOT NULL, usn integer NOT NULL, type integer NOT NULL, queue integer NOT NULL,
+    due integer NOT NULL, ivl integer NOT NULL, factor integer NOT NULL, reps integer NOT NULL,
+    lapses integer NOT NULL, left integer NOT NULL, odue integer NOT NULL, odid integer NOT NULL,
+    flags integer NOT NULL, data text NOT NULL
+);
+CREATE TABLE revlog (
+    id integer PRIMARY KEY, cid integer NOT NULL, usn integer NOT NULL, ease integer NOT NULL,
+    ivl integer NOT NULL, lastIvl integer NOT NULL, factor integer NOT NULL, time integer NOT NULL,
+    type integer NOT NULL
+);
+CREATE TABLE graves (usn integer NOT NULL, oid integer NOT NULL, type integer NOT NULL);
+CREATE INDEX ix_notes_usn ON notes (usn);
+CREATE INDEX ix_cards_usn ON cards (usn);
+CREATE INDEX ix_revlog_usn ON revlog (usn);
+CREATE INDEX ix_cards_nid ON cards (nid);
+CREATE INDEX ix_cards_sched ON cards (did, queue, due);
+CREATE INDEX ix_revlog_cid ON revlog (cid);
+CREATE INDEX ix_notes_csum ON notes (csum);
+"""
+
+# the deck options of exported decks, Anki's defaults
+DECK_OPTIONS = {
+    "id": 1, "name": "Default", "mod": 0, "usn": 0, "maxTaken": 60, "autoplay": True, "timer": 0,
+    "replayq": True, "dyn": False,
+    "new": {"delays": [1, 10], "ints": [1, 4, 7], "initialFactor": 2500, "order": 1, "perDay": 20,
+            "bury": False, "separate": True},
+    "rev": {"perDay": 200, "ease4": 1.3, "fuzz": 0.05, "maxIvl": 36500, "ivlFct": 1, "bury": False,
+            "hardFactor": 1.2, "minSpace": 1},
+    "lapse": {"delays": [10], "mult": 0, "minInt": 1, "leechFails": 8, "leechAction": 0},
+}
+
+def new_collection(file_name, deck_name, deck_id, model_id, now):
+    """ create an empty Anki collection with a deck and a note type for the cards """
+
+    created = int(COLLECTION_CREATED.timestamp())
+    model = {
+        "id": model_id, "name": "Mnemosyne", "type": 0, "mod": now, "usn": -1, "sortf": 0, "did": deck_id,
+        "tmpls": [{
+            "name": "Card 1", "ord": 0, "qfmt": "{{Front}}",
+            "afmt": "{{FrontSide}}<hr id=answer>{{Back}}<br><br>{{Notes}}",
+            "did": None, "bqfmt": "", "bafmt": "",
+        }],
+        "flds": [
+            {"name": name, "ord": i, "sticky": False, "rtl": False, "font": "Arial", "size": 20, "media": []}
+            for i, name in enumerate(("Front", "Back", "Notes"))
+        ],
+        "css": ".card { font-family: arial; font-size: 20px; text-align: center; }",
+        "latexPre": "\\documentclass[12pt]{article}\n\\begin{document}\n", "latexPost": "\\end{document}",
+        "tags": [], "vers": [], "req": [[0, "any", [0]]],
+    }
+    deck = {
+        "id": deck_id, "name": deck_name, "mod": now, "usn": -1, "desc": "", "dyn": 0, "conf": 1,
+        "collapsed": False, "extendNew": 10, "extendRev": 50,
+        "newToday": [0, 0], "revToday": [0, 0], "lrnToday": [0, 0], "timeToday": [0, 0],
+    }
+    default_deck = dict(deck, id=1, name="Default")
+    conf = {"activeDecks": [1], "curDeck": 1, "newSpread": 0, "collapseTime": 1200, "timeLim": 0,
+            "estTimes": True, "dueCounts": True, "curModel": model_id, "nextPos": 1, "sortType": "noteFld",
+            "sortBackwards": False}
+
+    conn = sqlite3.connect(file_name)
+    conn.executescript(COLLECTION_SCHEMA)
+    conn.execute(
+        "INSERT INTO col VALUES (1, ?, ?, ?, 11, 0, 0, 0, ?, ?, ?, ?, '{}')",
+        (created, now * 1000, now * 1000, json.dumps(conf), json.dumps({str(model_id): model}),
+         json.dumps({"1": default_deck, str(deck_id): deck}), json.dumps({"1": DECK_OPTIONS})),
+    )
+    return conn
+
+def text_to_html(text, media_names):
+    """ convert a card's text to the HTML of an Anki field, collecting the media it refers to """
+
+    def escape(text):
+        return html.escape(text, quote=False).replace("\n", "<br>")
+
+    field = []
+    position = 0
+    for match in MEDIA_PATTERN.finditer(text):
+        kind, name = match.groups()
+        media_names.add(name)
+
+        field.append(escape(text[position:match.start()]))
+        field.append('<img src="{}">'.format(name) if kind == IMAGE else "[sound:{}]".format(name))
+        position = match.end()
+
+    field.append(escape(text[position:]))
+    return "".join(field)
+
+def card_to_rows(card, due_time, position, note_id, deck_id, model_id, deck_name, now, media_names):
+    """ return the Anki note and card rows of a flashcard """
+
+    front = card.get_front()
+    fields = [text_to_html(text or "", media_names) for text in (front, card.get_back(), card.get_notes())]
+
+    # the same card keeps its guid, so importing a deck again updates its notes
+    guid = hashlib.sha1("{}:{}".format(deck_name, card.get_id()).encode("utf-8")).hexdigest()[:16]
+    sort_field = MEDIA_PATTERN.sub("", front).strip()
+    checksum = int(hashlib.sha1(sort_field.encode("utf-8")).hexdigest()[:8], 16)
+    note = (note_id, guid, model_id, now, -1, "", FIELD_SEPARATOR.join(fields), sort_field, checksum, 0, "")
+
+    # cards at the first mem level are new to Anki, the others are due on
+    # the same day as in the deck, after the same interval
+    mem_level = card.get_mem_level()
+    if mem_level == 0:
+        card_type, due, interval = NEW_CARD, position, 0
+    else:
+        card_type = REVIEW_CARD
+        due = max((due_time.date() - COLLECTION_CREATED.date()).days, 0)
+        interval = max((due_time - card.get_last_review()).days, 1)
+
+    card_row = (note_id, note_id, deck_id, 0, now, -1, card_type, card_type, due, interval, 2500 if interval else 0,
+                mem_level, 0, 0, 0, 0, 0, "")
+    return note, card_row
+
+def export_deck(deck, file_name, store=None, batch_size=BATCH_SIZE, progress=None):
+    """
+    Write a deck to an Anki package, with the media its cards refer to.
+    Cards are read and written a batch at a time, and media files are
+    copied into the package one at a time. Returns (number of cards,
+    number of media files).
+    """
+
+    store = store or MediaStore()
+    deck_name = deck.get_deck_name()
+    now = int(time.time())
+
+    # Anki ids are times in milliseconds, the cards are numbered from now on
+    base_id = now * 1000
+    deck_id = model_id = base_id
+
+    media_names = set()
+    exported = 0
+
+    with tempfile.TemporaryDirectory() as tmp_directory:
+        collection_file_name = os.path.join(tmp_directory, "collection.anki2")
+        conn = new_collection(collection_file_name, deck_name, deck_id, model_id, now)
+
+        # only the card ids are held, the cards are read a batch at a time
+        card_ids = deck.find_cards()
+        for start in range(0, len(card_ids), batch_size):
+            notes = []
+            cards = []
+            for card in deck.get_flashcards(card_ids[start:start + batch_size]):
+                exported += 1
+                note, card_row = card_to_rows(card, deck.get_due_time(card), exported, base_id + exported,
+                                              deck_id, model_id, deck_name, now, media_names)
+                notes.append(note)
+                cards.append(card_row)
+
+            conn.executemany("INSERT INTO notes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", notes)
+            conn.executemany("INSERT INTO cards VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", cards)
+            if progress is not None and exported % PROGRESS_INTERVAL < len(cards):
+                progress(exported)
+
+        conn.commit()
+        conn.close()
+
+        # the package is renamed into place once complete
+        tmp_file_name = file_name + ".tmp"
+        with zipfile.ZipFile(tmp_file_name, "w", zipfile.ZIP_DEFLATED) as package:
+            package.write(collection_file_name, "collection.anki2")
+
+            media = {}
+            for name in sorted(media_names):
+                if store.exists(name):
+                    member = str(len(media))
+                    package.write(store.get_path(name), member)
+                    media[member] = name
+
+            package.writestr("media", json.dumps(media))
+
+        os.replace(tmp_file_name, file_name)
+
+    return exported, len(media)
+
+def main():
+    """ export a deck in DECK_DIRECTORY to an Anki package """
+
+    parser = argparse.ArgumentParser(
+        description="Export a deck to an Anki package (.apkg). Packages are imported with importer.py.")
+    parser.add_argument("deck_name")
+    parser.add_argument("file_name", help="package to write, e.g. italian.apkg")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    deck = open_deck(args.deck_name, use_server=True)
+
+    start = time.perf_counter()
+    exported, media = export_deck(
+        deck, args.file_name, batch_size=args.batch_size,
+        progress=lambda n: print("  " + str(n) + " cards exported...", file=sys.stderr),
+    )
+    elapsed = time.perf_counter() - start
+    deck.close()
+
+    print("Exported {} cards and {} media files from {} to {} in {:.2f}s".format(
+        exported, media, args.deck_name, args.file_name, elapsed))
+
+if __name__ == "__main__":
+    main()
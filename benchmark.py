@@ -0,0 +1,181 @@
+import os
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime, timedelta
+
+from deck import DECK_DIRECTORY, SRS_KEYS, TIME_FORMAT, FlashcardDeck, get_srs_interval
+
+RESULTS_FILE_NAME = "benchmark_results.jsonl"
+
+# how many times the per-card operations are repeated and averaged
+REPEAT = 200
+
+WORDS = ("the of and to in is was for on that with as by at from his her an were are which "
+         "cell plant energy water light reaction membrane protein acid river mountain city "
+         "parliament century revolution painting sonata equation theorem integral matrix").split()
+
+def random_text(rng, min_words, max_words):
+    """ return a random string of words """
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words)))
+
+def generate_flashcard(rng, srs_key, now):
+    """ return a synthetic flashcard dict in the deck JSON format """
+
+    # most cards sit at low memory levels, fewer make it to the top
+    mem_level = min(int(rng.expovariate(0.35)), 9)
+
+    # reviewed somewhere within about two intervals, so part of the deck is due
+    interval = get_srs_interval(srs_key, mem_level)
+    last_review = now - timedelta(days=rng.uniform(0, 2 * interval + 1))
+
+    return {
+        'front': random_text(rng, 1, 12),
+        'back': random_text(rng, 1, 30),
+        'notes': random_text(rng, 0, 80) if rng.random() < 0.4 else "",
+        'last_review': last_review.strftime(TIME_FORMAT),
+        'mem_level': mem_level,
+    }
+
+def generate_deck(deck_name, size, srs_method="Fibonacci", seed=0):
+    """ write a synthetic deck of a given size to DECK_DIRECTORY """
+
+    rng = random.Random(seed)
+    srs_key = SRS_KEYS[srs_method]
+    now = datetime.now()
+
+    deck = {
+        'srs_method': srs_method,
+        'flashcards': [generate_flashcard(rng, srs_key, now) for _ in range(size)],
+    }
+
+    with open(DECK_DIRECTORY + deck_name + ".json", "w", encoding="utf-8") as f:
+        json.dump(deck, f, indent=4, ensure_ascii=False)
+
+def timed(function, *args):
+    """ return the result of a call and the time it took in seconds """
+
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+def benchmark_deck(deck_name, repeat=REPEAT):
+    """ time the main FlashcardDeck operations on an existing deck """
+
+    results = {}
+
+    deck, results['load'] = timed(FlashcardDeck, deck_name)
+    _, results['update_pending'] = timed(deck.update_pending)
+
+    # hand out cards and answer them, alternating right and wrong
+    next_times = []
+    answer_times = []
+    for i in range(repeat):
+        card, t = timed(deck.get_next_flashcard)
+        next_times.append(t)
+        if card is None:
+            break
+        _, t = timed(deck.log_answer, card, i % 2 == 0)
+        answer_times.append(t)
+
+    results['get_next_flashcard'] = sum(next_times) / len(next_times)
+    results['log_answer'] = sum(answer_times) / max(len(answer_times), 1)
+
+    add_times = []
+    for i in range(repeat):
+        _, t = timed(deck.add_flashcard, "front " + str(i), "back " + str(i), "")
+        add_times.append(t)
+    results['add_flashcard'] = sum(add_times) / len(add_times)
+
+    _, results['save_deck'] = timed(deck.save_deck)
+    results['deck_bytes'] = os.path.getsize(deck.deck_file_name)
+
+    return results
+
+def get_git_commit():
+    """ return the current git commit, if the benchmark runs in a checkout """
+
+    try:
+        output = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    return output.stdout.strip()
+
+def load_previous_results(results_file_name):
+    """ return the most recent recorded result for each deck size """
+
+    previous = {}
+    if not os.path.exists(results_file_name):
+        return previous
+
+    with open(results_file_name, "r", encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            previous[record['size']] = record
+
+    return previous
+
+def format_change(new, old):
+    """ return the relative change between two timings as text """
+
+    if not old:
+        return ""
+
+    return " ({:+.0f}%)".format((new - old) / old * 100)
+
+def main():
+    """ generate synthetic decks, time them and record the results """
+
+    parser = argparse.ArgumentParser(description="Time FlashcardDeck operations on synthetic decks.")
+    parser.add_argument("sizes", nargs="*", type=int, default=[1000, 10000, 100000],
+                        help="deck sizes to benchmark (default: 1000 10000 100000)")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="per-card operations to average over")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--results", default=RESULTS_FILE_NAME, help="file the results are appended to")
+    args = parser.parse_args()
+
+    results_file_name = os.path.abspath(args.results)
+    previous = load_previous_results(results_file_name)
+    commit = get_git_commit()
+
+    # decks are generated in a scratch directory, never in the user's decks
+    with tempfile.TemporaryDirectory() as scratch:
+        os.chdir(scratch)
+        os.makedirs(DECK_DIRECTORY)
+
+        for size in args.sizes:
+            deck_name = "synthetic_" + str(size)
+            _, generate_time = timed(generate_deck, deck_name, size, "Fibonacci", args.seed)
+            timings = benchmark_deck(deck_name, args.repeat)
+
+            record = {
+                'date': datetime.now().strftime(TIME_FORMAT),
+                'commit': commit,
+                'python': platform.python_version(),
+                'size': size,
+                'repeat': args.repeat,
+                'seed': args.seed,
+                'timings': timings,
+            }
+            with open(results_file_name, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+
+            old_timings = previous.get(size, {}).get('timings', {})
+            print("{} cards (generated in {:.2f}s)".format(size, generate_time))
+            for name, value in timings.items():
+                if name == 'deck_bytes':
+                    print("  {:<20} {:>12,d} bytes".format(name, value))
+                else:
+                    print("  {:<20} {:>12.3f} ms{}".format(name, value * 1000, format_change(value, old_timings.get(name))))
+
+if __name__ == "__main__":
+    main()
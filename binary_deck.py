@@ -0,0 +1,889 @@
+import os
+import sys
+import json
+import mmap
+import random
+import struct
+import itertools
+import threading
+from datetime import datetime, timedelta
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from deck import (
+    DECK_DIRECTORY,
+    SCHEMA_VERSION,
+    SORT_COLUMNS,
+    TIME_FORMAT,
+    Flashcard,
+    FlashcardDeck,
+    assign_card_ids,
+    check_sort_column,
+    parse_review_time,
+    get_scheduler,
+)
+from journal import DeckJournal, write_json_atomic
+from duplicates import KEEP, check_policy, merge_text
+from stats import DeckStats
+from columnar import EPOCH, MICROSECONDS_PER_DAY, to_epoch, from_epoch
+from instrumentation import timed, count
+
+BINARY_EXTENSION = ".deck"
+
+MAGIC = b"MNDK"
+FORMAT_VERSION = 1
+
+# header flag of files whose records carry the cards' ids, the records of
+# older files are numbered by position when they are read
+FLAG_CARD_IDS = 1
+
+# magic, format version, flags, record size, card count, then the offset
+# and size of the metadata (deck-level JSON), the offset of the records
+# and the offset and size of the string table
+HEADER = struct.Struct("<4sHHIQQQQQQ")
+
+# one fixed-width record per card: the scheduling fields, followed by where
+# the card's front, back and notes (stored one after the other) and its
+# scheduler state (JSON) are in the string table, and the card's id
+RECORD_FIELDS = [
+    ('last_review', "<i8"),
+    ('due_time', "<i8"),
+    ('text_offset', "<u8"),
+    ('srs_offset', "<u8"),
+    ('front_length', "<u4"),
+    ('back_length', "<u4"),
+    ('notes_length', "<u4"),
+    ('srs_length', "<u4"),
+    ('mem_level', "<i1"),
+    ('reserved', "V3"),
+    ('card_id', "<u4"),
+]
+RECORD_DTYPE = np.dtype(RECORD_FIELDS) if np is not None else None
+
+# unchanged text is copied to a rewritten file in chunks of this size
+COPY_CHUNK_SIZE = 16 * 1024 * 1024
+
+# cards whose text is decoded at a time when scanning many of them
+TEXT_CHUNK_CARDS = 10000
+
+# memory level of the record of a deleted card, until the deck is reopened
+DELETED = -1
+NEVER = np.iinfo(np.int64).max if np is not None else None
+
+def encode_srs_data(srs_data):
+    return json.dumps(srs_data).encode("utf-8") if srs_data is not None else b""
+
+def fill_strings(records, texts):
+    """
+    Point the records at their strings laid out one card after the other,
+    texts being (front, back, notes, srs data) bytes for each card, and
+    return the string table as an iterator of chunks.
+    """
+
+    lengths = np.array([[len(s) for s in text] for text in texts], dtype=np.uint64).reshape(-1, 4)
+    ends = np.cumsum(lengths.sum(axis=1))
+
+    records['text_offset'] = ends - lengths.sum(axis=1)
+    records['srs_offset'] = records['text_offset'] + lengths[:, :3].sum(axis=1)
+    records['front_length'] = lengths[:, 0]
+    records['back_length'] = lengths[:, 1]
+    records['notes_length'] = lengths[:, 2]
+    records['srs_length'] = lengths[:, 3]
+
+    return (b"".join(text) for text in texts)
+
+def write_binary_deck(file_name, deck_info, records, string_chunks):
+    """ write a binary deck file, callers write to a temporary file and rename it """
+
+    meta = json.dumps(deck_info, default=str, ensure_ascii=False).encode("utf-8")
+    meta_offset = HEADER.size
+    # records start on an 8 byte boundary
+    records_offset = (meta_offset + len(meta) + 7) // 8 * 8
+
+    with open(file_name, "wb") as f:
+        # the header is left blank until the rest is written
+        f.write(bytes(meta_offset))
+        f.write(meta)
+        f.write(bytes(records_offset - meta_offset - len(meta)))
+        f.write(memoryview(records).cast("B"))
+
+        strings_offset = f.tell()
+        for chunk in string_chunks:
+            f.write(chunk)
+        strings_size = f.tell() - strings_offset
+
+        # the header goes in last, so a partly written file is never valid
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, FLAG_CARD_IDS, RECORD_DTYPE.itemsize, len(records),
+                            meta_offset, len(meta), records_offset, strings_offset, strings_size))
+        f.flush()
+        os.fsync(f.fileno())
+
+    count("deck.bytes_written", strings_offset + strings_size)
+
+def read_binary_deck(file_name):
+    """
+    Map a binary deck file into memory. Returns the deck-level dict, a
+    copy of the records of the cards that weren't deleted, the mapping
+    and where the string table starts and how large it is.
+    """
+
+    if np is None:
+        raise ImportError("binary decks require numpy (pip install numpy)")
+
+    with open(file_name, "rb") as f:
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    (magic, version, flags, record_size, card_count, meta_offset, meta_size,
+     records_offset, strings_offset, strings_size) = HEADER.unpack_from(mapping)
+
+    if magic != MAGIC:
+        raise ValueError(file_name + " is not a binary deck")
+    if version > FORMAT_VERSION or record_size != RECORD_DTYPE.itemsize:
+        raise ValueError("{} is a version {} binary deck, this version reads up to {}".format(
+            file_name, version, FORMAT_VERSION))
+
+    deck_info = json.loads(mapping[meta_offset:meta_offset + meta_size])
+
+    # the records are a small fraction of the file and copied, so that
+    # the mapping can be closed when the file is rewritten
+    records = np.frombuffer(mapping, RECORD_DTYPE, card_count, records_offset).copy()
+    if not flags & FLAG_CARD_IDS:
+        records['card_id'] = np.arange(card_count)
+
+    # deleted cards are written as they are, and only dropped here so that
+    # the cards' positions don't change while a deck is open
+    records = records[records['mem_level'] != DELETED]
+
+    return deck_info, records, mapping, strings_offset, strings_size
+
+class BinaryFlashcardDeck(FlashcardDeck):
+    """
+    BinaryFlashcardDeck Class
+        A deck stored in a compact binary file instead of JSON. The
+        scheduling fields of every card are fixed-width records, read in
+        one go when the deck is opened, while the text stays in a
+        memory-mapped string table and is only decoded for cards that
+        are shown. Changes go to the deck's journal as with JSON decks,
+        and are folded into the file when it is rewritten.
+    """
+
+    @timed("deck.load")
+    def __init__(self, deck_name, directory=DECK_DIRECTORY):
+        self.deck_name = deck_name
+        self.deck_file_name = directory + self.deck_name + BINARY_EXTENSION
+        self.journal = DeckJournal(
+            directory + self.deck_name + ".journal",
+            directory + self.deck_name + ".history",
+        )
+
+        self.columnar = None
+        self.duplicate_index = None
+        self.stats = None
+        self.writer = None
+
+        # taken while the file is rewritten and its mapping replaced
+        self.lock = threading.Lock()
+
+        self.deck, self.records, self.mapping, self.strings_offset, self.strings_size = \
+            read_binary_deck(self.deck_file_name)
+        self.count = len(self.records)
+        self.journal.set_deck_size(os.path.getsize(self.deck_file_name))
+
+        # records of deleted cards stay until the deck is reopened, and ids
+        # are never reused, the records are kept sorted by id
+        self.deleted = 0
+        self.next_card_id = self.deck.pop("next_card_id", 0)
+        if self.count:
+            self.next_card_id = max(self.next_card_id, int(self.records['card_id'][self.count - 1]) + 1)
+
+        # get srs_method and load scheduler
+        self.load_srs_method()
+
+        # text and scheduler state of cards changed since the file was written
+        self.text_overlay = {}
+        self.srs_overlay = {}
+
+        # cards handed out but not answered yet, mapped to their index; as
+        # with the overlays, indices are positions in the records, card ids
+        # are only used by the deck's methods and journal
+        self.in_flight = {}
+
+        # indices answered wrong this session, shown again before they are due
+        self.retry_ids = []
+
+        self.replay_journal()
+
+    def replay_journal(self):
+        """ apply the records of the deck's journal to the loaded records """
+
+        for record in self.journal.read_records():
+            card_id = record['card']
+
+            if record['op'] == "add":
+                # already in the file if it was written but the journal not cleared
+                if card_id >= self.next_card_id:
+                    self.append_cards([record['flashcard']], [card_id])
+                continue
+
+            # the card is missing if it was deleted later on, and the deck
+            # written before the journal was cleared
+            index = self.find_index(card_id)
+            if index is None:
+                continue
+
+            if record['op'] == "delete":
+                self.remove_card(index)
+
+            elif record['op'] == "edit":
+                front = record.get('front', self.read_text(index)[0])
+                self.text_overlay[index] = (front, record['back'], record['notes'])
+
+            elif record['op'] == "review":
+                self.set_schedule(index, parse_review_time(record['last_review']),
+                                  record['mem_level'], record.get('srs_data'))
+
+    def column(self, name):
+        """ return a field of the records of every card """
+        return self.records[name][:self.count]
+
+    def find_index(self, card_id):
+        """ return the position of the record of a card, or None if there is none """
+
+        # until a card is deleted and the deck reopened, ids are positions
+        card_ids = self.column('card_id')
+        if 0 <= card_id < self.count and card_ids[card_id] == card_id:
+            index = card_id
+        else:
+            index = int(np.searchsorted(card_ids, card_id))
+            if index == self.count or card_ids[index] != card_id:
+                return None
+
+        if self.records['mem_level'][index] == DELETED:
+            return None
+
+        return index
+
+    def get_index(self, card_id):
+        """ return the position of the record of a card, raises KeyError if there is none """
+
+        index = self.find_index(card_id)
+        if index is None:
+            raise KeyError(card_id)
+
+        return index
+
+    def get_card_id(self, index):
+        return int(self.records['card_id'][index])
+
+    def live_mask(self):
+        """ return a boolean array marking the records of cards that weren't deleted """
+        return self.column('mem_level') != DELETED
+
+    def set_schedule(self, index, last_review, mem_level, srs_data, due_time=None):
+        """ store the scheduling fields of a card """
+
+        if due_time is None:
+            interval = self.scheduler.get_interval(mem_level, srs_data)
+            due_time = last_review + timedelta(days=interval)
+
+        with self.lock:
+            self.records['last_review'][index] = to_epoch(last_review)
+            self.records['mem_level'][index] = mem_level
+            self.records['due_time'][index] = to_epoch(due_time)
+            self.srs_overlay[index] = srs_data
+
+    def append_cards(self, card_dicts, card_ids=None):
+        """ add cards at the end of the records, with new ids unless given, returns the index of the first """
+
+        first = self.count
+        needed = first + len(card_dicts)
+
+        # grow by doubling, so adding cards one at a time stays cheap
+        if needed > len(self.records):
+            records = np.zeros(max(needed, 2 * len(self.records)), RECORD_DTYPE)
+            records[:first] = self.records[:first]
+            with self.lock:
+                self.records = records
+
+        if card_ids is None:
+            card_ids = range(self.next_card_id, self.next_card_id + len(card_dicts))
+
+        for index, card, card_id in zip(range(first, needed), card_dicts, card_ids):
+            self.set_schedule(index, parse_review_time(card['last_review']), card['mem_level'], card.get('srs_data'))
+            self.text_overlay[index] = (card['front'], card['back'], card.get('notes', ""))
+            self.records['card_id'][index] = card_id
+            self.next_card_id = card_id + 1
+
+        self.count = needed
+        return first
+
+    def read_string(self, offset, length):
+        """ return bytes of the string table of the file as it is now """
+
+        start = self.strings_offset + int(offset)
+        with self.lock:
+            return self.mapping[start:start + int(length)]
+
+    def read_text(self, index):
+        """ return the front, back and notes of a card """
+
+        text = self.text_overlay.get(index)
+        if text is not None:
+            return text
+
+        record = self.records[index]
+        lengths = [int(record['front_length']), int(record['back_length']), int(record['notes_length'])]
+        data = self.read_string(record['text_offset'], sum(lengths))
+
+        front = data[:lengths[0]].decode("utf-8")
+        back = data[lengths[0]:lengths[0] + lengths[1]].decode("utf-8")
+        notes = data[lengths[0] + lengths[1]:].decode("utf-8")
+        return front, back, notes
+
+    def iter_texts(self, indices):
+        """ yield the front, back and notes of many cards, faster than read_text """
+
+        indices = np.asarray(indices, dtype=np.int64)
+        for first in range(0, len(indices), TEXT_CHUNK_CARDS):
+            chunk = indices[first:first + TEXT_CHUNK_CARDS]
+            records = self.records[chunk]
+            offsets = (self.strings_offset + records['text_offset']).tolist()
+            lengths = zip(records['front_length'].tolist(), records['back_length'].tolist(),
+                          records['notes_length'].tolist())
+
+            # the file can't be replaced in the middle of a chunk
+            with self.lock:
+                texts = []
+                for index, start, (front_length, back_length, notes_length) in zip(chunk.tolist(), offsets, lengths):
+                    text = self.text_overlay.get(index)
+                    if text is None:
+                        data = self.mapping[start:start + front_length + back_length + notes_length]
+                        text = (data[:front_length].decode("utf-8"),
+                                data[front_length:front_length + back_length].decode("utf-8"),
+                                data[front_length + back_length:].decode("utf-8"))
+                    texts.append(text)
+
+            yield from texts
+
+    def read_srs_data(self, index):
+        """ return the scheduler state of a card """
+
+        if index in self.srs_overlay:
+            return self.srs_overlay[index]
+
+        record = self.records[index]
+        if not record['srs_length']:
+            return None
+
+        return json.loads(self.read_string(record['srs_offset'], record['srs_length']))
+
+    def load_card(self, index):
+        """ build a Flashcard object from a card's record and text """
+
+        front, back, notes = self.read_text(index)
+        record = self.records[index]
+
+        flashcard = Flashcard({
+            'id': self.get_card_id(index),
+            'front': front,
+            'back': back,
+            'notes': notes,
+            'last_review': from_epoch(record['last_review']),
+            'mem_level': int(record['mem_level']),
+            'srs_data': self.read_srs_data(index),
+        })
+        flashcard.set_due_time(from_epoch(record['due_time']))
+        return flashcard
+
+    def get_total_number_of_cards(self):
+        """ return total number of cards in deck """
+        return self.count - self.deleted
+
+    def iter_flashcards(self):
+        """ yield (card id, flashcard) for every card of the deck, decoding them as it goes """
+
+        for index in np.flatnonzero(self.live_mask()).tolist():
+            yield self.get_card_id(index), self.load_card(index)
+
+    def iter_fronts(self):
+        """ yield (card id, front) for every card of the deck """
+
+        for index in np.flatnonzero(self.live_mask()).tolist():
+            if index in self.text_overlay:
+                yield self.get_card_id(index), self.text_overlay[index][0]
+            else:
+                record = self.records[index]
+                yield self.get_card_id(index), \
+                    self.read_string(record['text_offset'], record['front_length']).decode("utf-8")
+
+    def get_flashcard(self, card_id):
+        """ return the card with the given id, raises KeyError if there is none """
+        return self.load_card(self.get_index(card_id))
+
+    @timed("deck.find_cards")
+    def find_cards(self, text="", mem_level=None, sort_by="due_time", descending=False):
+        """
+        Return the ids of the matching cards, see FlashcardDeck.find_cards.
+        Memory levels and due times are filtered and sorted on the records,
+        text is only decoded to match it or to sort by it.
+        """
+
+        check_sort_column(sort_by)
+        if mem_level is not None:
+            indices = np.flatnonzero(self.column('mem_level') == mem_level)
+        else:
+            indices = np.flatnonzero(self.live_mask())
+
+        if text:
+            text = text.casefold()
+            indices = indices[[any(text in field.casefold() for field in fields)
+                               for fields in self.iter_texts(indices)]]
+
+        if sort_by in ("front", "back"):
+            field = SORT_COLUMNS.index(sort_by)
+            keys = [fields[field].casefold() for fields in self.iter_texts(indices)]
+            order = sorted(range(len(keys)), key=keys.__getitem__, reverse=descending)
+        else:
+            keys = self.column(sort_by)[indices].astype(np.int64)
+            order = np.argsort(-keys if descending else keys, kind="stable")
+
+        return self.column('card_id')[indices[order]].tolist()
+
+    @timed("deck.build_stats")
+    def build_stats(self):
+        """ count the deck's cards by due day and memory level, and its answers by day """
+
+        live = self.live_mask()
+        due_days = EPOCH.toordinal() + self.column('due_time')[live] // MICROSECONDS_PER_DAY
+        days, due_counts = np.unique(due_days, return_counts=True)
+        levels, level_counts = np.unique(self.column('mem_level')[live], return_counts=True)
+
+        stats = DeckStats(
+            dict(zip(days.tolist(), due_counts.tolist())),
+            dict(zip(levels.tolist(), level_counts.tolist())),
+        )
+
+        for _, review_time, answer in self.get_review_history():
+            stats.add_review(review_time, answer)
+
+        return stats
+
+    def due_mask(self):
+        """ return a boolean array marking the due cards that are not retried or in flight """
+
+        mask = self.column('due_time') <= to_epoch(datetime.now())
+        mask[list(self.in_flight.values()) + self.retry_ids] = False
+        return mask
+
+    @timed("deck.get_number_pending")
+    def get_number_pending(self):
+        """ return number of cards pending for review """
+        return int(np.count_nonzero(self.due_mask())) + len(self.retry_ids)
+
+    def get_next_due_time(self):
+        """ return the time the next scheduled card becomes due, if any """
+
+        # deleted cards are never due
+        due_times = self.column('due_time')
+        later = due_times[(due_times > to_epoch(datetime.now())) & (due_times != NEVER)]
+        if not len(later):
+            return None
+
+        return from_epoch(later.min())
+
+    def hand_out(self, index):
+        card = self.load_card(index)
+        self.in_flight[card] = index
+        return card
+
+    @timed("deck.get_next_flashcard")
+    def get_next_flashcard(self):
+        """ return a random pending flashcard """
+
+        due = np.flatnonzero(self.due_mask())
+        number_pending = len(due) + len(self.retry_ids)
+        if not number_pending:
+            return None
+
+        # pick uniformly between retried cards and due cards
+        i = random.randrange(number_pending)
+        if i < len(self.retry_ids):
+            return self.hand_out(self.retry_ids.pop(i))
+
+        return self.hand_out(int(due[i - len(self.retry_ids)]))
+
+    def get_earliest_flashcard(self):
+        """ like get_next_flashcard, but hand out the card that has been due the longest """
+
+        mask = self.due_mask()
+
+        # cards answered wrong this session come after the due ones
+        if mask.any():
+            due_times = np.where(mask, self.column('due_time'), np.iinfo(np.int64).max)
+            return self.hand_out(int(due_times.argmin()))
+        if self.retry_ids:
+            return self.hand_out(self.retry_ids.pop(0))
+
+        return None
+
+    def put_back_flashcard(self, card):
+        """ return a card handed out by get_next_flashcard but not answered """
+
+        index = self.in_flight.pop(card, None)
+        if index is None:
+            return
+
+        # a retried card isn't due yet and has to go back in the retry list
+        if self.get_due_time(card) > datetime.now():
+            self.retry_ids.append(index)
+
+    @timed("deck.log_answer")
+    def log_answer(self, curr_card, answer):
+        """ update flashcard with time last reviewed and new mem level """
+
+        index = self.in_flight.pop(curr_card, None)
+        if index is None:
+            return
+
+        # the scheduler decides the next due time once, here
+        now = datetime.now()
+        elapsed_days = (now - curr_card.get_last_review()) / timedelta(days=1)
+        mem_level, srs_data, interval = self.scheduler.review(
+            curr_card.get_mem_level(), curr_card.get_srs_data(), answer, elapsed_days)
+        due_time = now + timedelta(days=interval)
+
+        if self.stats is not None:
+            self.stats.reschedule_card(
+                self.get_due_time(curr_card), curr_card.get_mem_level(), due_time, mem_level, now, answer)
+
+        curr_card.set_last_review(now)
+        curr_card.set_mem_level(mem_level)
+        curr_card.set_srs_data(srs_data)
+        curr_card.set_due_time(due_time)
+        self.set_schedule(index, now, mem_level, srs_data, due_time)
+
+        self.log_change({
+            'op': "review",
+            'card': self.get_card_id(index),
+            'last_review': now.strftime(TIME_FORMAT),
+            'answer': bool(answer),
+            'mem_level': mem_level,
+            'srs_data': srs_data,
+        })
+
+        # the record keeps the scheduler's due time, so a card answered wrong
+        # is only asked again this session, by its record index kept in memory
+        if not answer:
+            self.retry_ids.append(index)
+
+    @timed("deck.add_flashcard")
+    def add_flashcard(self, front, back, notes, on_duplicate=KEEP):
+        """ add flashcard to deck, returns the new card's id, see FlashcardDeck.add_flashcard """
+
+        merged_id = self.check_duplicate(front, back, notes, on_duplicate)
+        if merged_id is not None:
+            return merged_id
+
+        card = Flashcard({'front': front, 'back': back, 'notes': notes, 'last_review': datetime.now(), 'mem_level': 0})
+        index = self.append_cards([card.get_as_dict()])
+        card_id = self.get_card_id(index)
+        card.set_id(card_id)
+
+        if self.duplicate_index is not None:
+            self.duplicate_index.add(card_id, front)
+        if self.stats is not None:
+            self.stats.add_card(from_epoch(self.records['due_time'][index]), 0)
+
+        self.log_change({
+            'op': "add",
+            'card': card_id,
+            'flashcard': card.get_as_dict(),
+        })
+
+        return card_id
+
+    def add_flashcards(self, card_dicts, on_duplicate=KEEP, journal=False):
+        """ add a batch of flashcard dicts, see FlashcardDeck.add_flashcards """
+
+        check_policy(on_duplicate)
+        if on_duplicate != KEEP:
+            card_dicts = self.filter_duplicates(card_dicts, on_duplicate)
+
+        first = self.append_cards(card_dicts)
+
+        for index in range(first, self.count):
+            if self.duplicate_index is not None:
+                self.duplicate_index.add(self.get_card_id(index), self.text_overlay[index][0])
+            if self.stats is not None:
+                self.stats.add_card(from_epoch(self.records['due_time'][index]), int(self.records['mem_level'][index]))
+
+        if journal:
+            for index, card in enumerate(card_dicts, first):
+                self.log_change({'op': "add", 'card': self.get_card_id(index), 'flashcard': card})
+
+        return len(card_dicts)
+
+    def merge_flashcard(self, card_id, back, notes):
+        """ add the back and notes of a duplicate card to an existing card """
+
+        index = self.get_index(card_id)
+        front, old_back, old_notes = self.read_text(index)
+        text = (front, merge_text(old_back, back), merge_text(old_notes, notes))
+        if text == (front, old_back, old_notes):
+            return
+
+        self.text_overlay[index] = text
+        self.log_change({
+            'op': "edit",
+            'card': card_id,
+            'back': text[1],
+            'notes': text[2],
+        })
+
+    def edit_flashcard(self, card_id, front, back, notes):
+        """ replace the front, back and notes of a card """
+
+        index = self.get_index(card_id)
+        old_front = self.read_text(index)[0]
+        if self.duplicate_index is not None and front != old_front:
+            self.duplicate_index.remove(card_id, old_front)
+            self.duplicate_index.add(card_id, front)
+
+        self.text_overlay[index] = (front, back, notes)
+        self.log_change({
+            'op': "edit",
+            'card': card_id,
+            'front': front,
+            'back': back,
+            'notes': notes,
+        })
+
+    def delete_flashcard(self, card_id):
+        """ remove a card from the deck, raises KeyError if there is none """
+
+        index = self.get_index(card_id)
+        if self.duplicate_index is not None:
+            self.duplicate_index.remove(card_id, self.read_text(index)[0])
+        if self.stats is not None:
+            self.stats.remove_card(from_epoch(self.records['due_time'][index]), int(self.records['mem_level'][index]))
+
+        self.remove_card(index)
+        self.log_change({
+            'op': "delete",
+            'card': card_id,
+        })
+
+    def remove_card(self, index):
+        """ mark the record of a deleted card, its text is dropped when the file is rewritten """
+
+        with self.lock:
+            self.records['mem_level'][index] = DELETED
+            self.records['due_time'][index] = NEVER
+            self.text_overlay[index] = ("", "", "")
+            self.srs_overlay[index] = None
+        self.deleted += 1
+
+        if index in self.retry_ids:
+            self.retry_ids.remove(index)
+        for card, card_index in list(self.in_flight.items()):
+            if card_index == index:
+                del self.in_flight[card]
+
+    def iter_file_strings(self):
+        """ yield the string table of the file as it is now, in chunks """
+
+        for start in range(0, self.strings_size, COPY_CHUNK_SIZE):
+            yield self.read_string(start, min(COPY_CHUNK_SIZE, self.strings_size - start))
+
+    def append_strings(self, records, text_overlay, srs_overlay):
+        """
+        Point the records of changed cards at strings added after the
+        current string table, and return the new table as chunks.
+        """
+
+        appended = []
+        position = self.strings_size
+
+        for index, text in text_overlay.items():
+            front, back, notes = [(s or "").encode("utf-8") for s in text]
+            records['text_offset'][index] = position
+            records['front_length'][index] = len(front)
+            records['back_length'][index] = len(back)
+            records['notes_length'][index] = len(notes)
+            appended += [front, back, notes]
+            position += len(front) + len(back) + len(notes)
+
+        for index, srs_data in srs_overlay.items():
+            data = encode_srs_data(srs_data)
+            records['srs_offset'][index] = position
+            records['srs_length'][index] = len(data)
+            appended.append(data)
+            position += len(data)
+
+        return itertools.chain(self.iter_file_strings(), appended)
+
+    def compact_strings(self, records, text_overlay, srs_overlay):
+        """ lay out the strings of every card anew, dropping the ones no longer used """
+
+        texts = []
+        for index in range(len(records)):
+            text = text_overlay.get(index)
+            if text is None:
+                text = self.read_text(index)
+            srs_data = srs_overlay[index] if index in srs_overlay else self.read_srs_data(index)
+            texts.append([(s or "").encode("utf-8") for s in text] + [encode_srs_data(srs_data)])
+
+        return fill_strings(records, texts)
+
+    @timed("deck.write_deck")
+    def write_deck(self):
+        """ rewrite the deck file with every change and clear the journal it now contains """
+
+        with self.lock:
+            records = self.records[:self.count].copy()
+            text_overlay = dict(self.text_overlay)
+            srs_overlay = dict(self.srs_overlay)
+            deck_info = dict(self.deck, next_card_id=self.next_card_id)
+
+        # bytes of the current string table still used by unchanged cards
+        text_lengths = (records['front_length'].astype(np.uint64) + records['back_length'] + records['notes_length'])
+        used = int(text_lengths.sum()) + int(records['srs_length'].sum(dtype=np.uint64))
+        used -= sum(int(text_lengths[index]) for index in text_overlay)
+        used -= sum(int(records['srs_length'][index]) for index in srs_overlay)
+
+        # changed cards get their strings appended to a copy of the table,
+        # unless most of the table would then be unused
+        if used * 2 >= self.strings_size:
+            strings = self.append_strings(records, text_overlay, srs_overlay)
+        else:
+            strings = self.compact_strings(records, text_overlay, srs_overlay)
+
+        tmp_file_name = self.deck_file_name + ".tmp"
+        write_binary_deck(tmp_file_name, deck_info, records, strings)
+
+        with self.lock:
+            # the file can't be replaced while it is mapped on every platform
+            self.mapping.close()
+            os.replace(tmp_file_name, self.deck_file_name)
+            _, _, self.mapping, self.strings_offset, self.strings_size = read_binary_deck(self.deck_file_name)
+
+            # changes made after the copy above stay in the overlays
+            for name in ('text_offset', 'srs_offset', 'front_length', 'back_length', 'notes_length', 'srs_length'):
+                self.records[name][:len(records)] = records[name]
+
+            for index, text in text_overlay.items():
+                if self.text_overlay.get(index) is text:
+                    del self.text_overlay[index]
+            for index, srs_data in srs_overlay.items():
+                if index in self.srs_overlay and self.srs_overlay[index] is srs_data:
+                    del self.srs_overlay[index]
+
+        # the journal is now part of the deck file
+        self.journal.clear()
+        self.journal.set_deck_size(os.path.getsize(self.deck_file_name))
+
+    def close(self):
+        """ fold any outstanding journal records into the deck file and unmap it """
+
+        super().close()
+        self.mapping.close()
+
+def json_to_binary(json_file_name, binary_file_name):
+    """ convert a JSON deck file to a binary deck """
+
+    with open(json_file_name, "r", encoding="utf-8") as f:
+        deck = json.load(f)
+
+    scheduler = get_scheduler(deck.get("srs_method"), deck.get("srs_params"))
+    cards = deck.pop("flashcards")
+
+    # cards keep their ids, and cards without one are numbered like
+    # FlashcardDeck does; the records are looked up by id
+    deck['next_card_id'] = assign_card_ids(cards, deck.get('next_card_id', 0))
+    cards.sort(key=lambda card: card['id'])
+
+    records = np.zeros(len(cards), RECORD_DTYPE)
+    last_reviews = []
+    due_times = []
+    texts = []
+    for card in cards:
+        last_review = parse_review_time(card['last_review'])
+        interval = scheduler.get_interval(card['mem_level'], card.get('srs_data'))
+        last_reviews.append(to_epoch(last_review))
+        due_times.append(to_epoch(last_review + timedelta(days=interval)))
+        texts.append([(card.get(key) or "").encode("utf-8") for key in ("front", "back", "notes")]
+                     + [encode_srs_data(card.get('srs_data'))])
+
+    records['last_review'] = last_reviews
+    records['due_time'] = due_times
+    records['mem_level'] = [card['mem_level'] for card in cards]
+    records['card_id'] = [card['id'] for card in cards]
+
+    write_binary_deck(binary_file_name + ".tmp", deck, records, fill_strings(records, texts))
+    os.replace(binary_file_name + ".tmp", binary_file_name)
+
+def binary_to_json(binary_file_name, json_file_name):
+    """ convert a binary deck to a JSON deck file """
+
+    deck, records, mapping, strings_offset, _ = read_binary_deck(binary_file_name)
+
+    def read(offset, length):
+        start = strings_offset + int(offset)
+        return mapping[start:start + int(length)]
+
+    deck['flashcards'] = []
+    for record in records:
+        text = read(record['text_offset'], record['front_length'] + record['back_length'] + record['notes_length'])
+        front_end = int(record['front_length'])
+        back_end = front_end + int(record['back_length'])
+
+        card = {
+            'id': int(record['card_id']),
+            'front': text[:front_end].decode("utf-8"),
+            'back': text[front_end:back_end].decode("utf-8"),
+            'notes': text[back_end:].decode("utf-8"),
+            'last_review': from_epoch(record['last_review']).strftime(TIME_FORMAT),
+            'mem_level': int(record['mem_level']),
+        }
+        if record['srs_length']:
+            card['srs_data'] = json.loads(read(record['srs_offset'], record['srs_length']))
+        deck['flashcards'].append(card)
+
+    if len(records):
+        deck['next_card_id'] = max(deck.get('next_card_id', 0), int(records['card_id'][-1]) + 1)
+    deck['schema_version'] = SCHEMA_VERSION
+
+    mapping.close()
+    write_json_atomic(json_file_name, deck)
+
+def main():
+    """ convert a deck in DECK_DIRECTORY between the JSON and binary formats """
+
+    usage = "usage: python binary_deck.py (to-binary | to-json) DECK_NAME"
+    if len(sys.argv) != 3 or sys.argv[1] not in ("to-binary", "to-json"):
+        sys.exit(usage)
+
+    command, deck_name = sys.argv[1:]
+    json_file_name = DECK_DIRECTORY + deck_name + ".json"
+    binary_file_name = DECK_DIRECTORY + deck_name + BINARY_EXTENSION
+
+    # fold any journaled changes into the deck file first, both formats
+    # keep their journal in the same file
+    if command == "to-binary":
+        if os.path.exists(binary_file_name):
+            sys.exit(binary_file_name + " already exists")
+
+        if os.path.exists(DECK_DIRECTORY + deck_name + ".journal"):
+            FlashcardDeck(deck_name).close()
+        json_to_binary(json_file_name, binary_file_name)
+    else:
+        if os.path.exists(DECK_DIRECTORY + deck_name + ".journal"):
+            BinaryFlashcardDeck(deck_name).close()
+        binary_to_json(binary_file_name, json_file_name)
+
+if __name__ == "__main__":
+    main()
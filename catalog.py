@@ -0,0 +1,168 @@
+import os
+import json
+import threading
+from datetime import datetime
+
+from deck import DECK_DIRECTORY, TIME_FORMAT, list_decks, open_deck
+from journal import write_json_atomic
+from stats import DeckStats
+
+CATALOG_FILE_NAME = ".catalog.json"
+
+# files whose mtime and size tell whether a cached summary is still valid
+DECK_FILE_EXTENSIONS = (".json", ".journal", ".sqlite", ".sqlite-wal", ".deck")
+
+def get_deck_stamp(deck_name, directory=DECK_DIRECTORY):
+    """ return the mtime and size of every file belonging to a deck """
+
+    stamp = {}
+    for extension in DECK_FILE_EXTENSIONS:
+        try:
+            stat = os.stat(directory + deck_name + extension)
+        except FileNotFoundError:
+            continue
+        stamp[extension] = [stat.st_mtime_ns, stat.st_size]
+
+    return stamp
+
+def summarize_deck(deck):
+    """ return the catalog summary of an open deck """
+
+    next_due = deck.get_next_due_time()
+
+    return {
+        'card_total': deck.get_total_number_of_cards(),
+        'pending': deck.get_number_pending(),
+        'as_of': datetime.now().strftime(TIME_FORMAT),
+        'next_due': next_due.strftime(TIME_FORMAT) if next_due else None,
+        'stats': deck.get_stats().to_dict(),
+    }
+
+class DeckCatalog:
+    """
+    DeckCatalog Class
+        Cached summary of every deck in the deck directory, so that card
+        totals, pending counts and stats can be shown without loading the
+        decks. An entry is dropped as soon as any of its deck's files change.
+    """
+
+    def __init__(self, directory=DECK_DIRECTORY):
+        self.directory = directory
+        self.file_name = directory + CATALOG_FILE_NAME
+
+        # decks may be stored from a worker thread
+        self.lock = threading.Lock()
+
+        try:
+            with open(self.file_name, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.entries = {}
+
+    def save(self):
+        """ write the catalog to disk """
+
+        with self.lock:
+            write_json_atomic(self.file_name, self.entries, indent=None)
+
+    def get_summary(self, deck_name, load=False):
+        """
+        Return the cached summary of a deck, or None if it is missing or
+        out of date. With load=True an out of date deck is loaded instead.
+        """
+
+        # summaries cached before stats were kept are out of date too
+        entry = self.entries.get(deck_name)
+        if (entry is not None and entry['stamp'] == get_deck_stamp(deck_name, self.directory)
+                and 'stats' in entry['summary']):
+            return entry['summary']
+
+        if not load:
+            return None
+
+        deck = open_deck(deck_name, directory=self.directory)
+        summary = summarize_deck(deck)
+        deck.close()
+        self.store(deck_name, summary)
+        return summary
+
+    def store(self, deck_name, summary):
+        """ cache a deck's summary, call after the deck has been written """
+
+        entry = {
+            'stamp': get_deck_stamp(deck_name, self.directory),
+            'summary': summary,
+        }
+
+        with self.lock:
+            self.entries[deck_name] = entry
+
+        self.save()
+
+    def attach_stats(self, deck):
+        """
+        Give a freshly opened deck the stats cached for it, so they are only
+        built from its cards if the deck changed since it was summarized.
+        """
+
+        summary = self.get_summary(deck.get_deck_name())
+        if summary is not None:
+            deck.set_stats(DeckStats.from_dict(summary['stats']))
+        else:
+            deck.get_stats()
+
+        return deck
+
+    def get_stats(self, deck_name):
+        """ return the stats of a deck, loading it if its summary is out of date """
+        return DeckStats.from_dict(self.get_summary(deck_name, load=True)['stats'])
+
+    def refresh(self):
+        """ bring the summary of every deck up to date and drop removed decks """
+
+        deck_names = list_decks(self.directory)
+        for deck_name in deck_names:
+            self.get_summary(deck_name, load=True)
+
+        for deck_name in set(self.entries) - set(deck_names):
+            del self.entries[deck_name]
+
+        self.save()
+
+def has_pending(summary, now=None):
+    """ returns True if a deck with this summary may have cards pending """
+
+    if now is None:
+        now = datetime.now()
+
+    if summary['pending']:
+        return True
+
+    next_due = summary['next_due']
+    return next_due is not None and datetime.strptime(next_due, TIME_FORMAT) <= now
+
+def get_pending_label(summary, now=None):
+    """ return the pending count of a summary as text, e.g. '12' or '12+' """
+
+    if now is None:
+        now = datetime.now()
+
+    # more cards may have come due since the count was taken
+    next_due = summary['next_due']
+    if next_due is not None and datetime.strptime(next_due, TIME_FORMAT) <= now:
+        return str(summary['pending']) + "+"
+
+    return str(summary['pending'])
+
+def main():
+    """ rebuild the catalog and print the summary of every deck """
+
+    catalog = DeckCatalog()
+    catalog.refresh()
+
+    for deck_name in list_decks():
+        summary = catalog.get_summary(deck_name)
+        print("{}: {} cards, {} pending".format(deck_name, summary['card_total'], get_pending_label(summary)))
+
+if __name__ == "__main__":
+    main()
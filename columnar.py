@@ -0,0 +1,167 @@
+import sys
+import time
+import random
+from datetime import datetime, timedelta
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECONDS_PER_DAY = 24 * 60 * 60 * 1000000
+
+def to_epoch(t):
+    """ convert a naive datetime to integer microseconds since the epoch """
+    return (t - EPOCH) // timedelta(microseconds=1)
+
+def from_epoch(microseconds):
+    """ convert microseconds since the epoch back to a naive datetime """
+    return EPOCH + timedelta(microseconds=int(microseconds))
+
+class ColumnarSchedule:
+    """
+    ColumnarSchedule Class
+        The scheduling fields of a deck held in NumPy arrays, one entry
+        per card in deck order, so pending selection and due-time
+        queries run as single vectorized operations. The text fields
+        stay on the Flashcard objects and are only read for shown cards.
+        Deleted cards keep their entry, which is never due again.
+    """
+
+    def __init__(self, flashcards, get_due_time):
+        if np is None:
+            raise ImportError("ColumnarSchedule requires numpy (pip install numpy)")
+
+        n = len(flashcards)
+
+        # due times come from the deck's scheduler, which caches them on the cards
+        self.get_due_time = get_due_time
+
+        self.mem_level = np.fromiter((card.get_mem_level() for card in flashcards), dtype=np.int8, count=n)
+
+        # flashcards hold their last review as a datetime already
+        last_reviews = (to_epoch(card.get_last_review()) for card in flashcards)
+        self.last_review = np.fromiter(last_reviews, dtype=np.int64, count=n)
+
+        due_times = (to_epoch(get_due_time(card)) for card in flashcards)
+        self.next_due = np.fromiter(due_times, dtype=np.int64, count=n)
+
+        # card id -> position of the card's entry
+        self.positions = {card.get_id(): i for i, card in enumerate(flashcards)}
+
+    def __len__(self):
+        return len(self.mem_level)
+
+    def pending_mask(self, now=None):
+        """ return a boolean array marking the cards pending for review """
+
+        if now is None:
+            now = datetime.now()
+
+        return self.next_due <= to_epoch(now)
+
+    def get_number_pending(self, now=None):
+        """ return number of cards pending for review """
+        return int(np.count_nonzero(self.pending_mask(now)))
+
+    def get_pending_indices(self, now=None):
+        """ return the deck positions of the pending cards, shuffled """
+
+        indices = np.flatnonzero(self.pending_mask(now))
+        np.random.shuffle(indices)
+        return indices
+
+    def get_due_within(self, days, now=None):
+        """ return the deck positions of cards due in the next number of days """
+
+        if now is None:
+            now = datetime.now()
+
+        limit = to_epoch(now + timedelta(days=days))
+        return np.flatnonzero(self.next_due <= limit)
+
+    def count_due_per_day(self, days, now=None):
+        """ return how many cards come due on each of the next number of days """
+
+        if now is None:
+            now = datetime.now()
+
+        # day 0 also holds every card that is already pending
+        offsets = (self.next_due - to_epoch(now)) // MICROSECONDS_PER_DAY
+        offsets = np.clip(offsets, 0, None)
+        return np.bincount(offsets[offsets < days], minlength=days)
+
+    def update(self, card, due_time=None):
+        """ refresh the scheduling fields of a card, due_time overrides the scheduler's """
+
+        if due_time is None:
+            due_time = self.get_due_time(card)
+
+        index = self.positions[card.get_id()]
+        self.mem_level[index] = card.get_mem_level()
+        self.last_review[index] = to_epoch(card.get_last_review())
+        self.next_due[index] = to_epoch(due_time)
+
+    def append(self, card):
+        """ add the scheduling fields of a card added at the end of the deck """
+        self.extend([card])
+
+    def extend(self, flashcards):
+        """ add the scheduling fields of cards added at the end of the deck """
+
+        start = len(self.mem_level)
+        n = len(flashcards)
+        self.mem_level = np.append(self.mem_level, np.zeros(n, dtype=np.int8))
+        self.last_review = np.append(self.last_review, np.zeros(n, dtype=np.int64))
+        self.next_due = np.append(self.next_due, np.zeros(n, dtype=np.int64))
+
+        for i, card in enumerate(flashcards):
+            self.positions[card.get_id()] = start + i
+            self.update(card)
+
+    def remove(self, card):
+        """ stop counting a deleted card """
+
+        index = self.positions.pop(card.get_id())
+        self.next_due[index] = np.iinfo(np.int64).max
+def benchmark(sizes):
+    """ compare the per-card pending loop with the vectorized version """
+
+    from deck import TIME_FORMAT, Flashcard, FlashcardDeck, get_scheduler
+
+    now = datetime.now()
+
+    # stand-in deck that skips loading from disk
+    deck = FlashcardDeck.__new__(FlashcardDeck)
+    deck.scheduler = get_scheduler("Fibonacci")
+
+    for n in sizes:
+        flashcards = [
+            Flashcard({
+                'front': "front",
+                'back': "back",
+                'notes': "",
+                'last_review': (now - timedelta(days=random.uniform(0, 30))).strftime(TIME_FORMAT),
+                'mem_level': random.randint(0, 8),
+            })
+            for _ in range(n)
+        ]
+
+        start = time.perf_counter()
+        [card for card in flashcards if deck.check_pending(card)]
+        loop_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        schedule = ColumnarSchedule(flashcards, deck.get_due_time)
+        build_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        schedule.get_number_pending()
+        count_time = time.perf_counter() - start
+
+        print("{:>8} cards: loop {:8.1f} ms | build {:8.1f} ms | count {:6.2f} ms | {:6.0f}x per scan".format(
+            n, loop_time * 1000, build_time * 1000, count_time * 1000, loop_time / count_time))
+
+if __name__ == "__main__":
+    benchmark([int(x) for x in sys.argv[1:]] or [10**4, 10**5, 10**6])
@@ -0,0 +1,893 @@
+import os
+import json
+from datetime import datetime, timedelta
+import heapq
+import itertools
+import random
+import threading
+
+from journal import DeckJournal, write_json_atomic
+from instrumentation import timed, count
+from schedulers import SRS_KEYS, SCHEDULERS, get_srs_interval, get_scheduler
+from duplicates import KEEP, MERGE, REJECT, DuplicateIndex, DuplicateCardError, check_policy, merge_text
+from stats import DeckStats
+
+DECK_DIRECTORY = "./decks/"
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+# version of the deck file layout, older deck files are upgraded by validator.py
+SCHEMA_VERSION = 1
+
+# fields the card browser can sort cards by
+SORT_COLUMNS = ("front", "back", "mem_level", "due_time")
+
+def parse_review_time(review_time):
+    """ convert a stored review time to a datetime if needed """
+
+    # also accepts times written by str() without the microseconds
+    if type(review_time) == str:
+        return datetime.fromisoformat(review_time)
+
+    return review_time
+
+def check_sort_column(sort_by):
+    if sort_by not in SORT_COLUMNS:
+        raise ValueError("cards can't be sorted by " + str(sort_by))
+
+def assign_card_ids(card_dicts, next_card_id=0):
+    """
+    Give an id to the card dicts of a deck file that have none, returns the
+    id for the deck's next new card. Cards written before cards had ids
+    get the next free ones, which for a deck without any ids are their
+    positions, so the card numbers in older journals and histories match.
+    """
+
+    for card in card_dicts:
+        if card.get('id') is not None:
+            next_card_id = max(next_card_id, card['id'] + 1)
+
+    for card in card_dicts:
+        if card.get('id') is None:
+            card['id'] = next_card_id
+            next_card_id += 1
+
+    return next_card_id
+
+def list_decks(directory=DECK_DIRECTORY):
+    """ returns sorted list of the decks found in a directory """
+
+    # hidden files such as the deck catalog are not decks
+    files_found = os.listdir(directory)
+    decks = {os.path.splitext(f)[0] for f in files_found
+             if not f.startswith(".") and os.path.splitext(f)[1] in (".json", ".sqlite", ".deck")}
+    return sorted(decks)
+
+def create_deck(deck_name, srs_method):
+    """ write the file for a new, empty deck """
+
+    new_deck = {"schema_version":SCHEMA_VERSION,"srs_method":srs_method,"flashcards":[]}
+    write_json_atomic(DECK_DIRECTORY + deck_name + ".json", new_deck)
+
+def open_deck(deck_name, use_server=False, directory=DECK_DIRECTORY):
+    """
+    Open a deck with the backend matching the file found in directory.
+    With use_server, a running deck server's copy of the deck is used
+    instead, for callers that only use the operations RemoteFlashcardDeck
+    serves.
+    """
+
+    # a running deck server owns the deck files, go through it instead,
+    # it only serves the default deck directory
+    if use_server and directory == DECK_DIRECTORY:
+        from remote_deck import RemoteFlashcardDeck, get_server_address
+        address = get_server_address()
+        if address is not None:
+            return RemoteFlashcardDeck(deck_name, address)
+
+    if os.path.exists(directory + deck_name + ".sqlite"):
+        from sqlite_deck import SQLiteFlashcardDeck
+        return SQLiteFlashcardDeck(deck_name, directory)
+
+    if os.path.exists(directory + deck_name + ".deck"):
+        from binary_deck import BinaryFlashcardDeck
+        return BinaryFlashcardDeck(deck_name, directory)
+
+    return FlashcardDeck(deck_name, directory)
+
+class Flashcard:
+    # no per-card __dict__, large decks hold one of these per card
+    __slots__ = ("card_id", "front", "back", "notes", "last_review", "mem_level", "srs_data", "due_time")
+
+    def __init__(self, flashcard_dict):
+        # stable id of the card in its deck, assigned by the deck
+        self.card_id     = flashcard_dict.get('id')
+
+        self.front       = flashcard_dict['front'] 
+        self.back        = flashcard_dict['back'] 
+        self.notes       = flashcard_dict['notes']
+        self.last_review = parse_review_time(flashcard_dict['last_review'])
+        self.mem_level   = flashcard_dict['mem_level'] 
+
+        # per-card state of schedulers other than Fibonacci, e.g. SM-2's ease
+        self.srs_data    = flashcard_dict.get('srs_data')
+
+        # next due time, cached by the deck since it depends on the scheduler
+        self.due_time    = None
+
+    def get_id(self):
+        return self.card_id
+
+    def get_front(self):
+        return self.front
+
+    def get_back(self):
+        return self.back
+
+    def get_notes(self):
+        return self.notes
+
+    def get_mem_level(self):
+        return self.mem_level
+
+    def get_last_review(self):
+        return self.last_review
+
+    def get_srs_data(self):
+        return self.srs_data
+
+    def get_due_time(self):
+        return self.due_time
+
+    def get_as_dict(self):
+        """ return flashcard object as a dict """
+
+        card_dict = {}
+
+        if self.card_id is not None:
+            card_dict['id'] = self.card_id
+
+        card_dict['front'] = self.front 
+        card_dict['back'] = self.back
+        card_dict['notes'] = self.notes
+        card_dict['last_review'] = self.last_review.strftime(TIME_FORMAT)
+        card_dict['mem_level'] = self.mem_level
+
+        if self.srs_data is not None:
+            card_dict['srs_data'] = self.srs_data
+
+        return card_dict
+
+    def set_id(self, card_id):
+        self.card_id = card_id
+
+    def set_front(self, front):
+        self.front = front
+
+    def set_back(self, back):
+        self.back = back
+
+    def set_notes(self, notes):
+        self.notes = notes
+
+    def set_last_review(self, t):
+        self.last_review = parse_review_time(t)
+        self.due_time = None
+
+    def set_due_time(self, t):
+        self.due_time = t
+
+    def set_srs_data(self, srs_data):
+        self.srs_data = srs_data
+        self.due_time = None
+
+    def set_mem_level(self, mem_level):
+        self.mem_level = mem_level
+        self.due_time = None
+
+    def inc_mem_level(self):
+        if self.mem_level < 9:
+            self.mem_level += 1
+            self.due_time = None
+
+    def dec_mem_level(self):
+        if self.mem_level > 0:
+            self.mem_level -= 1
+            self.due_time = None
+
+class FlashcardDeck:
+    @timed("deck.load")
+    def __init__(self, deck_name, directory=DECK_DIRECTORY):
+        # initialize deck or create new if doesn't exist
+        self.deck_name = deck_name
+        self.deck_file_name = directory + self.deck_name + ".json"
+        self.journal = DeckJournal(
+            directory + self.deck_name + ".journal",
+            directory + self.deck_name + ".history",
+        )
+
+        # optional vectorized copy of the scheduling fields
+        self.columnar = None
+
+        # fronts of the cards for duplicate checks, built when first needed
+        self.duplicate_index = None
+
+        # forecast and retention counts, built when first needed
+        self.stats = None
+
+        # optional background writer, and the lock it takes while it
+        # copies the cards that the GUI thread may be changing
+        self.writer = None
+        self.lock = threading.Lock()
+
+        with open(self.deck_file_name, "r") as f:
+            self.deck = json.load(f)
+        self.journal.set_deck_size(os.path.getsize(self.deck_file_name))
+
+        # get srs_method and load key
+        self.load_srs_method()
+
+        # get list of flashcard objects
+        self.load_flashcards()
+
+    def load_flashcards(self):
+        """ Load all the flashcard dicts are Flaschard objects """
+
+        # the raw dicts are not needed once the cards are built
+        flashcards = self.deck.pop("flashcards")
+
+        # ids are never reused, even those of deleted cards, so the deck
+        # remembers the next one to hand out
+        self.next_card_id = assign_card_ids(flashcards, self.deck.pop("next_card_id", 0))
+
+        # card id -> card, in the order the cards were added
+        self.flashcards = {x['id']: Flashcard(x) for x in flashcards}
+
+        # apply changes made since the deck file was last written
+        self.replay_journal()
+
+        self.update_pending()
+
+    def replay_journal(self):
+        """ apply the records of the deck's journal to the loaded flashcards """
+
+        for record in self.journal.read_records():
+            card_id = record['card']
+
+            if record['op'] == "add":
+                # the add is already part of the deck file if the deck was
+                # written but the journal was not cleared before a crash
+                if card_id >= self.next_card_id:
+                    card = Flashcard(record['flashcard'])
+                    card.set_id(card_id)
+                    self.flashcards[card_id] = card
+                    self.next_card_id = card_id + 1
+
+            elif record['op'] == "delete":
+                self.flashcards.pop(card_id, None)
+
+            # the card is missing if it was deleted later on, and the
+            # deck written before the journal was cleared
+            elif card_id not in self.flashcards:
+                continue
+
+            elif record['op'] == "edit":
+                # merges only change the back and notes
+                card = self.flashcards[card_id]
+                card.set_front(record.get('front', card.get_front()))
+                card.set_back(record['back'])
+                card.set_notes(record['notes'])
+
+            elif record['op'] == "review":
+                card = self.flashcards[card_id]
+                card.set_last_review(record['last_review'])
+                card.set_mem_level(record['mem_level'])
+                card.set_srs_data(record.get('srs_data'))
+
+    def new_card_id(self):
+        """ return the id for a new card """
+
+        card_id = self.next_card_id
+        self.next_card_id += 1
+        return card_id
+
+    @timed("deck.update_pending")
+    def update_pending(self):
+        """ rebuild the list of pending cards and the due-time heap """
+
+        # pending cards are kept in random order, the rest are kept
+        # in a heap keyed on the time they next become due
+        self.pending_flashcards = []
+        self.pending_positions = {}
+        self.due_heap = []
+        self.due_entries = {}
+        self.due_counter = itertools.count()
+
+        # pending cards ordered by due time, built when first needed
+        self.earliest_heap = []
+
+        curr_time = datetime.now()
+        for card in self.flashcards.values():
+            due_time = self.get_due_time(card)
+            if due_time <= curr_time:
+                self.add_pending(card)
+            else:
+                entry = [due_time, next(self.due_counter), card]
+                self.due_entries[card] = entry
+                self.due_heap.append(entry)
+
+        heapq.heapify(self.due_heap)
+
+    @timed("deck.refresh_pending")
+    def refresh_pending(self):
+        """ move cards that have come due from the heap to the pending list """
+
+        curr_time = datetime.now()
+        while self.due_heap and self.due_heap[0][0] <= curr_time:
+            _, _, card = heapq.heappop(self.due_heap)
+
+            # entry was invalidated when the card was rescheduled
+            if card is None:
+                continue
+
+            del self.due_entries[card]
+            self.add_pending(card)
+
+    def add_pending(self, card):
+        """ insert a card at a random position of the pending list """
+
+        # swapping into a random slot keeps the list uniformly shuffled
+        # without reshuffling it on every insert
+        self.pending_flashcards.append(card)
+        last = len(self.pending_flashcards) - 1
+        i = random.randint(0, last)
+        other = self.pending_flashcards[i]
+        self.pending_flashcards[i], self.pending_flashcards[last] = card, other
+        self.pending_positions[other] = last
+        self.pending_positions[card] = i
+
+    def remove_pending(self, card):
+        """ remove a card from the pending list if it is in it """
+
+        if card not in self.pending_positions:
+            return
+
+        i = self.pending_positions.pop(card)
+        last_card = self.pending_flashcards.pop()
+        if last_card is not card:
+            self.pending_flashcards[i] = last_card
+            self.pending_positions[last_card] = i
+
+    def unschedule_card(self, card):
+        """ remove a card from both the pending list and the due-time heap """
+
+        # the stale heap entry is skipped once it reaches the top
+        entry = self.due_entries.pop(card, None)
+        if entry is not None:
+            entry[-1] = None
+
+        self.remove_pending(card)
+
+    def schedule_card(self, card):
+        """ (re)insert a card into the pending list or due-time heap """
+
+        self.unschedule_card(card)
+
+        due_time = self.get_due_time(card)
+        if due_time <= datetime.now():
+            self.add_pending(card)
+        else:
+            entry = [due_time, next(self.due_counter), card]
+            self.due_entries[card] = entry
+            heapq.heappush(self.due_heap, entry)
+
+    def load_srs_method(self):
+        """ load the scheduler for the deck's srs method """
+
+        self.srs_method = self.deck.get("srs_method")
+        self.scheduler = get_scheduler(self.srs_method, self.deck.get("srs_params"))
+
+    def set_srs_params(self, srs_params):
+        """ replace the parameters of the deck's scheduler, e.g. fitted FSRS weights """
+
+        self.deck["srs_params"] = srs_params
+        self.load_srs_method()
+        self.save_deck()
+
+    def enable_columnar(self):
+        """ keep the scheduling fields in NumPy arrays for vectorized queries """
+
+        from columnar import ColumnarSchedule
+        self.columnar = ColumnarSchedule(list(self.flashcards.values()), self.get_due_time)
+        return self.columnar
+
+    def get_total_number_of_cards(self):
+        """ return total number of cards in deck """
+        return len(self.flashcards)
+
+    def iter_flashcards(self):
+        """ return an iterator of (card id, flashcard) over every card of the deck """
+        return iter(self.flashcards.items())
+
+    def iter_fronts(self):
+        """ return an iterator of (card id, front) over every card of the deck """
+        return ((card_id, card.get_front()) for card_id, card in self.flashcards.items())
+
+    def get_flashcard(self, card_id):
+        """ return the card with the given id, raises KeyError if there is none """
+        return self.flashcards[card_id]
+
+    def get_flashcards(self, card_ids):
+        """ return the cards with the given ids, in the same order """
+        return [self.get_flashcard(card_id) for card_id in card_ids]
+
+    @timed("deck.find_cards")
+    def find_cards(self, text="", mem_level=None, sort_by="due_time", descending=False):
+        """
+        Return the ids of the cards whose front, back or notes contain text,
+        ignoring case, and that are at mem_level if it is given, sorted by
+        one of SORT_COLUMNS. The card browser only keeps these ids and reads
+        the cards it shows with get_flashcards.
+        """
+
+        # cards may be added or deleted on another thread in the meantime
+        check_sort_column(sort_by)
+        cards = dict(self.flashcards)
+        card_ids = list(cards)
+
+        if mem_level is not None:
+            card_ids = [i for i in card_ids if cards[i].get_mem_level() == mem_level]
+
+        if text:
+            text = text.casefold()
+            card_ids = [i for i in card_ids
+                        if text in cards[i].get_front().casefold()
+                        or text in cards[i].get_back().casefold()
+                        or text in (cards[i].get_notes() or "").casefold()]
+
+        sort_keys = {
+            'front': lambda i: cards[i].get_front().casefold(),
+            'back': lambda i: cards[i].get_back().casefold(),
+            'mem_level': lambda i: cards[i].get_mem_level(),
+            'due_time': lambda i: self.get_due_time(cards[i]),
+        }
+
+        # the sort is stable, cards that tie stay in the order they were added
+        return sorted(card_ids, key=sort_keys[sort_by], reverse=descending)
+
+    def get_duplicate_index(self):
+        """ return the hash index of the deck's card fronts, built on first use """
+
+        if self.duplicate_index is None:
+            self.duplicate_index = DuplicateIndex(self.iter_fronts())
+
+        return self.duplicate_index
+
+    def find_duplicates(self, front):
+        """ return the ids of the cards with the same normalized front, oldest first """
+        return self.get_duplicate_index().find(front)
+
+    def check_duplicate(self, front, back, notes, on_duplicate):
+        """
+        Apply a duplicate policy to a card about to be added. Returns the id
+        of the card it was merged into, or None if it should be added.
+        """
+
+        check_policy(on_duplicate)
+        if on_duplicate == KEEP:
+            return None
+
+        duplicates = self.find_duplicates(front)
+        if not duplicates:
+            return None
+
+        if on_duplicate == REJECT:
+            raise DuplicateCardError(duplicates[0], front)
+
+        self.merge_flashcard(duplicates[0], back, notes)
+        return duplicates[0]
+
+    def filter_duplicates(self, card_dicts, on_duplicate):
+        """
+        Return the cards of a batch whose front is neither in the deck nor
+        earlier in the batch. With the merge policy the others are merged
+        into the card they repeat, otherwise they are dropped.
+        """
+
+        new_cards = []
+        batch_index = DuplicateIndex()
+
+        for card in card_dicts:
+            earlier = batch_index.find(card['front'])
+            if earlier:
+                if on_duplicate == MERGE:
+                    first = new_cards[earlier[0]]
+                    first['back'] = merge_text(first['back'], card['back'])
+                    first['notes'] = merge_text(first.get('notes', ""), card.get('notes', ""))
+                continue
+
+            duplicates = self.find_duplicates(card['front'])
+            if duplicates:
+                if on_duplicate == MERGE:
+                    self.merge_flashcard(duplicates[0], card['back'], card.get('notes', ""))
+                continue
+
+            batch_index.add(len(new_cards), card['front'])
+            new_cards.append(dict(card))
+
+        return new_cards
+
+    @timed("deck.build_stats")
+    def build_stats(self):
+        """ count the deck's cards by due day and memory level, and its answers by day """
+
+        stats = DeckStats()
+        for card in self.flashcards.values():
+            stats.add_card(self.get_due_time(card), card.get_mem_level())
+
+        for _, review_time, answer in self.get_review_history():
+            stats.add_review(review_time, answer)
+
+        return stats
+
+    def get_stats(self):
+        """ return the deck's DeckStats, kept up to date as cards are added and answered """
+
+        if self.stats is None:
+            self.stats = self.build_stats()
+
+        return self.stats
+
+    def set_stats(self, stats):
+        """ use stats cached from an earlier session, call before changing the deck """
+        self.stats = stats
+
+    def get_due_time(self, flashcard):
+        """ return the time at which the flashcard is next pending """
+
+        # set when the card is answered, or computed once after loading
+        due_time = flashcard.get_due_time()
+        if due_time is None:
+            count("deck.due_time_computed")
+            interval = self.scheduler.get_interval(flashcard.get_mem_level(), flashcard.get_srs_data())
+            due_time = flashcard.get_last_review() + timedelta(days=interval)
+            flashcard.set_due_time(due_time)
+
+        return due_time
+
+    @timed("deck.check_pending")
+    def check_pending(self, flashcard):
+        """ returns True if the flashcard is pending for review """
+
+        # more time has elapsed than required at current mem level
+        if self.get_due_time(flashcard) <= datetime.now():
+            return True
+
+        return False
+
+    @timed("deck.get_number_pending")
+    def get_number_pending(self):
+        """ return number of cards pending for review """
+        self.refresh_pending()
+        return len(self.pending_flashcards)
+
+    def get_next_due_time(self):
+        """ return the time the next scheduled card becomes due, if any """
+
+        while self.due_heap and self.due_heap[0][-1] is None:
+            heapq.heappop(self.due_heap)
+
+        if not self.due_heap:
+            return None
+
+        return self.due_heap[0][0]
+
+    def get_deck_name(self):
+        """ return the name of the deck """
+        return self.deck_name
+
+    @timed("deck.add_flashcard")
+    def add_flashcard(self, front, back, notes, on_duplicate=KEEP):
+        """
+        Add flashcard to deck, returns the new card's id. If a card with the
+        same front exists, on_duplicate decides whether the card is added
+        anyway ("keep"), raises DuplicateCardError ("reject") or is merged
+        into the existing card ("merge"), whose id is then returned.
+        """
+
+        merged_id = self.check_duplicate(front, back, notes, on_duplicate)
+        if merged_id is not None:
+            return merged_id
+
+        # create dict with card info
+        card_info_dict = {}
+        card_info_dict['front'] = front
+        card_info_dict['back'] = back
+        card_info_dict['notes'] = notes
+        card_info_dict['last_review'] = datetime.now()
+        card_info_dict['mem_level'] = 0
+
+        # add card to deck
+        new_card = Flashcard(card_info_dict)
+        with self.lock:
+            card_id = self.new_card_id()
+            new_card.set_id(card_id)
+            self.flashcards[card_id] = new_card
+
+        self.schedule_card(new_card)
+        if self.columnar is not None:
+            self.columnar.append(new_card)
+        if self.duplicate_index is not None:
+            self.duplicate_index.add(card_id, front)
+        if self.stats is not None:
+            self.stats.add_card(self.get_due_time(new_card), new_card.get_mem_level())
+
+        self.log_change({
+            'op': "add",
+            'card': card_id,
+            'flashcard': new_card.get_as_dict(),
+        })
+
+        return card_id
+
+    def add_flashcards(self, card_dicts, on_duplicate=KEEP, journal=False):
+        """
+        Add a batch of flashcard dicts, the caller saves the deck after
+        unless journal is set, in which case the cards are journaled like
+        single new cards. Unless on_duplicate is "keep", cards repeating a
+        front are merged ("merge") or skipped ("reject"). Returns the number
+        of cards added.
+        """
+
+        check_policy(on_duplicate)
+        if on_duplicate != KEEP:
+            card_dicts = self.filter_duplicates(card_dicts, on_duplicate)
+
+        # cards from another deck get new ids in this one
+        new_cards = [Flashcard(x) for x in card_dicts]
+        with self.lock:
+            for card in new_cards:
+                card.set_id(self.new_card_id())
+                self.flashcards[card.get_id()] = card
+
+        if self.duplicate_index is not None:
+            for card in new_cards:
+                self.duplicate_index.add(card.get_id(), card.get_front())
+        if self.stats is not None:
+            for card in new_cards:
+                self.stats.add_card(self.get_due_time(card), card.get_mem_level())
+
+        # new cards are usually due right away, making this O(1) per card
+        for card in new_cards:
+            self.schedule_card(card)
+
+        if self.columnar is not None:
+            self.columnar.extend(new_cards)
+
+        if journal:
+            for card in new_cards:
+                self.log_change({'op': "add", 'card': card.get_id(), 'flashcard': card.get_as_dict()})
+
+        return len(new_cards)
+
+    def merge_flashcard(self, card_id, back, notes):
+        """ add the back and notes of a duplicate card to an existing card """
+
+        card = self.flashcards[card_id]
+        merged_back = merge_text(card.get_back(), back)
+        merged_notes = merge_text(card.get_notes(), notes)
+        if merged_back == card.get_back() and merged_notes == card.get_notes():
+            return
+
+        with self.lock:
+            card.set_back(merged_back)
+            card.set_notes(merged_notes)
+
+        self.log_change({
+            'op': "edit",
+            'card': card_id,
+            'back': merged_back,
+            'notes': merged_notes,
+        })
+
+    def edit_flashcard(self, card_id, front, back, notes):
+        """ replace the front, back and notes of a card """
+
+        card = self.flashcards[card_id]
+        if self.duplicate_index is not None and front != card.get_front():
+            self.duplicate_index.remove(card_id, card.get_front())
+            self.duplicate_index.add(card_id, front)
+
+        with self.lock:
+            card.set_front(front)
+            card.set_back(back)
+            card.set_notes(notes)
+
+        self.log_change({
+            'op': "edit",
+            'card': card_id,
+            'front': front,
+            'back': back,
+            'notes': notes,
+        })
+
+    def delete_flashcard(self, card_id):
+        """ remove a card from the deck, raises KeyError if there is none """
+
+        card = self.flashcards[card_id]
+        with self.lock:
+            del self.flashcards[card_id]
+
+        self.unschedule_card(card)
+        if self.columnar is not None:
+            self.columnar.remove(card)
+        if self.duplicate_index is not None:
+            self.duplicate_index.remove(card_id, card.get_front())
+        if self.stats is not None:
+            self.stats.remove_card(self.get_due_time(card), card.get_mem_level())
+
+        self.log_change({
+            'op': "delete",
+            'card': card_id,
+        })
+
+    def enable_background_writes(self):
+        """ hand journal appends and deck writes to a background thread """
+
+        from writer import DeckWriter
+        self.writer = DeckWriter(self)
+
+    def log_change(self, record):
+        """ append a change to the journal, compacting it when it gets large """
+
+        if self.writer is not None:
+            self.writer.log_change(record)
+            return
+
+        self.journal.append(record)
+
+        if self.journal.needs_compaction():
+            self.write_deck()
+
+    @timed("deck.save_deck")
+    def save_deck(self):
+        """ write the deck as a json """
+
+        # the background writer folds this into its next write
+        if self.writer is not None:
+            self.writer.request_save()
+            return
+
+        self.write_deck()
+
+    @timed("deck.write_deck")
+    def write_deck(self):
+        """ write the deck file and clear the journal it now contains """
+
+        # keeps deck-level settings such as srs_params
+        with self.lock:
+            deck_dict = dict(self.deck)
+            deck_dict['schema_version'] = SCHEMA_VERSION
+            deck_dict['next_card_id'] = self.next_card_id
+            deck_dict['flashcards'] = [x.get_as_dict() for x in self.flashcards.values()]
+
+        # write to json file, the old file stays intact until the rename
+        write_json_atomic(self.deck_file_name, deck_dict)
+        deck_size = os.path.getsize(self.deck_file_name)
+        count("deck.bytes_written", deck_size)
+
+        # the journal is now part of the deck file
+        self.journal.clear()
+        self.journal.set_deck_size(deck_size)
+
+    def close(self):
+        """ fold any outstanding journal records into the deck file """
+
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+            return
+
+        if not self.journal.is_empty():
+            self.write_deck()
+
+    @timed("deck.get_next_flashcard")
+    def get_next_flashcard(self):
+        """ return the next available pending flashcard """
+
+        self.refresh_pending()
+
+        if not self.pending_flashcards:
+            return None
+
+        card = self.pending_flashcards.pop()
+        del self.pending_positions[card]
+        return card
+
+    def get_earliest_flashcard(self):
+        """ like get_next_flashcard, but hand out the card that has been due the longest """
+
+        self.refresh_pending()
+
+        while True:
+            # rebuilt from the pending list whenever it runs out, cards that
+            # became pending since are due later than the ones it holds
+            if not self.earliest_heap:
+                if not self.pending_flashcards:
+                    return None
+                self.earliest_heap = [(self.get_due_time(card), i, card)
+                                      for i, card in enumerate(self.pending_flashcards)]
+                heapq.heapify(self.earliest_heap)
+
+            # entries of cards handed out since the heap was built are skipped
+            _, _, card = heapq.heappop(self.earliest_heap)
+            if card in self.pending_positions:
+                self.remove_pending(card)
+                return card
+
+    def put_back_flashcard(self, card):
+        """ return a card handed out by get_next_flashcard but not answered """
+
+        # the card may have been deleted while it was handed out
+        if self.flashcards.get(card.get_id()) is not card:
+            return
+
+        if card not in self.pending_positions and card not in self.due_entries:
+            self.add_pending(card)
+
+    @timed("deck.log_answer")
+    def log_answer(self, curr_card, answer):
+        """ update flashcard with time last reviewed and new mem level """
+
+        # the card may have been deleted while it was handed out
+        card_id = curr_card.get_id()
+        card = self.flashcards.get(card_id)
+        if card is not curr_card:
+            return
+
+        # the scheduler decides the next due time once, here
+        now = datetime.now()
+        elapsed_days = (now - card.get_last_review()) / timedelta(days=1)
+        mem_level, srs_data, interval = self.scheduler.review(
+            card.get_mem_level(), card.get_srs_data(), answer, elapsed_days)
+
+        old_due_time = self.get_due_time(card)
+        old_mem_level = card.get_mem_level()
+
+        with self.lock:
+            card.set_last_review(now)
+            card.set_mem_level(mem_level)
+            card.set_srs_data(srs_data)
+            card.set_due_time(now + timedelta(days=interval))
+
+        if self.stats is not None:
+            self.stats.reschedule_card(
+                old_due_time, old_mem_level, card.get_due_time(), mem_level, now, answer)
+
+        # TODO: this won't persist if app is closed before
+        # eventually getting this right in the same session
+        if answer:
+            self.schedule_card(card)
+        else:
+            self.unschedule_card(card)
+            self.add_pending(card)
+
+        # a card answered wrong stays pending in the columns too
+        if self.columnar is not None:
+            self.columnar.update(card, None if answer else now)
+
+        self.log_change({
+            'op': "review",
+            'card': card_id,
+            'last_review': card.get_last_review().strftime(TIME_FORMAT),
+            'answer': bool(answer),
+            'mem_level': card.get_mem_level(),
+            'srs_data': card.get_srs_data(),
+        })
+
+    def get_review_history(self):
+        """ return (card, review time, answer) for every recorded review, oldest first """
+
+        return [
+            (record['card'], record['last_review'], record['answer'])
+            for record in self.journal.read_history()
+        ]
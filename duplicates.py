@@ -0,0 +1,174 @@
+import time
+import hashlib
+import argparse
+import unicodedata
+
+# what happens when a card is added with the same front as an existing card
+KEEP = "keep"
+REJECT = "reject"
+MERGE = "merge"
+DUPLICATE_POLICIES = (KEEP, REJECT, MERGE)
+
+class DuplicateCardError(ValueError):
+    """ raised when a card is added with the reject policy and its front is already in the deck """
+
+    def __init__(self, card_id, front):
+        super().__init__("a card with the front " + repr(front) + " is already in the deck")
+        self.card_id = card_id
+
+def normalize_text(text):
+    """ return the form of a card's text that is compared when looking for duplicates """
+
+    # case, unicode composition and runs of whitespace don't make cards
+    # different, accents do ("però" and "pero" are different words)
+    return " ".join(unicodedata.normalize("NFKC", text or "").casefold().split())
+
+def text_key(text):
+    """ return the hash of a card's normalized text """
+
+    # 128 bits, so different texts never share a key in practice and the
+    # index doesn't have to keep the texts themselves
+    return hashlib.blake2b(normalize_text(text).encode("utf-8"), digest_size=16).digest()
+
+def merge_text(text, new_text):
+    """ add new_text to a card's back or notes unless it is already there """
+
+    lines = (text or "").split("\n")
+    if not normalize_text(new_text) or normalize_text(new_text) in {normalize_text(line) for line in lines}:
+        return text
+
+    if not normalize_text(text):
+        return new_text
+
+    return text + "\n" + new_text
+
+def check_policy(on_duplicate):
+    if on_duplicate not in DUPLICATE_POLICIES:
+        raise ValueError("unknown duplicate policy: " + str(on_duplicate))
+
+class DuplicateIndex:
+    """
+    DuplicateIndex Class
+        Hash index from the normalized front of a card to the cards that
+        have it, so checking a new card for duplicates takes constant time.
+        Cards are referred to by whatever the caller passes in, a card id
+        within a deck or a (deck name, card id) pair across decks.
+    """
+
+    def __init__(self, fronts=()):
+        # most fronts are unique, so a single card is stored as is and
+        # only repeated fronts get a list
+        self.cards = {}
+
+        for card, front in fronts:
+            self.add(card, front)
+
+    def __len__(self):
+        return len(self.cards)
+
+    def add(self, card, front):
+        """ add a card to the index """
+
+        key = text_key(front)
+        cards = self.cards.get(key)
+
+        if cards is None:
+            self.cards[key] = card
+        elif type(cards) == list:
+            cards.append(card)
+        else:
+            self.cards[key] = [cards, card]
+
+    def remove(self, card, front):
+        """ remove a card from the index, e.g. before its front changes """
+
+        key = text_key(front)
+        cards = self.cards.get(key)
+
+        if type(cards) == list:
+            if card in cards:
+                cards.remove(card)
+            if len(cards) == 1:
+                self.cards[key] = cards[0]
+        elif cards == card:
+            del self.cards[key]
+
+    def find(self, front):
+        """ return the cards with the same normalized front, oldest first """
+
+        cards = self.cards.get(text_key(front))
+
+        if cards is None:
+            return []
+        if type(cards) == list:
+            return list(cards)
+
+        return [cards]
+
+    def groups(self):
+        """ yield the lists of cards sharing a front """
+
+        for cards in self.cards.values():
+            if type(cards) == list:
+                yield cards
+
+def find_duplicate_groups(deck_names, across_decks=False):
+    """
+    Return lists of (deck name, card id, front) for cards sharing a front,
+    within each deck or across all of them, in a single pass over the cards.
+    """
+
+    from deck import open_deck
+
+    def with_fronts(groups):
+        return [[(name, card_id, decks[name].get_flashcard(card_id).get_front()) for name, card_id in group]
+                for group in groups]
+
+    duplicate_groups = []
+    index = DuplicateIndex()
+    decks = {}
+
+    for deck_name in deck_names:
+        # decks are only read, never closed, so nothing is written to them
+        decks[deck_name] = open_deck(deck_name)
+
+        for card_id, front in decks[deck_name].iter_fronts():
+            index.add((deck_name, card_id), front)
+
+        # within a single deck, the deck can be let go once it is checked
+        if not across_decks:
+            duplicate_groups.extend(with_fronts(index.groups()))
+            index = DuplicateIndex()
+            decks = {}
+
+    if across_decks:
+        duplicate_groups.extend(with_fronts(index.groups()))
+
+    return duplicate_groups
+
+def main():
+    """ print the cards that share a front with another card """
+
+    from deck import list_decks
+
+    parser = argparse.ArgumentParser(description="Find cards with the same front.")
+    parser.add_argument("deck_names", nargs="*", help="decks to check (default: all)")
+    parser.add_argument("--across-decks", action="store_true", help="also report fronts repeated in different decks")
+    args = parser.parse_args()
+
+    deck_names = args.deck_names or list_decks()
+
+    start = time.perf_counter()
+    groups = find_duplicate_groups(deck_names, args.across_decks)
+    elapsed = time.perf_counter() - start
+
+    for group in groups:
+        print(group[0][2])
+        for deck_name, card_id, _ in group:
+            print("    {} card {}".format(deck_name, card_id))
+
+    duplicates = sum(len(group) - 1 for group in groups)
+    print("{} duplicate cards in {} groups, found in {:.2f}s".format(duplicates, len(groups), elapsed))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1500 @@
+import os
+from array import array
+from collections import OrderedDict
+
+from PyQt6.QtCore import Qt, QObject, QRunnable, QThreadPool, QTimer, QAbstractTableModel, QModelIndex, QUrl, pyqtSignal
+from PyQt6.QtGui import QKeySequence, QShortcut, QPixmap, QImageReader, QDesktopServices
+
+from PyQt6.QtWidgets import (
+    QMainWindow,
+    QWidget,
+    QHBoxLayout,
+    QVBoxLayout,
+    QFormLayout,
+    QGridLayout,
+    QLabel,
+    QLineEdit,
+    QTextEdit,
+    QComboBox,
+    QListWidget,
+    QListWidgetItem,
+    QTableView,
+    QAbstractItemView,
+    QHeaderView,
+    QFrame,
+    QPushButton,
+    QMessageBox,
+    QFileDialog,
+    QSpacerItem,
+    QSizePolicy,
+)
+
+from deck import DECK_DIRECTORY, SCHEDULERS, SORT_COLUMNS, list_decks, create_deck, open_deck
+from catalog import DeckCatalog, summarize_deck, get_pending_label, get_deck_stamp
+from session import ReviewSession
+from search import MAX_RANKED_MATCHES, SearchIndex
+from duplicates import KEEP, MERGE, REJECT, DuplicateCardError
+from stats import RETENTION_DAYS, combine_stats, format_rate
+from schedulers import MAX_MEM_LEVEL
+from instrumentation import timed
+from media import IMAGE, SOUND, IMAGE_EXTENSIONS, SOUND_EXTENSIONS, MediaStore, split_media, find_media, \
+    hide_media_names, media_reference
+
+# sounds play in the app if Qt's multimedia module can be loaded, and in
+# the system's player otherwise
+try:
+    from PyQt6.QtMultimedia import QMediaPlayer, QAudioOutput
+except ImportError:
+    QMediaPlayer = None
+
+WINDOW_WIDTH = 700
+WINDOW_HEIGHT = 500
+POP_UP_WIDTH = 400
+POP_UP_HEIGHT = 250
+
+# days of the review forecast shown in the stats panel
+STATS_PANEL_DAYS = 7
+
+# cards fetched ahead of the one on screen, so the next one shows right away
+PREFETCH_CARDS = 3
+
+# the card browser reads and formats cards a page at a time, and keeps
+# only the last few pages it showed
+BROWSER_PAGE_SIZE = 100
+BROWSER_CACHED_PAGES = 10
+BROWSER_TEXT_LENGTH = 80
+
+# milliseconds to wait for more typing before filtering the card browser
+BROWSER_FILTER_DELAY = 250
+
+# card images are decoded no larger than they are shown, and the most
+# recently shown ones are kept up to this many bytes
+MEDIA_IMAGE_WIDTH = 440
+MEDIA_IMAGE_HEIGHT = 140
+MEDIA_CACHE_BYTES = 48 * 1024 * 1024
+
+class DeckTaskSignals(QObject):
+    """ signals of a DeckTask, which as a QRunnable can't have its own """
+
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+class DeckTask(QRunnable):
+    """
+    DeckTask Class
+        Runs a deck operation on a worker thread and reports the result
+        back to the GUI thread through its signals
+    """
+
+    def __init__(self, function, *args):
+        super().__init__()
+        self.function = function
+        self.args = args
+        self.signals = DeckTaskSignals()
+
+    def run(self):
+        try:
+            result = self.function(*self.args)
+        except Exception as e:
+            self.signals.failed.emit(type(e).__name__ + ": " + str(e))
+            return
+
+        self.signals.finished.emit(result)
+
+def decode_image(file_name, max_width, max_height):
+    """ read an image file, scaled down while decoding to fit the given size """
+
+    reader = QImageReader(file_name)
+    reader.setAutoTransform(True)
+
+    size = reader.size()
+    if size.isValid() and (size.width() > max_width or size.height() > max_height):
+        reader.setScaledSize(size.scaled(max_width, max_height, Qt.AspectRatioMode.KeepAspectRatio))
+
+    image = reader.read()
+    if image.isNull():
+        raise ValueError(reader.errorString())
+
+    return image
+
+class PixmapCache(QObject):
+    """
+    PixmapCache Class
+        The decoded images of the cards, keeping the most recently used up
+        to a number of bytes. Images are decoded on worker threads the
+        first time they are asked for, and loaded is emitted with the
+        image's name once it can be shown, or has failed to load.
+    """
+
+    loaded = pyqtSignal(str)
+
+    def __init__(self, store, max_bytes=MEDIA_CACHE_BYTES):
+        super().__init__()
+        self.store = store
+        self.max_bytes = max_bytes
+
+        # name -> pixmap, least recently used first
+        self.pixmaps = OrderedDict()
+        self.size = 0
+
+        # images being decoded, and those that couldn't be
+        self.pending = set()
+        self.failed = set()
+
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(2)
+
+    def get(self, name):
+        """ return a decoded image, or None while it is decoded """
+
+        pixmap = self.pixmaps.get(name)
+        if pixmap is None:
+            self.load(name)
+            return None
+
+        self.pixmaps.move_to_end(name)
+        return pixmap
+
+    def has_failed(self, name):
+        return name in self.failed
+
+    def load(self, name):
+        """ start decoding an image, unless it is cached or already being decoded """
+
+        if name in self.pixmaps or name in self.pending or name in self.failed:
+            return
+
+        try:
+            file_name = self.store.get_path(name)
+        except ValueError:
+            self.failed.add(name)
+            return
+
+        self.pending.add(name)
+        task = DeckTask(decode_image, file_name, MEDIA_IMAGE_WIDTH, MEDIA_IMAGE_HEIGHT)
+        task.signals.finished.connect(lambda image: self.image_decoded(name, image))
+        task.signals.failed.connect(lambda error: self.image_failed(name))
+        self.pool.start(task)
+
+    def image_decoded(self, name, image):
+        """ keep a decoded image, dropping the least recently used ones over the limit """
+
+        # pixmaps can only be made on the GUI thread
+        pixmap = QPixmap.fromImage(image)
+        self.pending.discard(name)
+        self.pixmaps[name] = pixmap
+        self.size += self.get_bytes(pixmap)
+
+        while self.size > self.max_bytes and len(self.pixmaps) > 1:
+            _, dropped = self.pixmaps.popitem(last=False)
+            self.size -= self.get_bytes(dropped)
+
+        self.loaded.emit(name)
+
+    def image_failed(self, name):
+        self.pending.discard(name)
+        self.failed.add(name)
+        self.loaded.emit(name)
+
+    def get_bytes(self, pixmap):
+        return pixmap.width() * pixmap.height() * pixmap.depth() // 8
+
+class CardImages(QWidget):
+    """
+    CardImages Class
+        The images of one side of a card, side by side, each shown once
+        the pixmap cache has decoded it
+    """
+
+    def __init__(self, cache):
+        super().__init__()
+        self.cache = cache
+        self.names = []
+        self.labels = []
+
+        self.images_layout = QHBoxLayout()
+        self.images_layout.setContentsMargins(0, 0, 0, 0)
+        self.images_layout.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.setLayout(self.images_layout)
+        self.hide()
+
+    def show_images(self, names):
+        """ show these images, or hide the row if there are none """
+
+        self.names = names
+
+        # labels are kept for the next card once made
+        while len(self.labels) < len(names):
+            label = QLabel()
+            label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+            self.images_layout.addWidget(label)
+            self.labels.append(label)
+
+        for i, label in enumerate(self.labels):
+            label.setVisible(i < len(names))
+
+        self.setVisible(bool(names))
+        self.refresh()
+
+    def refresh(self, name=None):
+        """ show the images that are decoded, or only the given one """
+
+        for label, image_name in zip(self.labels, self.names):
+            if name is not None and image_name != name:
+                continue
+
+            pixmap = self.cache.get(image_name)
+            if pixmap is not None:
+                label.setPixmap(pixmap)
+            elif self.cache.has_failed(image_name):
+                label.setText("[missing image]")
+            else:
+                label.setText("…")
+
+class CardTableModel(QAbstractTableModel):
+    """
+    CardTableModel Class
+        Table of a deck's cards for the card browser. It only holds the
+        ids of the cards to show, in order, as returned by the deck's
+        find_cards; a card is read and formatted when its row is first
+        drawn, along with the rest of its page, so the memory used doesn't
+        grow with the size of the deck.
+    """
+
+    HEADERS = ["Front", "Back", "Level", "Due"]
+
+    def __init__(self, deck):
+        super().__init__()
+        self.deck = deck
+        self.card_ids = array("q")
+
+        # page number -> formatted rows, least recently shown first
+        self.pages = OrderedDict()
+
+    def set_card_ids(self, card_ids):
+        """ show the cards with these ids, in this order """
+
+        # packed, a million ids take 8 MB
+        self.beginResetModel()
+        self.card_ids = array("q", card_ids)
+        self.pages.clear()
+        self.endResetModel()
+
+    def get_card_id(self, row):
+        """ return the id of the card of a row """
+        return self.card_ids[row]
+
+    def find_row(self, card_id):
+        """ return the row of a card, or None if it isn't shown """
+
+        try:
+            return self.card_ids.index(card_id)
+        except ValueError:
+            return None
+
+    def refresh_card(self, card_id):
+        """ read a card again, e.g. after it was edited """
+
+        row = self.find_row(card_id)
+        if row is None:
+            return
+
+        self.pages.pop(row // BROWSER_PAGE_SIZE, None)
+        self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.HEADERS) - 1))
+
+    def remove_card(self, card_id):
+        """ stop showing a deleted card """
+
+        row = self.find_row(card_id)
+        if row is None:
+            return
+
+        # the pages from this row on hold other cards once it is gone
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.card_ids[row]
+        for page in [page for page in self.pages if page >= row // BROWSER_PAGE_SIZE]:
+            del self.pages[page]
+        self.endRemoveRows()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.card_ids)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def format_row(self, card):
+        """ return the text of a card's columns """
+
+        def shorten(text):
+            # one line per card, however long its text
+            text = " ".join(hide_media_names(text or "").split())
+            return text if len(text) <= BROWSER_TEXT_LENGTH else text[:BROWSER_TEXT_LENGTH - 1] + "…"
+
+        due_time = self.deck.get_due_time(card).strftime("%Y-%m-%d %H:%M")
+        return (shorten(card.get_front()), shorten(card.get_back()), card.get_mem_level(), due_time)
+
+    def get_page(self, page):
+        """ return the formatted rows of a page, reading its cards if they aren't cached """
+
+        rows = self.pages.get(page)
+        if rows is None:
+            rows = self.load_page(page)
+        else:
+            self.pages.move_to_end(page)
+
+        return rows
+
+    @timed("gui.browser_load_page")
+    def load_page(self, page):
+        """ read and format the cards of a page, dropping the page shown the longest ago """
+
+        card_ids = self.card_ids[page * BROWSER_PAGE_SIZE:(page + 1) * BROWSER_PAGE_SIZE]
+        rows = [self.format_row(card) for card in self.deck.get_flashcards(card_ids)]
+
+        self.pages[page] = rows
+        if len(self.pages) > BROWSER_CACHED_PAGES:
+            self.pages.popitem(last=False)
+
+        return rows
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+
+        if role == Qt.ItemDataRole.DisplayRole:
+            row = index.row()
+            return self.get_page(row // BROWSER_PAGE_SIZE)[row % BROWSER_PAGE_SIZE][index.column()]
+
+        if role == Qt.ItemDataRole.TextAlignmentRole and index.column() == 2:
+            return Qt.AlignmentFlag.AlignCenter
+
+        return None
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self.HEADERS[section]
+
+        return None
+
+class FlashcardApp(QMainWindow):
+    """
+    FlashcardApp Class
+        Manages the GUI for the flashcard app
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.add_button_exists = 0
+        self.active_deck = None
+        self.next_card = None
+        self.catalog = DeckCatalog()
+
+        # cards handed out by the deck and waiting to be shown, and the
+        # last answer, saved once the next card is on screen
+        self.prefetched_cards = []
+        self.unsaved_answer = None
+
+        # decks are loaded and closed one at a time off the GUI thread, so
+        # a deck is never read while its last session is still being written
+        self.io_pool = QThreadPool()
+        self.io_pool.setMaxThreadCount(1)
+
+        # the search index is brought up to date on its own thread, so a
+        # large deck being indexed never holds up loading a deck. That only
+        # happens on the first search, so starting the app loads no deck
+        self.search_index = SearchIndex()
+        self.search_index_stale = True
+        self.search_pool = QThreadPool()
+        self.search_pool.setMaxThreadCount(1)
+
+        # the card browser's searches run one at a time on their own thread,
+        # and only the results of the latest one are shown
+        self.browser_pop_up = None
+        self.edit_card_pop_up = None
+        self.browser_query = 0
+        self.browser_pool = QThreadPool()
+        self.browser_pool.setMaxThreadCount(1)
+
+        # images and sounds of the cards, images are decoded ahead for the
+        # cards fetched ahead so flipping a card doesn't wait on them
+        self.media_store = MediaStore()
+        self.pixmap_cache = PixmapCache(self.media_store)
+        self.pixmap_cache.loaded.connect(self.image_loaded)
+        self.card_sounds = []
+        self.sound_queue = []
+        self.sound_player = None
+
+        self.init_ui()
+
+    def init_ui(self):
+        """
+        Initialize the GUI:
+            set window size and create central widget
+        """
+        self.setFixedSize(WINDOW_WIDTH, WINDOW_HEIGHT)
+
+        self.generalLayout = QHBoxLayout()
+        centralWidget = QWidget(self)
+        # centralWidget.setAttribute(Qt.WidgetAttribute.WA_InputMethodEnabled)
+        centralWidget.setLayout(self.generalLayout)
+        self.setCentralWidget(centralWidget)
+
+        # Init sidebar and body
+        self.init_sidebar()
+        self.init_body()
+
+    def init_sidebar(self):
+        """ Creates the GUI sidebar """
+
+        # Create a frame around the sidebar
+        self.sidebar_frame = QFrame()
+        self.sidebar_frame.setFrameStyle(1)
+        self.sidebar_frame.setLineWidth(1)
+
+        # The sidebar is a vertical box layout
+        self.sidebar = QVBoxLayout()
+
+        # Init deck selector
+        self.init_deck_selector()
+
+        # Init card search
+        self.init_search()
+
+        # add a spacer
+        self.sidebar.addStretch()
+
+        # create widgets for sidebar deck info
+        self.sidebar_card_total = QLabel()
+        self.sidebar.addWidget(self.sidebar_card_total)
+        self.sidebar_number_pending = QLabel()
+        self.sidebar.addWidget(self.sidebar_number_pending)
+
+        # add a spacer
+        self.sidebar.addStretch()
+
+        # Add sidebar to central widget's layout
+        self.sidebar_frame.setLayout(self.sidebar)
+        self.generalLayout.addWidget(self.sidebar_frame, 2)
+
+    def init_body(self):
+        """ Initialize the body of the GUI """
+
+        # create body widget and layout
+        self.body = QWidget()
+        self.body_layout = QVBoxLayout()
+        self.body.setLayout(self.body_layout)
+
+        # clicking the card takes the focus from the search box, so the
+        # review keys aren't typed into it
+        self.body.setFocusPolicy(Qt.FocusPolicy.ClickFocus)
+
+        # vertical spacing
+        self.body_layout.addStretch()
+
+        # the top of the body
+        self.body_top = QLabel()
+        self.body_top.setText("Welcome!")
+        self.body_top.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.body_layout.addWidget(self.body_top)
+        self.body_top_images = CardImages(self.pixmap_cache)
+        self.body_layout.addWidget(self.body_top_images)
+
+        # bottom row of the body
+        self.body_bottom = QLabel()
+        self.body_bottom.setText("Select a deck to get started")
+        self.body_bottom.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.body_layout.addWidget(self.body_bottom)
+        self.body_bottom_images = CardImages(self.pixmap_cache)
+        self.body_layout.addWidget(self.body_bottom_images)
+
+        # add spacer between card front/back and notes
+        self.spacer = QSpacerItem(0, 50, QSizePolicy.Policy.Fixed, QSizePolicy.Policy.Fixed)
+        self.body_layout.addSpacerItem(self.spacer)
+
+        # field for notes in the body
+        self.body_notes = QLabel()
+        self.body_notes.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.body_layout.addWidget(self.body_notes)
+
+        # vertical spacing
+        self.body_layout.addStretch()
+
+        # create body navigation widget
+        self.body_nav = QWidget()
+        self.body_nav_layout = QHBoxLayout()
+        self.body_nav.setLayout(self.body_nav_layout)
+        self.body_layout.addWidget(self.body_nav)
+
+        # the review buttons are made once and shown or hidden as cards are
+        # flipped and answered
+        self.flip_button = QPushButton("Flip [Space]")
+        self.flip_button.setMaximumWidth(100)
+        self.flip_button.clicked.connect(self.flip_button_clicked)
+        self.body_nav_layout.addWidget(self.flip_button)
+
+        # wrong answer :(
+        self.wrong_button = QPushButton("Needs more review [1]")
+        self.wrong_button.setMaximumWidth(200)
+        self.wrong_button.clicked.connect(self.wrong_button_clicked)
+        self.body_nav_layout.addWidget(self.wrong_button)
+
+        # right answer!
+        self.right_button = QPushButton("Got it! [2]")
+        self.right_button.setMaximumWidth(200)
+        self.right_button.clicked.connect(self.right_button_clicked)
+        self.body_nav_layout.addWidget(self.right_button)
+
+        # replays the sounds of the card, shown for cards that have some
+        self.sound_button = QPushButton("Play sound [R]")
+        self.sound_button.setMaximumWidth(120)
+        self.sound_button.clicked.connect(self.play_card_sounds)
+        self.body_nav_layout.addWidget(self.sound_button)
+        self.sound_button.hide()
+
+        # without focus, Space never presses an answer button by accident
+        for button in (self.flip_button, self.wrong_button, self.right_button, self.sound_button):
+            button.setFocusPolicy(Qt.FocusPolicy.NoFocus)
+
+        # keys act right away, a button's own shortcut animates the click first
+        self.flip_shortcut = QShortcut(QKeySequence(Qt.Key.Key_Space), self, self.flip_button_clicked)
+        self.wrong_shortcut = QShortcut(QKeySequence(Qt.Key.Key_1), self, self.wrong_button_clicked)
+        self.right_shortcut = QShortcut(QKeySequence(Qt.Key.Key_2), self, self.right_button_clicked)
+        self.sound_shortcut = QShortcut(QKeySequence(Qt.Key.Key_R), self, self.play_card_sounds)
+        self.sound_shortcut.setEnabled(False)
+
+        self.show_review_buttons()
+
+        # vertical spacing
+        self.body_layout.addStretch()
+
+        # add body to GUI
+        self.generalLayout.addWidget(self.body, 5)
+
+    def init_deck_selector(self):
+        """ Creates dropdown menu for deck selection """
+
+        self.deck_selector = QComboBox(self)
+        self.update_deck_selector()
+
+        # deck selector signal processing, items carry the deck name as data
+        self.deck_selector.currentIndexChanged.connect(
+            lambda i: self.process_deck_selector(self.deck_selector.itemData(i))
+        )
+
+        # add deck selector to sidebar
+        self.sidebar.addWidget(self.deck_selector)
+
+    def init_search(self):
+        """ Creates the search box and its list of results """
+
+        self.search_line_edit = QLineEdit()
+        self.search_line_edit.setPlaceholderText("Search cards...")
+        self.search_line_edit.textChanged.connect(self.search_text_changed)
+        self.sidebar.addWidget(self.search_line_edit)
+
+        # results are hidden until there is something to show
+        self.search_results = QListWidget()
+        self.search_results.itemActivated.connect(self.search_result_activated)
+        self.search_results.hide()
+        self.sidebar.addWidget(self.search_results)
+
+    @timed("gui.search")
+    def search_text_changed(self, text):
+        """ show the cards matching the search box as the user types """
+
+        self.update_search_index()
+        self.search_results.clear()
+
+        results, all_ranked = self.search_index.search(text)
+        for result in results:
+            item = QListWidgetItem(hide_media_names(result['front'] + " → " + result['back']))
+            item.setToolTip(result['deck'])
+            item.setData(Qt.ItemDataRole.UserRole, result['deck'])
+            self.search_results.addItem(item)
+
+        # too many cards match to rank them all, the list is the best of the
+        # first ones found, which a more specific search narrows down
+        if not all_ranked:
+            item = QListWidgetItem("Best of the first {} matches, type more to narrow the search".format(
+                MAX_RANKED_MATCHES))
+            item.setFlags(Qt.ItemFlag.NoItemFlags)
+            self.search_results.addItem(item)
+
+        self.search_results.setVisible(bool(results))
+
+    def update_search_index(self):
+        """ reindex the decks that changed since the app last ran, the first time it is called """
+
+        if not self.search_index_stale:
+            return
+
+        self.search_index_stale = False
+        task = DeckTask(self.search_index.update)
+        task.signals.finished.connect(self.search_index_updated)
+        self.search_pool.start(task)
+
+    def search_index_updated(self, deck_names):
+        """ search again once the reindexed decks can be found """
+
+        text = self.search_line_edit.text()
+        if deck_names and text:
+            self.search_text_changed(text)
+
+    def search_result_activated(self, item):
+        """ open the deck of a search result """
+        self.select_deck(item.data(Qt.ItemDataRole.UserRole))
+
+    def detect_existing_decks(self):
+        """ returns sorted list of existing decks """
+
+        return list_decks()
+
+    def get_deck_label(self, deck_name):
+        """ return the deck selector text for a deck, with cached counts """
+
+        # counts come from the catalog, decks not cached yet show their name
+        summary = self.catalog.get_summary(deck_name)
+        if summary is None:
+            return deck_name
+
+        pending = get_pending_label(summary)
+        return deck_name + " (" + pending + " pending / " + str(summary['card_total']) + ")"
+
+    def update_deck_selector(self):
+        """ get list of existing decks and add to combo box """
+
+        self.decks = self.detect_existing_decks()
+        self.deck_selector.clear()
+        self.deck_selector.addItem("Choose a deck...", "Choose a deck...")
+        if self.decks:
+            self.deck_selector.addItem("Review all due cards", "Review all due cards")
+        for deck_name in self.decks:
+            self.deck_selector.addItem(self.get_deck_label(deck_name), deck_name)
+        self.deck_selector.addItem("Create new deck", "Create new deck")
+
+    def select_deck(self, deck_name):
+        """ select a deck in the deck selector by name """
+        self.deck_selector.setCurrentIndex(self.deck_selector.findData(deck_name))
+
+    def process_deck_selector(self, deck_selection):
+        """ Load an existing deck or create a new one """
+
+        if deck_selection == "Create new deck":
+            self.new_deck_pop_up()
+
+        if deck_selection == "Review all due cards":
+            self.close_active_deck()
+            self.show_loading("all decks")
+
+            # merges the due cards of every deck, see session.py
+            session = ReviewSession(self.decks, catalog=self.catalog)
+            task = DeckTask(session.start)
+            task.signals.finished.connect(self.deck_loaded)
+            task.signals.failed.connect(self.deck_load_failed)
+            self.io_pool.start(task)
+
+        if deck_selection in self.decks:
+            self.close_active_deck()
+            self.show_loading(deck_selection)
+
+            task = DeckTask(self.load_deck, deck_selection)
+            task.signals.finished.connect(self.deck_loaded)
+            task.signals.failed.connect(self.deck_load_failed)
+            self.io_pool.start(task)
+
+    def load_deck(self, deck_name):
+        """ open a deck along with its cached stats, runs on a worker thread """
+        return self.catalog.attach_stats(open_deck(deck_name, use_server=True))
+
+    def show_loading(self, deck_name):
+        """ show that a deck is loading and block input until it is ready """
+
+        self.deck_selector.setEnabled(False)
+        if self.add_button_exists:
+            self.add_card_button.setEnabled(False)
+            self.stats_button.setEnabled(False)
+            self.browse_button.setEnabled(False)
+
+        self.sidebar_card_total.setText("Loading " + deck_name + "...")
+        self.sidebar_number_pending.setText("")
+
+        self.show_card_side(self.body_top, self.body_top_images, "Loading...")
+        self.show_card_side(self.body_bottom, self.body_bottom_images, "")
+        self.body_notes.setText("")
+        self.set_card_sounds([])
+        self.show_review_buttons()
+
+    def deck_loaded(self, deck):
+        """ start reviewing a deck once it has been loaded """
+
+        # answers are written out by the deck's own writer thread
+        deck.enable_background_writes()
+        self.active_deck = deck
+        self.active_deck_stamp = get_deck_stamp(deck.get_deck_name())
+
+        self.deck_selector.setEnabled(True)
+        self.update_sidebar()
+        self.update_body()
+        self.body.setFocus()
+        if not self.add_button_exists:
+            self.init_add_button()
+
+        # cards are added to a single deck, not to a review of all of them,
+        # and the stats panel compares a single deck with all of them
+        self.add_card_button.setEnabled(not isinstance(deck, ReviewSession))
+        self.stats_button.setEnabled(not isinstance(deck, ReviewSession))
+        self.browse_button.setEnabled(not isinstance(deck, ReviewSession))
+
+    def deck_load_failed(self, error):
+        """ report a deck that couldn't be loaded and go back to the start """
+
+        self.deck_selector.setEnabled(True)
+        self.sidebar_card_total.setText("")
+        self.body_top.setText("Welcome!")
+        self.body_bottom.setText("Select a deck to get started")
+
+        QMessageBox.warning(self, "Error", "The deck could not be loaded.\n\n" + error)
+        self.select_deck("Choose a deck...")
+
+    def close_active_deck(self):
+        """ write out the active deck's pending changes, if a deck is open """
+
+        if self.active_deck is None:
+            return
+
+        self.save_answer()
+        self.close_browser()
+
+        deck = self.active_deck
+        self.active_deck = None
+
+        # the card on screen and the ones fetched ahead are still pending
+        if self.next_card is not None:
+            deck.put_back_flashcard(self.next_card)
+            self.next_card = None
+        for card in self.prefetched_cards:
+            deck.put_back_flashcard(card)
+        self.prefetched_cards = []
+
+        # a session closes its decks and updates the catalog itself
+        if isinstance(deck, ReviewSession):
+            task = DeckTask(deck.close)
+            task.signals.finished.connect(self.session_closed)
+            self.io_pool.start(task)
+            return
+
+        # keep the catalog warm so the selector can show this deck's counts
+        summary = summarize_deck(deck)
+
+        task = DeckTask(self.close_deck, deck, summary, self.active_deck_stamp)
+        task.signals.finished.connect(self.deck_closed)
+        self.io_pool.start(task)
+
+    def close_deck(self, deck, summary, stamp):
+        """ write out a deck and cache its summary, runs on a worker thread """
+
+        deck.close()
+        self.catalog.store(deck.get_deck_name(), summary)
+
+        # cards added in this session were indexed as they were added
+        self.search_index.store_stamp(deck.get_deck_name(), stamp)
+        return deck.get_deck_name()
+
+    def deck_closed(self, deck_name):
+        """ show the counts of a deck that was just closed in the selector """
+
+        index = self.deck_selector.findData(deck_name)
+        if index >= 0:
+            self.deck_selector.setItemText(index, self.get_deck_label(deck_name))
+
+    def session_closed(self, deck_names):
+        """ show the counts of every deck a review session wrote to """
+
+        for deck_name in deck_names:
+            self.deck_closed(deck_name)
+
+    def closeEvent(self, event):
+        """ make sure the active deck is written before the window closes """
+
+        self.close_active_deck()
+        self.io_pool.waitForDone()
+        self.search_pool.waitForDone()
+        self.browser_pool.waitForDone()
+        self.pixmap_cache.pool.waitForDone()
+        super().closeEvent(event)
+
+    @timed("gui.update_sidebar")
+    def update_sidebar(self):
+        """ Update the sidebar with total number of cards and number pending """
+        # Display total number of cards
+        card_total = self.active_deck.get_total_number_of_cards()
+        card_total_text = str(card_total) + " cards in this deck"
+        self.sidebar_card_total.setText(card_total_text)
+
+        # Display number of cards pending for review, cards fetched ahead
+        # have been handed out by the deck but not shown yet
+        number_pending = self.active_deck.get_number_pending() + len(self.prefetched_cards)
+        number_pending_text = str(number_pending) + " cards pending for review"
+        self.sidebar_number_pending.setText(number_pending_text)
+
+    def init_add_button(self):
+        self.add_button_exists = 1
+        self.add_card_button = QPushButton("Add card to deck")
+        self.sidebar.addWidget(self.add_card_button)
+        self.add_card_button.clicked.connect(self.add_card_button_clicked)
+
+        self.stats_button = QPushButton("Statistics")
+        self.sidebar.addWidget(self.stats_button)
+        self.stats_button.clicked.connect(self.stats_button_clicked)
+
+        self.browse_button = QPushButton("Browse cards")
+        self.sidebar.addWidget(self.browse_button)
+        self.browse_button.clicked.connect(self.browse_button_clicked)
+
+    def browse_button_clicked(self):
+        """ show the cards of the deck in a table that can be filtered and sorted """
+
+        if self.browser_pop_up is not None and self.browser_pop_up.isVisible():
+            self.browser_pop_up.activateWindow()
+            return
+
+        self.browser_pop_up = QWidget()
+        self.browser_pop_up.setWindowTitle("Cards of " + self.active_deck.get_deck_name())
+        self.browser_pop_up.resize(WINDOW_WIDTH, WINDOW_HEIGHT)
+        self.browser_layout = QVBoxLayout()
+        self.browser_pop_up.setLayout(self.browser_layout)
+
+        # filters: text in the front, back or notes, and memory level
+        self.browser_filters = QWidget()
+        self.browser_filters_layout = QHBoxLayout()
+        self.browser_filters.setLayout(self.browser_filters_layout)
+        self.browser_layout.addWidget(self.browser_filters)
+
+        self.browser_line_edit = QLineEdit()
+        self.browser_line_edit.setPlaceholderText("Filter cards...")
+        self.browser_filters_layout.addWidget(self.browser_line_edit)
+
+        self.browser_mem_level = QComboBox()
+        self.browser_mem_level.addItem("All levels", None)
+        for level in range(MAX_MEM_LEVEL + 1):
+            self.browser_mem_level.addItem("Level " + str(level), level)
+        self.browser_filters_layout.addWidget(self.browser_mem_level)
+
+        self.browser_count = QLabel()
+        self.browser_filters_layout.addWidget(self.browser_count)
+
+        # rows are drawn from the model as they scroll into view, at a fixed
+        # height so the view never measures the rows it doesn't show
+        self.browser_model = CardTableModel(self.active_deck)
+        self.browser_table = QTableView()
+        self.browser_table.setModel(self.browser_model)
+        self.browser_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.browser_table.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.browser_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.browser_table.setWordWrap(False)
+        self.browser_table.verticalHeader().hide()
+        self.browser_table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        self.browser_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        self.browser_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
+        self.browser_table.horizontalHeader().setSortIndicator(3, Qt.SortOrder.AscendingOrder)
+        self.browser_table.horizontalHeader().setSortIndicatorShown(True)
+        self.browser_table.horizontalHeader().setSectionsClickable(True)
+        self.browser_layout.addWidget(self.browser_table)
+
+        # the deck sorts the cards, the header only shows the order
+        self.browser_table.horizontalHeader().sortIndicatorChanged.connect(self.browser_filter_changed)
+        self.browser_table.doubleClicked.connect(self.browser_row_activated)
+        self.browser_mem_level.currentIndexChanged.connect(self.browser_filter_changed)
+
+        # typing only filters the cards once the user pauses
+        self.browser_timer = QTimer()
+        self.browser_timer.setSingleShot(True)
+        self.browser_timer.setInterval(BROWSER_FILTER_DELAY)
+        self.browser_timer.timeout.connect(self.browser_filter_changed)
+        self.browser_line_edit.textChanged.connect(self.browser_timer.start)
+
+        self.browser_filter_changed()
+        self.browser_pop_up.show()
+
+    def browser_filter_changed(self):
+        """ find the cards matching the browser's filters, on the browser's thread """
+
+        self.browser_timer.stop()
+        self.browser_query += 1
+        self.browser_count.setText("Searching...")
+
+        header = self.browser_table.horizontalHeader()
+        sort_by = SORT_COLUMNS[header.sortIndicatorSection()]
+        descending = header.sortIndicatorOrder() == Qt.SortOrder.DescendingOrder
+
+        task = DeckTask(self.active_deck.find_cards, self.browser_line_edit.text(),
+                        self.browser_mem_level.currentData(), sort_by, descending)
+        query = self.browser_query
+        task.signals.finished.connect(lambda card_ids: self.show_browser_cards(query, card_ids))
+        task.signals.failed.connect(lambda error: self.show_browser_cards(query, [], error))
+        self.browser_pool.start(task)
+
+    def show_browser_cards(self, query, card_ids, error=None):
+        """ show the cards found by a browser search, unless a newer one was started """
+
+        if query != self.browser_query:
+            return
+
+        self.browser_model.set_card_ids(card_ids)
+        self.browser_count.setText(error or "{} cards".format(len(card_ids)))
+
+    def browser_row_activated(self, index):
+        """ open a form to edit the card of a row of the browser """
+
+        card_id = self.browser_model.get_card_id(index.row())
+        card = self.active_deck.get_flashcard(card_id)
+
+        self.edit_card_pop_up = QWidget()
+        self.edit_card_pop_up.setWindowTitle("Edit card")
+        self.edit_card_pop_up.setFixedSize(POP_UP_WIDTH, POP_UP_HEIGHT)
+        self.edit_card_layout = QFormLayout()
+        self.edit_card_pop_up.setLayout(self.edit_card_layout)
+
+        self.edit_card_front = QLineEdit(card.get_front())
+        self.edit_card_layout.addRow("Front:", self.edit_card_front)
+        self.edit_card_back = QLineEdit(card.get_back())
+        self.edit_card_layout.addRow("Back:", self.edit_card_back)
+        self.edit_card_notes = QTextEdit()
+        self.edit_card_notes.setPlainText(card.get_notes() or "")
+        self.edit_card_layout.addRow("Notes:", self.edit_card_notes)
+
+        self.edit_card_nav = QWidget()
+        self.edit_card_nav_layout = QHBoxLayout()
+        self.edit_card_nav.setLayout(self.edit_card_nav_layout)
+        self.edit_card_delete = QPushButton("Delete")
+        self.edit_card_attach = QPushButton("Attach...")
+        self.edit_card_cancel = QPushButton("Cancel")
+        self.edit_card_save = QPushButton("Save")
+        self.edit_card_nav_layout.addWidget(self.edit_card_delete)
+        self.edit_card_nav_layout.addWidget(self.edit_card_attach)
+        self.edit_card_nav_layout.addWidget(self.edit_card_cancel)
+        self.edit_card_nav_layout.addWidget(self.edit_card_save)
+        self.edit_card_layout.addRow(self.edit_card_nav)
+
+        # the front or back keeps the focus while the button is clicked
+        self.edit_card_attach.setFocusPolicy(Qt.FocusPolicy.NoFocus)
+
+        self.edit_card_delete.clicked.connect(lambda: self.edit_card_delete_clicked(card_id))
+        self.edit_card_attach.clicked.connect(
+            lambda: self.attach_media(self.edit_card_pop_up, self.edit_card_front, self.edit_card_back))
+        self.edit_card_cancel.clicked.connect(self.edit_card_pop_up.close)
+        self.edit_card_save.clicked.connect(lambda: self.edit_card_save_clicked(card_id))
+
+        self.edit_card_pop_up.show()
+
+    def edit_card_save_clicked(self, card_id):
+        """ write the edited card to the deck and show it in the browser """
+
+        front = self.edit_card_front.text()
+        back = self.edit_card_back.text()
+        notes = self.edit_card_notes.toPlainText()
+        self.active_deck.edit_flashcard(card_id, front, back, notes)
+
+        # on the search thread, as the index may be in the middle of an update
+        self.search_pool.start(DeckTask(
+            self.search_index.add_card, self.active_deck.get_deck_name(), card_id, front, back, notes, True))
+
+        self.browser_model.refresh_card(card_id)
+        self.edit_card_pop_up.close()
+
+    def edit_card_delete_clicked(self, card_id):
+        """ delete the card being edited, once the user confirms """
+
+        answer = QMessageBox.question(self.edit_card_pop_up, "Delete card", "Delete this card and its progress?")
+        if answer != QMessageBox.StandardButton.Yes:
+            return
+
+        self.active_deck.delete_flashcard(card_id)
+        self.search_pool.start(DeckTask(self.search_index.remove_card, self.active_deck.get_deck_name(), card_id))
+
+        self.browser_model.remove_card(card_id)
+        self.browser_count.setText("{} cards".format(self.browser_model.rowCount()))
+        self.edit_card_pop_up.close()
+
+        # the deck ignores answers to a deleted card, stop showing it
+        self.prefetched_cards = [card for card in self.prefetched_cards if card.get_id() != card_id]
+        if self.next_card is not None and self.next_card.get_id() == card_id:
+            self.next_card = None
+            self.update_body()
+        self.update_sidebar()
+
+    def close_browser(self):
+        """ close the card browser of the deck being closed, if it is open """
+
+        if self.browser_pop_up is None:
+            return
+
+        # results of a search still running are dropped
+        self.browser_query += 1
+        self.browser_timer.stop()
+        if self.edit_card_pop_up is not None:
+            self.edit_card_pop_up.close()
+        self.browser_pop_up.close()
+        self.browser_pop_up = None
+
+    def stats_button_clicked(self):
+        """ show the review forecast, memory levels and retention of the deck and of all decks """
+
+        self.stats_pop_up = QWidget()
+        self.stats_pop_up.setWindowTitle("Statistics")
+        self.stats_grid = QGridLayout()
+        self.stats_pop_up.setLayout(self.stats_grid)
+
+        deck_name = self.active_deck.get_deck_name()
+        self.stats_grid.addWidget(QLabel(deck_name), 0, 1)
+        self.stats_grid.addWidget(QLabel("All decks"), 0, 2)
+
+        # one row per forecast day, memory level and retention period
+        labels = ["Due today", "Due tomorrow"]
+        labels += ["Due in {} days".format(i) for i in range(2, STATS_PANEL_DAYS)]
+        labels += ["Memory level " + str(level) for level in range(MAX_MEM_LEVEL + 1)]
+        labels += ["Retention, last {} days".format(RETENTION_DAYS), "Retention, all time"]
+        for row, label in enumerate(labels, 1):
+            self.stats_grid.addWidget(QLabel(label), row, 0)
+            self.stats_grid.addWidget(QLabel(), row, 1)
+            self.stats_grid.addWidget(QLabel("..."), row, 2)
+
+        # the deck's own stats are kept up to date as it is reviewed
+        deck_stats = self.active_deck.get_stats()
+        self.show_stats(1, deck_stats)
+
+        # the other decks come from the catalog, or are loaded if they changed
+        other_decks = [name for name in self.decks if name != deck_name]
+        task = DeckTask(lambda: combine_stats(self.catalog.get_stats(name) for name in other_decks))
+        task.signals.finished.connect(lambda stats: self.show_stats(2, stats.merge(deck_stats)))
+        self.io_pool.start(task)
+
+        self.stats_pop_up.show()
+
+    @timed("gui.show_stats")
+    def show_stats(self, column, stats):
+        """ fill a column of the stats panel """
+
+        histogram = stats.get_mem_level_histogram()
+        values = stats.get_forecast(STATS_PANEL_DAYS)
+        values += [histogram[level] if level < len(histogram) else 0 for level in range(MAX_MEM_LEVEL + 1)]
+        values += [format_rate(*stats.get_retention(RETENTION_DAYS)), format_rate(*stats.get_retention())]
+
+        for row, value in enumerate(values, 1):
+            self.stats_grid.itemAtPosition(row, column).widget().setText(str(value))
+
+    def add_card_button_clicked(self):
+        """ create pop up form for creating new card """
+
+        # create popup widget
+        self.new_card_pop_up = QWidget()
+        self.new_card_pop_up.setFixedSize(POP_UP_WIDTH, POP_UP_HEIGHT)
+
+        self.new_card_pop_up_layout = QVBoxLayout()
+        self.new_card_pop_up.setLayout(self.new_card_pop_up_layout)
+
+        # popup header
+        self.new_card_header = QLabel("Create new card for " + self.active_deck.get_deck_name())
+        self.new_card_header.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.new_card_pop_up_layout.addWidget(self.new_card_header)
+
+        # add spacing
+        self.new_card_pop_up_layout.addStretch()
+
+        # create input form for new card
+        self.new_card_form = QWidget()
+        self.new_card_form_layout = QFormLayout()
+        self.new_card_form.setLayout(self.new_card_form_layout)
+        self.new_card_pop_up_layout.addWidget(self.new_card_form)
+
+        # input for card front
+        self.card_front_line_edit = QLineEdit()
+        self.new_card_form_layout.addRow("Front:", self.card_front_line_edit)
+
+        # input for card back
+        self.card_back_line_edit = QLineEdit()
+        self.new_card_form_layout.addRow("Back:", self.card_back_line_edit)
+
+        # input for card notes
+        self.card_notes_text_edit = QTextEdit()
+        self.new_card_form_layout.addRow("Notes:", self.card_notes_text_edit)
+
+        # vertical spacing
+        self.new_card_pop_up_layout.addStretch()
+
+        # card creation confirmation
+        self.new_card_success = QLabel()
+        self.new_card_pop_up_layout.addWidget(self.new_card_success)
+
+        # vertical spacing
+        self.new_card_pop_up_layout.addStretch()
+
+        # new card navigation buttons
+        self.new_card_nav = QWidget()
+        self.new_card_nav_layout = QHBoxLayout()
+        self.new_card_nav.setLayout(self.new_card_nav_layout)
+        self.new_card_exit = QPushButton("Exit")
+        self.new_card_attach = QPushButton("Attach...")
+        self.new_card_confirm = QPushButton("Confirm")
+        self.new_card_nav_layout.addWidget(self.new_card_exit)
+        self.new_card_nav_layout.addWidget(self.new_card_attach)
+        self.new_card_nav_layout.addWidget(self.new_card_confirm)
+        self.new_card_pop_up_layout.addWidget(self.new_card_nav)
+
+        # the front or back keeps the focus while the button is clicked
+        self.new_card_attach.setFocusPolicy(Qt.FocusPolicy.NoFocus)
+
+        # button push signals
+        self.new_card_exit.clicked.connect(self.new_card_exit_clicked)
+        self.new_card_attach.clicked.connect(
+            lambda: self.attach_media(self.new_card_pop_up, self.card_front_line_edit, self.card_back_line_edit))
+        self.new_card_confirm.clicked.connect(self.new_card_confirm_clicked)
+
+        # render the popup
+        self.new_card_pop_up.show()
+
+    def new_card_exit_clicked(self):
+        """ close new card creation pop up """
+        self.new_card_pop_up.close()
+        self.update_sidebar()
+        self.update_body()
+
+    def new_card_confirm_clicked(self):
+        """ confirm card creation and prompt for another """
+
+        # get user input
+        front = self.card_front_line_edit.text()
+        back = self.card_back_line_edit.text()
+        notes = self.card_notes_text_edit.toPlainText()
+
+        # cards repeating an existing front are only added if the user says so
+        on_duplicate = REJECT
+        try:
+            card_id = self.active_deck.add_flashcard(front, back, notes, on_duplicate)
+        except DuplicateCardError:
+            on_duplicate = self.ask_duplicate_policy(front)
+            if on_duplicate is None:
+                return
+            card_id = self.active_deck.add_flashcard(front, back, notes, on_duplicate)
+
+        # index writes go through the search thread, like edits and deletes,
+        # so they never race with an update of the index in progress
+        deck_name = self.active_deck.get_deck_name()
+        if on_duplicate == MERGE:
+            # the merged card's text is only known to the deck, reindex it later
+            self.search_pool.start(DeckTask(self.search_index.mark_stale, deck_name))
+            message = "Merged into the existing card! Add another or exit."
+        else:
+            # make the new card searchable right away
+            self.search_pool.start(DeckTask(self.search_index.add_card, deck_name, card_id, front, back, notes))
+            message = "New card created! Add another or exit."
+
+        # clear line edit input
+        self.card_front_line_edit.clear()
+        self.card_back_line_edit.clear()
+        self.card_notes_text_edit.clear()
+
+        # show confirmation text
+        self.new_card_success.setText(message)
+
+    def attach_media(self, pop_up, front_edit, back_edit):
+        """ store an image or sound and refer to it from the card's back, or front if it has the focus """
+
+        edit = front_edit if front_edit.hasFocus() else back_edit
+
+        extensions = " ".join("*" + extension for extension in IMAGE_EXTENSIONS + SOUND_EXTENSIONS)
+        file_name, _ = QFileDialog.getOpenFileName(pop_up, "Attach an image or sound", "",
+                                                   "Images and sounds (" + extensions + ")")
+        if not file_name:
+            return
+
+        # stored once, however many cards attach the same file
+        try:
+            name = self.media_store.add_file(file_name)
+        except (OSError, ValueError) as e:
+            QMessageBox.warning(pop_up, "Error", "The file could not be attached.\n\n" + str(e))
+            return
+
+        edit.setText((edit.text() + " " + media_reference(name)).strip())
+        edit.setFocus()
+
+    def ask_duplicate_policy(self, front):
+        """ ask what to do with a new card whose front is already in the deck """
+
+        question = QMessageBox(self.new_card_pop_up)
+        question.setText("A card with the front \"" + front + "\" is already in this deck.")
+        question.setInformativeText("Merge the back and notes into the existing card, or add a second card?")
+        merge_button = question.addButton("Merge", QMessageBox.ButtonRole.AcceptRole)
+        keep_button = question.addButton("Add anyway", QMessageBox.ButtonRole.AcceptRole)
+        question.addButton(QMessageBox.StandardButton.Cancel)
+        question.exec()
+
+        if question.clickedButton() == merge_button:
+            return MERGE
+        if question.clickedButton() == keep_button:
+            return KEEP
+
+        return None
+
+    def new_deck_pop_up(self):
+        """ create pop up form for creating new deck """
+
+        # Create pop-up widget
+        self.pop_up = QWidget()
+        self.pop_up.setFixedSize(POP_UP_WIDTH, POP_UP_HEIGHT)
+        self.pop_up_layout = QVBoxLayout()
+        self.pop_up.setLayout(self.pop_up_layout)
+
+        # Add pop-up header
+        self.pop_up_header = QLabel("Create a new deck")
+        self.pop_up_header.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.pop_up_layout.addWidget(self.pop_up_header)
+
+        # Add vertical spacing
+        self.pop_up_layout.addStretch()
+
+        # Create input form for new deck
+        self.new_deck_form = QWidget()
+        self.new_deck_form_layout = QFormLayout()
+        self.new_deck_form.setLayout(self.new_deck_form_layout)
+        self.pop_up_layout.addWidget(self.new_deck_form)
+        
+        # Input for new deck name
+        self.deck_name_line_edit = QLineEdit()
+        self.new_deck_form_layout.addRow("Deck name:", self.deck_name_line_edit)
+
+        # Input for SRS method
+        self.srs_method_selector = QComboBox()
+        self.srs_method_selector.addItems(list(SCHEDULERS))
+        self.new_deck_form_layout.addRow("SRS Method:", self.srs_method_selector)
+        self.srs_warning = QLabel("Note: you can't change the SRS method after\ndeck creation.")
+        self.new_deck_form_layout.addRow("", self.srs_warning)
+
+        # Add vertical spacing
+        self.pop_up_layout.addStretch()
+
+        # Navigation buttons
+        self.pop_up_nav = QWidget()
+        self.pop_up_nav_layout = QHBoxLayout()
+        self.cancel_deck_creation = QPushButton("Cancel")
+        self.confirm_deck_creation = QPushButton("Create deck")
+        self.pop_up_nav_layout.addWidget(self.cancel_deck_creation)
+        self.pop_up_nav_layout.addWidget(self.confirm_deck_creation)
+        self.pop_up_nav.setLayout(self.pop_up_nav_layout)
+        self.pop_up_layout.addWidget(self.pop_up_nav)
+
+        # Button push signals
+        self.cancel_deck_creation.clicked.connect(self.pop_up_cancel_clicked)
+        self.confirm_deck_creation.clicked.connect(self.pop_up_confirm_clicked)
+
+        # Render the pop up
+        self.pop_up.show()
+
+    def pop_up_cancel_clicked(self):
+        """ Cancel deck creation """
+
+        self.pop_up.close()
+        self.select_deck("Choose a deck...")
+
+    def pop_up_confirm_clicked(self):
+        """ Deck creation confirmed """
+
+        # Get user input
+        deck_name = self.deck_name_line_edit.text()
+        srs_method = self.srs_method_selector.currentText()
+        
+        # Create new deck structure
+        deck_file_name = DECK_DIRECTORY + deck_name + ".json"
+
+        # Write to json
+        if os.path.exists(deck_file_name):
+            self.pop_up.close()
+            self.deck_exists = QMessageBox()
+            self.deck_exists.setText("A deck with this name already exists, loading it now!")
+            self.deck_exists.exec()
+
+            self.select_deck(deck_name)
+        else:
+            create_deck(deck_name, srs_method)
+
+            self.update_deck_selector()
+            self.select_deck(deck_name)
+            self.pop_up.close()
+
+    @timed("gui.update_body")
+    def update_body(self):   
+        """ Present user with a flashcard if available """
+
+        # a card left on screen without an answer is still pending
+        if self.next_card is not None:
+            self.active_deck.put_back_flashcard(self.next_card)
+
+        if self.prefetched_cards:
+            self.next_card = self.prefetched_cards.pop(0)
+        else:
+            self.next_card = self.active_deck.get_next_flashcard()
+
+        # all caught up!
+        if not self.next_card:
+            self.show_card_side(self.body_top, self.body_top_images, "All caught up!")
+            self.show_card_side(self.body_bottom, self.body_bottom_images, "")
+            self.body_notes.setText("")
+            self.set_card_sounds([])
+            self.show_review_buttons()
+            return
+
+        # present next flashcard
+        sounds = self.show_card_side(self.body_top, self.body_top_images, self.next_card.get_front())
+        self.show_card_side(self.body_bottom, self.body_bottom_images, "")
+        self.body_notes.setText("")
+        self.set_card_sounds(sounds)
+        self.show_review_buttons(flip=True)
+
+        # decode the images of the back while the front is read
+        self.prefetch_images(self.next_card)
+
+        # fetch the following cards once this one is on screen
+        QTimer.singleShot(0, self.prefetch_cards)
+
+    def show_review_buttons(self, flip=False, answer=False):
+        """ show the flip button or the answer buttons, or neither """
+
+        self.flip_button.setVisible(flip)
+        self.wrong_button.setVisible(answer)
+        self.right_button.setVisible(answer)
+
+        self.flip_shortcut.setEnabled(flip)
+        self.wrong_shortcut.setEnabled(answer)
+        self.right_shortcut.setEnabled(answer)
+
+    def prefetch_cards(self):
+        """ save the last answer and fetch the next cards while the current one is read """
+
+        if self.active_deck is None:
+            return
+
+        self.save_answer()
+
+        while len(self.prefetched_cards) < PREFETCH_CARDS:
+            card = self.active_deck.get_next_flashcard()
+            if card is None:
+                break
+            self.prefetched_cards.append(card)
+
+        for card in self.prefetched_cards:
+            self.prefetch_images(card)
+
+    def prefetch_images(self, card):
+        """ start decoding the images of a card before it is shown """
+
+        for text in (card.get_front(), card.get_back()):
+            for name in find_media(text, IMAGE):
+                self.pixmap_cache.load(name)
+
+    def show_card_side(self, label, images, text):
+        """ show one side of a card, its text in the label and its images below, returns its sounds """
+
+        text, media = split_media(text)
+        label.setText(text)
+        images.show_images([name for kind, name in media if kind == IMAGE])
+
+        return [name for kind, name in media if kind == SOUND]
+
+    def image_loaded(self, name):
+        """ show an image of the card on screen once it is decoded """
+
+        self.body_top_images.refresh(name)
+        self.body_bottom_images.refresh(name)
+
+    def set_card_sounds(self, sounds):
+        """ set the sounds the sound button plays, and play them """
+
+        self.card_sounds = sounds
+        self.sound_button.setVisible(bool(sounds))
+        self.sound_shortcut.setEnabled(bool(sounds))
+
+        self.sound_queue = []
+        if self.sound_player is not None:
+            self.sound_player.stop()
+
+        # the system's player would open a window for every card, so it is
+        # only used when asked for
+        if sounds and QMediaPlayer is not None:
+            self.play_card_sounds()
+
+    def play_card_sounds(self):
+        """ play the sounds of the card on screen, one after another """
+
+        paths = []
+        for name in self.card_sounds:
+            try:
+                paths.append(os.path.abspath(self.media_store.get_path(name)))
+            except ValueError:
+                continue
+
+        if QMediaPlayer is None:
+            for path in paths:
+                QDesktopServices.openUrl(QUrl.fromLocalFile(path))
+            return
+
+        # made the first time a card has sounds
+        if self.sound_player is None:
+            self.sound_player = QMediaPlayer()
+            self.sound_output = QAudioOutput()
+            self.sound_player.setAudioOutput(self.sound_output)
+            self.sound_player.mediaStatusChanged.connect(self.sound_status_changed)
+
+        self.sound_player.stop()
+        self.sound_queue = paths
+        self.play_next_sound()
+
+    def play_next_sound(self):
+        if self.sound_queue:
+            self.sound_player.setSource(QUrl.fromLocalFile(self.sound_queue.pop(0)))
+            self.sound_player.play()
+
+    def sound_status_changed(self, status):
+        if status in (QMediaPlayer.MediaStatus.EndOfMedia, QMediaPlayer.MediaStatus.InvalidMedia):
+            self.play_next_sound()
+
+    def flip_button_clicked(self):
+        """ flip to back of flashcard """
+        
+        # reveal back of flashcard
+        sounds = self.show_card_side(self.body_bottom, self.body_bottom_images, self.next_card.get_back())
+        self.body_notes.setText(self.next_card.get_notes())
+        self.show_review_buttons(answer=True)
+
+        # the front's sounds can still be replayed if the back has none
+        if sounds:
+            self.set_card_sounds(sounds)
+
+    def answer_card(self, answer):
+        """ show the next card, the answer is saved once it is on screen """
+
+        self.unsaved_answer = (self.next_card, answer)
+        self.next_card = None
+
+        # with no card fetched ahead, a card answered wrong may be the next one
+        if not self.prefetched_cards:
+            self.save_answer()
+
+        self.update_body()
+        QTimer.singleShot(0, self.save_answer)
+
+    def save_answer(self):
+        """ log the last answer with the deck, if it hasn't been yet """
+
+        if self.unsaved_answer is None:
+            return
+
+        card, answer = self.unsaved_answer
+        self.unsaved_answer = None
+        self.active_deck.log_answer(card, answer)
+        self.update_sidebar()
+
+    def right_button_clicked(self):
+        self.answer_card(True)
+
+    def wrong_button_clicked(self):
+        self.answer_card(False)
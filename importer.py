@@ -0,0 +1,206 @@
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+from datetime import datetime
+
+from deck import DECK_DIRECTORY, SCHEDULERS, TIME_FORMAT, create_deck, list_decks, open_deck, parse_review_time
+from duplicates import KEEP, DUPLICATE_POLICIES, DuplicateIndex
+
+BATCH_SIZE = 5000
+
+# report progress every this many rows on large imports
+PROGRESS_INTERVAL = 100000
+
+FORMATS = {".csv": "csv", ".tsv": "tsv", ".txt": "tsv", ".jsonl": "jsonl", ".ndjson": "jsonl", ".apkg": "apkg"}
+
+def detect_format(file_name):
+    """ guess the format of an import file from its extension """
+
+    extension = os.path.splitext(file_name)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError("can't tell the format of " + file_name + ", use --format")
+
+    return FORMATS[extension]
+
+def read_rows(file_name, file_format):
+    """ yield (line number, row dict) pairs from a CSV, TSV or JSON Lines file, or an Anki package """
+
+    # an Anki package is numbered by note, and its media are stored on the way
+    if file_format == "apkg":
+        from anki import read_apkg_rows
+        yield from read_apkg_rows(file_name)
+        return
+
+    with open(file_name, "r", encoding="utf-8", newline="") as f:
+        if file_format == "jsonl":
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+
+                # invalid lines are reported by validate_row
+                try:
+                    yield line_number, json.loads(line)
+                except json.JSONDecodeError:
+                    yield line_number, None
+            return
+
+        delimiter = "\t" if file_format == "tsv" else ","
+        reader = csv.reader(f, delimiter=delimiter)
+
+        # files without a header row are read as front, back, notes
+        first = next(reader, None)
+        if first is None:
+            return
+
+        if "front" in first and "back" in first:
+            columns = first
+        else:
+            columns = ["front", "back", "notes"]
+            yield reader.line_num, dict(zip(columns, first))
+
+        for row in reader:
+            if row:
+                yield reader.line_num, dict(zip(columns, row))
+
+def validate_row(row, now):
+    """ return a flashcard dict for a row, or raise ValueError if it is invalid """
+
+    if not isinstance(row, dict):
+        raise ValueError("not a JSON object")
+
+    front = row.get("front")
+    back = row.get("back")
+    notes = row.get("notes") or ""
+
+    if not isinstance(front, str) or not front.strip():
+        raise ValueError("missing front")
+    if not isinstance(back, str) or not back.strip():
+        raise ValueError("missing back")
+    if not isinstance(notes, str):
+        raise ValueError("notes must be text")
+
+    # rows may carry over their review state, new cards are due right away
+    last_review = row.get("last_review") or now
+    mem_level = row.get("mem_level") or 0
+    try:
+        last_review = parse_review_time(last_review)
+        mem_level = int(mem_level)
+    except (TypeError, ValueError):
+        raise ValueError("invalid last_review or mem_level")
+
+    if not 0 <= mem_level <= 9:
+        raise ValueError("mem_level must be between 0 and 9")
+
+    return {
+        'front': front,
+        'back': back,
+        'notes': notes,
+        'last_review': last_review.strftime(TIME_FORMAT),
+        'mem_level': mem_level,
+    }
+
+def index_other_decks(deck_name):
+    """ return a DuplicateIndex of the card fronts of every deck but one """
+
+    index = DuplicateIndex()
+    for other_name in list_decks():
+        if other_name != deck_name:
+            # only read, so the deck server's copy doesn't matter here
+            for card_id, front in open_deck(other_name).iter_fronts():
+                index.add((other_name, card_id), front)
+
+    return index
+
+def import_cards(deck, file_name, file_format=None, batch_size=BATCH_SIZE, progress=None,
+                 on_duplicate=KEEP, other_decks=None):
+    """
+    Stream cards from a file into a deck in batches and save the deck once.
+    Cards whose front is already in the deck, or earlier in the file, are
+    handled according to on_duplicate, see FlashcardDeck.add_flashcards.
+    Cards whose front is in the other_decks DuplicateIndex are skipped.
+    Returns (number imported, number of duplicates, list of (line number,
+    error) for invalid rows).
+    """
+
+    if file_format is None:
+        file_format = detect_format(file_name)
+
+    now = datetime.now()
+    imported = 0
+    valid = 0
+    errors = []
+    batch = []
+
+    for line_number, row in read_rows(file_name, file_format):
+        try:
+            card = validate_row(row, now)
+        except ValueError as e:
+            errors.append((line_number, str(e)))
+            continue
+
+        valid += 1
+        if other_decks is not None and other_decks.find(card['front']):
+            continue
+
+        batch.append(card)
+        if len(batch) >= batch_size:
+            imported += deck.add_flashcards(batch, on_duplicate)
+            batch = []
+
+            if progress is not None and imported % PROGRESS_INTERVAL < batch_size:
+                progress(imported)
+
+    if batch:
+        imported += deck.add_flashcards(batch, on_duplicate)
+
+    deck.save_deck()
+    return imported, valid - imported, errors
+
+def main():
+    """ import cards from a file into a deck in DECK_DIRECTORY """
+
+    parser = argparse.ArgumentParser(description="Import flashcards from a CSV, TSV or JSON Lines file, or an Anki package.")
+    parser.add_argument("deck_name", help="deck to add the cards to, created if it doesn't exist")
+    parser.add_argument("file_name", help="file with front, back and optional notes columns, or an .apkg file")
+    parser.add_argument("--format", choices=sorted(set(FORMATS.values())), help="file format (default: from extension)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--srs-method", choices=sorted(SCHEDULERS), default="Fibonacci",
+                        help="SRS method of a newly created deck")
+    parser.add_argument("--on-duplicate", choices=DUPLICATE_POLICIES, default=KEEP,
+                        help="what to do with cards whose front is already in the deck (default: keep)")
+    parser.add_argument("--across-decks", action="store_true",
+                        help="also skip cards whose front is in another deck")
+    args = parser.parse_args()
+
+    if not any(os.path.exists(DECK_DIRECTORY + args.deck_name + ext) for ext in (".json", ".sqlite", ".deck")):
+        create_deck(args.deck_name, args.srs_method)
+
+    deck = open_deck(args.deck_name, use_server=True)
+
+    start = time.perf_counter()
+    other_decks = index_other_decks(args.deck_name) if args.across_decks else None
+    imported, duplicates, errors = import_cards(
+        deck, args.file_name, args.format, args.batch_size,
+        progress=lambda n: print("  " + str(n) + " cards imported...", file=sys.stderr),
+        on_duplicate=args.on_duplicate, other_decks=other_decks,
+    )
+    elapsed = time.perf_counter() - start
+    deck.close()
+
+    unit = "note" if (args.format or detect_format(args.file_name)) == "apkg" else "line"
+    for line_number, error in errors[:20]:
+        print(unit + " " + str(line_number) + ": " + error, file=sys.stderr)
+    if len(errors) > 20:
+        print("... and " + str(len(errors) - 20) + " more invalid rows", file=sys.stderr)
+
+    rate = imported / elapsed if elapsed else 0
+    print("Imported {} cards into {} in {:.2f}s ({:.0f} cards/s), skipped {} invalid rows".format(
+        imported, args.deck_name, elapsed, rate, len(errors)))
+    if duplicates:
+        print("{} duplicate cards were not added as new cards (--on-duplicate {})".format(duplicates, args.on_duplicate))
+
+if __name__ == "__main__":
+    main()
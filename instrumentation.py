@@ -0,0 +1,120 @@
+import os
+import sys
+import json
+import time
+import atexit
+import functools
+import threading
+
+# set MNEMOSYNE_PROFILE=1 to print a summary on exit, and/or
+# MNEMOSYNE_TRACE=<file> to write a trace viewable in chrome://tracing
+PROFILE_ENV = "MNEMOSYNE_PROFILE"
+TRACE_ENV = "MNEMOSYNE_TRACE"
+
+# keep memory bounded on long sessions, later events are only summarized
+MAX_TRACE_EVENTS = 500000
+
+class Instrumentation:
+    """
+    Instrumentation Class
+        Collects call counts, timings and byte counts of the deck engine
+        and the GUI. Does nothing until enabled.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.summary = False
+        self.trace_file_name = None
+        self.lock = threading.Lock()
+        self.timings = {}
+        self.counters = {}
+        self.events = []
+        self.start = time.perf_counter()
+
+    def enable(self, summary=True, trace_file_name=None):
+        """ start collecting, and report when the process exits """
+
+        if not self.enabled:
+            atexit.register(self.dump)
+
+        self.enabled = True
+        self.summary = summary
+        self.trace_file_name = trace_file_name
+
+    def record(self, name, start, end):
+        """ record one timed call """
+
+        with self.lock:
+            count, total, longest = self.timings.get(name, (0, 0.0, 0.0))
+            duration = end - start
+            self.timings[name] = (count + 1, total + duration, max(longest, duration))
+
+            if self.trace_file_name is not None and len(self.events) < MAX_TRACE_EVENTS:
+                self.events.append({
+                    'name': name,
+                    'ph': "X",
+                    'ts': (start - self.start) * 1e6,
+                    'dur': duration * 1e6,
+                    'pid': os.getpid(),
+                    'tid': threading.get_ident(),
+                })
+
+    def count(self, name, n=1):
+        """ add to a counter, e.g. cache misses or bytes written """
+
+        if not self.enabled:
+            return
+
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def format_summary(self):
+        """ return the collected timings and counters as a table """
+
+        lines = ["{:<28} {:>10} {:>12} {:>12} {:>12}".format("operation", "calls", "total ms", "mean ms", "max ms")]
+        for name, (count, total, longest) in sorted(self.timings.items(), key=lambda x: -x[1][1]):
+            lines.append("{:<28} {:>10} {:>12.2f} {:>12.3f} {:>12.3f}".format(
+                name, count, total * 1000, total / count * 1000, longest * 1000))
+
+        for name, value in sorted(self.counters.items()):
+            lines.append("{:<28} {:>10}".format(name, value))
+
+        return "\n".join(lines)
+
+    def dump(self):
+        """ print the summary and write the trace file, if enabled """
+
+        if self.summary:
+            print(self.format_summary(), file=sys.stderr)
+
+        if self.trace_file_name is not None:
+            with open(self.trace_file_name, "w", encoding="utf-8") as f:
+                json.dump({'traceEvents': self.events}, f)
+
+INSTRUMENTATION = Instrumentation()
+
+if os.environ.get(PROFILE_ENV) or os.environ.get(TRACE_ENV):
+    INSTRUMENTATION.enable(bool(os.environ.get(PROFILE_ENV)), os.environ.get(TRACE_ENV))
+
+def timed(name):
+    """ decorator timing every call of a function while instrumentation is enabled """
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not INSTRUMENTATION.enabled:
+                return function(*args, **kwargs)
+
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                INSTRUMENTATION.record(name, start, time.perf_counter())
+
+        return wrapper
+
+    return decorator
+
+def count(name, n=1):
+    """ add to a counter while instrumentation is enabled """
+    INSTRUMENTATION.count(name, n)
@@ -0,0 +1,166 @@
+import os
+import json
+
+from instrumentation import count
+
+# compact the journal into the deck file once it grows past this size,
+# or past half the size of the deck file for large decks
+JOURNAL_COMPACT_SIZE = 256 * 1024
+
+class DeckJournal:
+    """
+    DeckJournal Class
+        Append-only log of the changes made to a deck since the deck
+        file was last written. Each change is one JSON object per line.
+        Review records are moved to an optional history file when the
+        journal is cleared, so the deck's review history is kept.
+    """
+
+    def __init__(self, file_name, history_file_name=None):
+        self.file_name = file_name
+        self.history_file_name = history_file_name
+
+        # new records must start on a line of their own, not after the
+        # partial line a crash mid-append can leave behind
+        if os.path.exists(self.file_name):
+            self.size = truncate_partial_line(self.file_name)
+        else:
+            self.size = 0
+
+        if history_file_name is not None and os.path.exists(history_file_name):
+            truncate_partial_line(history_file_name)
+
+        self.compact_size = JOURNAL_COMPACT_SIZE
+
+    def read_records(self, file_name=None):
+        """ return the list of records stored in the journal """
+
+        if file_name is None:
+            file_name = self.file_name
+
+        records = []
+        if not os.path.exists(file_name):
+            return records
+
+        with open(file_name, "r", encoding="utf-8") as f:
+            for line in f:
+                # partial lines are cut when the journal is opened, a line
+                # that still doesn't parse was damaged before that, skip it
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+
+        return records
+
+    def append(self, record):
+        """ append a single record and flush it to disk """
+        self.append_many([record])
+
+    def append_many(self, records):
+        """ append several records with a single write and flush """
+
+        try:
+            data = append_records(self.file_name, records)
+        except OSError:
+            # a partial write would leave the retried records glued to its bytes
+            if os.path.exists(self.file_name):
+                os.truncate(self.file_name, self.size)
+            raise
+
+        self.size += len(data)
+        count("journal.bytes_written", len(data))
+
+    def set_deck_size(self, deck_size):
+        """
+        Compact only once the journal reaches half the size of the deck
+        file, so a stream of changes, such as a large import, rewrites the
+        deck a number of times that grows with the log of its size rather
+        than with the number of changes.
+        """
+        self.compact_size = max(JOURNAL_COMPACT_SIZE, deck_size // 2)
+
+    def needs_compaction(self):
+        """ returns True if the journal should be folded into the deck file """
+        return self.size >= self.compact_size
+
+    def is_empty(self):
+        """ returns True if there is nothing to compact """
+        return self.size == 0
+
+    def read_history(self):
+        """ return the archived and current review records, oldest first """
+
+        records = self.read_records(self.history_file_name) if self.history_file_name else []
+        records += [r for r in self.read_records() if r['op'] == "review"]
+
+        # a crash between archiving and clearing can archive a review twice
+        history = {}
+        for r in records:
+            # reviews journaled before answers were recorded can't be used
+            if 'answer' in r:
+                history[(r['card'], r['last_review'])] = r
+
+        return list(history.values())
+
+    def clear(self):
+        """ drop all records, called once they are part of the deck file """
+
+        if self.history_file_name is not None:
+            reviews = [r for r in self.read_records() if r['op'] == "review"]
+            if reviews:
+                append_records(self.history_file_name, reviews)
+
+        if os.path.exists(self.file_name):
+            os.remove(self.file_name)
+
+        self.size = 0
+
+def truncate_partial_line(file_name):
+    """ cut the file after its last complete line, returns its size """
+
+    with open(file_name, "r+b") as f:
+        size = f.seek(0, os.SEEK_END)
+
+        # look back from the end for the last newline, a block at a time
+        end = size
+        while end > 0:
+            start = max(0, end - 4096)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b"\n")
+            if newline >= 0:
+                end = start + newline + 1
+                break
+            end = start
+
+        if end < size:
+            f.truncate(end)
+            f.flush()
+            os.fsync(f.fileno())
+            count("journal.bytes_truncated", size - end)
+
+    return end
+
+def append_records(file_name, records):
+    """ append records as JSON lines with a single write and flush, return the bytes """
+
+    lines = [json.dumps(r, default=str, ensure_ascii=False) + "\n" for r in records]
+    data = "".join(lines).encode("utf-8")
+
+    with open(file_name, "ab") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+    return data
+
+def write_json_atomic(file_name, data, indent=4):
+    """ write data as json to a temporary file and rename it into place """
+
+    tmp_file_name = file_name + ".tmp"
+    with open(tmp_file_name, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=indent, default=str, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp_file_name, file_name)
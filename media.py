@@ -0,0 +1,161 @@
+import os
+import re
+import sys
+import hashlib
+
+from deck import DECK_DIRECTORY
+
+MEDIA_DIRECTORY = DECK_DIRECTORY + "media/"
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".bmp", ".webp", ".svg")
+SOUND_EXTENSIONS = (".mp3", ".ogg", ".oga", ".opus", ".wav", ".m4a", ".flac")
+
+IMAGE = "image"
+SOUND = "sound"
+
+MEDIA_KINDS = dict([(extension, IMAGE) for extension in IMAGE_EXTENSIONS] +
+                   [(extension, SOUND) for extension in SOUND_EXTENSIONS])
+
+# a card's front or back refers to its media as [image:<name>] or [sound:<name>]
+MEDIA_PATTERN = re.compile(r"\[(image|sound):([^\[\]\s]+)\]")
+
+# bytes hashed and copied at a time, so large files are never read whole
+CHUNK_SIZE = 1 << 20
+
+def get_media_kind(file_name):
+    """ return IMAGE or SOUND for a media file name, or None if it is neither """
+    return MEDIA_KINDS.get(os.path.splitext(file_name)[1].lower())
+
+def media_reference(name):
+    """ return the text that refers a card to a stored media file """
+    return "[{}:{}]".format(get_media_kind(name), name)
+
+def split_media(text):
+    """
+    Split a card's front or back into its text, without the media
+    references, and the list of (kind, name) of the media it refers to.
+    """
+
+    # most cards have no media, skip the regular expression for them
+    if "[" not in text:
+        return text, []
+
+    media = MEDIA_PATTERN.findall(text)
+    if not media:
+        return text, []
+
+    return MEDIA_PATTERN.sub("", text).strip(), media
+
+def find_media(text, kind=None):
+    """ return the names of the media a card's text refers to, of one kind if given """
+    return [name for media_kind, name in split_media(text)[1] if kind is None or media_kind == kind]
+
+def hide_media_names(text):
+    """ return a card's text with its media references shortened to [image] and [sound] """
+
+    if "[" not in text:
+        return text
+
+    return MEDIA_PATTERN.sub(r"[\1]", text)
+
+class MediaStore:
+    """
+    MediaStore Class
+        The images and sounds of the cards, shared by every deck in the
+        deck directory. Each file is stored once under the SHA-256 hash of
+        its content, so cards and decks adding the same picture all refer
+        to the same file, and a stored file never changes.
+    """
+
+    def __init__(self, directory=MEDIA_DIRECTORY):
+        self.directory = directory
+
+    def get_path(self, name):
+        """ return the path of a stored media file, whether it exists or not """
+
+        # names come from card text, never let one point outside the store
+        if not name or os.path.basename(name) != name or name.startswith("."):
+            raise ValueError("not a media file name: " + repr(name))
+
+        return os.path.join(self.directory, name)
+
+    def exists(self, name):
+        try:
+            return os.path.exists(self.get_path(name))
+        except ValueError:
+            return False
+
+    def add_file(self, file_name):
+        """ store a copy of a media file, if it isn't stored yet, and return its name """
+
+        with open(file_name, "rb") as f:
+            return self.add_stream(f, os.path.splitext(file_name)[1])
+
+    def add_stream(self, f, extension):
+        """
+        Store the media read from a binary file object, e.g. a member of a
+        zip file, and return its name. The content is hashed as it is
+        copied, and the copy dropped if the store already has it.
+        """
+
+        extension = extension.lower()
+        if extension not in MEDIA_KINDS:
+            raise ValueError("not an image or sound extension: " + extension)
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        digest = hashlib.sha256()
+        tmp_path = os.path.join(self.directory, ".incoming-{}-{}".format(os.getpid(), id(f)))
+        try:
+            with open(tmp_path, "wb") as out:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                    digest.update(chunk)
+                    out.write(chunk)
+
+            name = digest.hexdigest() + extension
+            if not self.exists(name):
+                os.replace(tmp_path, self.get_path(name))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        return name
+
+    def add_bytes(self, data, extension):
+        """ store media given as bytes, e.g. from an imported file, and return its name """
+
+        extension = extension.lower()
+        if extension not in MEDIA_KINDS:
+            raise ValueError("not an image or sound extension: " + extension)
+
+        name = hashlib.sha256(data).hexdigest() + extension
+        if not self.exists(name):
+            self.write(name, [data])
+
+        return name
+
+    def write(self, name, chunks):
+        """ write a new media file, renamed into place once complete """
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        # a file with the name is always complete, even if the copy was cut short
+        path = self.get_path(name)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(tmp_path, path)
+
+def main():
+    """ store media files and print the reference to paste into a card """
+
+    if len(sys.argv) < 2:
+        sys.exit("usage: python media.py FILE ...")
+
+    store = MediaStore()
+    for file_name in sys.argv[1:]:
+        print("{}  {}".format(media_reference(store.add_file(file_name)), file_name))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+import sys
+import time
+import argparse
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from schedulers import FSRS_DEFAULT_WEIGHTS
+
+# weights used with binary answers, the "hard" and "easy" ones are never reached
+ACTIVE_WEIGHTS = [0, 2, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14]
+
+# the optimizer keeps every weight within these bounds
+WEIGHT_BOUNDS = [
+    (0.1, 100), (0.1, 100), (0.1, 100), (0.1, 100),
+    (1, 10), (0.01, 5), (0.01, 5), (0, 0.75),
+    (0, 4), (0, 0.8), (0.01, 3), (0.5, 5),
+    (0.01, 0.25), (0.01, 0.9), (0.01, 4), (0, 1), (1, 10),
+]
+
+ITERATIONS = 100
+LEARNING_RATE = 0.05
+STEP = 1e-3
+
+# reviews per optimizer step, so a step costs the same on any size of deck
+BATCH_SIZE = 16384
+
+MICROSECONDS_PER_DAY = 24 * 60 * 60 * 1000000
+
+class ReviewSequences:
+    """
+    ReviewSequences Class
+        A deck's review history grouped into one sequence per card, laid
+        out so the FSRS model can be replayed for every card at once.
+        Cards are ordered by number of reviews, longest first, so the
+        cards still being replayed at step k are always the first ones.
+    """
+
+    def __init__(self, history):
+        if np is None:
+            raise ImportError("the optimizer requires numpy (pip install numpy)")
+
+        cards = np.array([card for card, _, _ in history], dtype=np.int64)
+        times = np.array([t for _, t, _ in history], dtype="datetime64[us]").astype(np.int64)
+        answers = np.array([answer for _, _, answer in history], dtype=bool)
+
+        # reviews of the same card next to each other, in time order
+        order = np.lexsort((times, cards))
+        cards, times, answers = cards[order], times[order], answers[order]
+
+        _, starts, lengths = np.unique(cards, return_index=True, return_counts=True)
+        by_length = np.argsort(-lengths, kind="stable")
+        self.starts = starts[by_length]
+        lengths = lengths[by_length]
+
+        # when each card was last reviewed, in microseconds since the epoch
+        self.last_times = times[self.starts + lengths - 1]
+
+        # number of cards with more than k reviews, for every step k
+        steps = np.arange(lengths.max() if len(lengths) else 0)
+        self.active = np.searchsorted(-lengths, -steps, side="left")
+
+        # days since the previous review of the same card
+        elapsed = np.zeros(len(times))
+        elapsed[1:] = np.diff(times) / MICROSECONDS_PER_DAY
+
+        self.first_answers = answers[self.starts]
+
+        # for every later step: the elapsed days of the active cards and
+        # which of them were answered right or wrong
+        self.steps = []
+        for k in range(1, len(steps)):
+            reviews = self.starts[:self.active[k]] + k
+            answer = answers[reviews]
+            self.steps.append((elapsed[reviews], answer, np.flatnonzero(answer), np.flatnonzero(~answer)))
+
+        # every review but a card's first is a prediction to score
+        self.predictions = len(times) - len(lengths)
+
+    def loss(self, weights):
+        """
+        Return the mean log loss of the recall predictions for each row of
+        a (sets, 17) weight array, replaying all cards and weight sets at once.
+        """
+
+        w = [weights[:, i:i + 1] for i in range(weights.shape[1])]
+        total = np.zeros(len(weights))
+
+        first = self.first_answers
+        stability = np.where(first, w[2], w[0])
+        difficulty = np.clip(w[4] + np.where(first, 0, 2) * w[5], 1, 10)
+        mean_difficulty = np.clip(w[4], 1, 10)
+        exp_w8 = np.exp(w[8])
+
+        for elapsed, answer, right, wrong in self.steps:
+            n = len(answer)
+            stability = stability[:, :n]
+            difficulty = difficulty[:, :n]
+
+            recall = 1 / (1 + elapsed / (9 * stability))
+            p = np.where(answer, recall, 1 - recall)
+            total -= np.log(np.clip(p, 1e-6, None)).sum(axis=1)
+
+            # the stability updates are only computed for the cards they apply to
+            new_stability = np.empty_like(stability)
+            s, d, r = stability[:, right], difficulty[:, right], recall[:, right]
+            new_stability[:, right] = s * (1 + exp_w8 * (11 - d) * np.exp(-w[9] * np.log(s))
+                                           * np.expm1(w[10] * (1 - r)))
+            s, d, r = stability[:, wrong], difficulty[:, wrong], recall[:, wrong]
+            new_stability[:, wrong] = np.minimum(s, w[11] * np.exp(-w[12] * np.log(d))
+                                                 * np.expm1(w[13] * np.log1p(s)) * np.exp(w[14] * (1 - r)))
+            stability = np.maximum(new_stability, 0.01)
+
+            # a wrong answer ("again", grade 1) raises the difficulty
+            difficulty = difficulty + w[6] * np.where(answer, 0, 2)
+            difficulty = np.clip(w[7] * mean_difficulty + (1 - w[7]) * difficulty, 1, 10)
+
+        return total / max(self.predictions, 1)
+
+def split_history(history, batch_size, seed=0):
+    """ split a review history into batches of whole cards, about batch_size reviews each """
+
+    cards = sorted({card for card, _, _ in history})
+    np.random.default_rng(seed).shuffle(cards)
+
+    number_of_batches = max(1, round(len(history) / batch_size))
+    batch_of_card = {card: i % number_of_batches for i, card in enumerate(cards)}
+
+    batches = [[] for _ in range(number_of_batches)]
+    for review in history:
+        batches[batch_of_card[review[0]]].append(review)
+
+    return batches
+
+def fit_fsrs(history, weights=None, iterations=ITERATIONS, learning_rate=LEARNING_RATE, batch_size=BATCH_SIZE):
+    """
+    Fit FSRS weights to a review history of (card, review time, answer)
+    tuples. Returns the weights with the lowest log loss on the whole
+    history, which are the starting weights if no step improved on them,
+    and the log loss before and after.
+    """
+
+    sequences = ReviewSequences(history)
+    batches = [ReviewSequences(batch) for batch in split_history(history, batch_size)]
+
+    w = np.array(weights if weights is not None else FSRS_DEFAULT_WEIGHTS, dtype=float)
+    lower, upper = np.array(WEIGHT_BOUNDS).T
+    active = np.array(ACTIVE_WEIGHTS)
+
+    # row 0 is the current weights, followed by a +/- step for each active weight
+    offsets = np.zeros((2 * len(active) + 1, len(w)))
+    offsets[1::2, active] = np.eye(len(active)) * STEP
+    offsets[2::2, active] = -np.eye(len(active)) * STEP
+
+    initial_loss = sequences.loss(w[None, :])[0]
+    best_w, best_loss = w.copy(), initial_loss
+
+    # Adam on central difference gradients, all of them from a single
+    # replay of one batch of cards
+    m = np.zeros(len(active))
+    v = np.zeros(len(active))
+    for i in range(1, iterations + 1):
+        losses = batches[i % len(batches)].loss(w + offsets)
+
+        gradient = (losses[1::2] - losses[2::2]) / (2 * STEP)
+        m = 0.9 * m + 0.1 * gradient
+        v = 0.999 * v + 0.001 * gradient ** 2
+        step = learning_rate * (m / (1 - 0.9 ** i)) / (np.sqrt(v / (1 - 0.999 ** i)) + 1e-8)
+
+        w[active] = np.clip(w[active] - step, lower[active], upper[active])
+
+        # batch steps can make the whole history fit worse, so the weights
+        # are scored on all of it after every pass over the batches
+        if i % len(batches) == 0 or i == iterations:
+            loss = sequences.loss(w[None, :])[0]
+            if loss < best_loss:
+                best_w, best_loss = w.copy(), loss
+
+    return [round(float(x), 4) for x in best_w], float(initial_loss), float(best_loss)
+
+def simulate_history(number_of_cards, reviews_per_card, seed=0):
+    """ return a synthetic review history drawn from the default FSRS model """
+
+    from datetime import datetime, timedelta
+    from schedulers import FSRSScheduler
+
+    rng = np.random.default_rng(seed)
+    scheduler = FSRSScheduler()
+    start = datetime(1900, 1, 1)
+
+    history = []
+    for card in range(number_of_cards):
+        t = start
+        srs_data = None
+        for _ in range(reviews_per_card):
+            if srs_data is None:
+                answer = bool(rng.random() < 0.7)
+                elapsed = 0
+            else:
+                # reviewed around the scheduled time, recalled with the model's odds
+                elapsed = srs_data['interval'] * rng.uniform(0.5, 2)
+                recall = (1 + elapsed / (9 * srs_data['stability'])) ** -1
+                answer = bool(rng.random() < recall)
+            t = t + timedelta(days=elapsed)
+            _, srs_data, _ = scheduler.review(0, srs_data, answer, elapsed)
+            history.append((card, t.isoformat(sep=" "), answer))
+
+    return history
+
+def main():
+    """ fit the FSRS weights of a deck to its review history """
+
+    parser = argparse.ArgumentParser(description="Fit FSRS scheduler weights to a deck's review history.")
+    parser.add_argument("deck_name", nargs="?", help="deck whose review history is used")
+    parser.add_argument("--iterations", type=int, default=ITERATIONS)
+    parser.add_argument("--dry-run", action="store_true", help="print the weights without saving them")
+    parser.add_argument("--benchmark", type=int, metavar="REVIEWS",
+                        help="time a fit on a synthetic history of this many reviews instead")
+    args = parser.parse_args()
+
+    weights = None
+    if args.benchmark:
+        history = simulate_history(args.benchmark // 10, 10)
+    elif args.deck_name:
+        from deck import open_deck
+        from remote_deck import get_server_address
+
+        # a running deck server would write its own srs_params over the fitted ones
+        if not args.dry_run and get_server_address() is not None:
+            sys.exit("the deck server is running, stop it before saving fitted weights, or use --dry-run")
+
+        deck = open_deck(args.deck_name)
+        history = deck.get_review_history()
+
+        # the fit starts from the deck's weights, and is only saved if it beats them
+        weights = (deck.deck.get("srs_params") or {}).get("weights")
+    else:
+        parser.error("a deck name or --benchmark is required")
+
+    if not history:
+        sys.exit("no recorded reviews to fit")
+
+    start = time.perf_counter()
+    weights, initial_loss, final_loss = fit_fsrs(history, weights, iterations=args.iterations)
+    fit_time = time.perf_counter() - start
+
+    print("{} reviews fitted in {:.2f}s, log loss {:.4f} -> {:.4f}".format(
+        len(history), fit_time, initial_loss, final_loss))
+    print("weights:", weights)
+
+    if args.benchmark:
+        return
+
+    # the deck is only closed, and so written, when the weights are saved
+    if deck.srs_method != "FSRS":
+        print("not saved: the weights are only used by decks with the FSRS srs method")
+    elif final_loss >= initial_loss:
+        print("not saved: the fitted weights don't improve on the deck's current ones")
+    elif not args.dry_run:
+        srs_params = dict(deck.deck.get("srs_params") or {})
+        srs_params['weights'] = weights
+        deck.set_srs_params(srs_params)
+        deck.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+import json
+import socket
+import threading
+import http.client
+from datetime import datetime
+from http import HTTPStatus
+from urllib.parse import quote
+
+from deck import DECK_DIRECTORY, TIME_FORMAT, Flashcard, FlashcardDeck, parse_review_time
+from duplicates import KEEP, DuplicateCardError
+from stats import DeckStats
+
+# name of the file a running deck server writes, see server.py
+SERVER_FILE_NAME = ".server.json"
+
+# the server is local, anything slower than this means it is gone
+CONNECT_TIMEOUT = 0.5
+REQUEST_TIMEOUT = 30
+
+def get_server_address(directory=DECK_DIRECTORY):
+    """ return (host, port) of the deck server running for a directory, if any """
+
+    try:
+        with open(directory + SERVER_FILE_NAME, "r", encoding="utf-8") as f:
+            server = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+    # the file is left behind if the server was killed
+    address = (server['host'], server['port'])
+    try:
+        socket.create_connection(address, timeout=CONNECT_TIMEOUT).close()
+    except OSError:
+        return None
+
+    return address
+
+class RemoteFlashcardDeck(FlashcardDeck):
+    """
+    RemoteFlashcardDeck Class
+        A deck held in memory by a deck server. Every operation is a
+        request to the server, so all front ends see the same cards
+        and only the server writes the deck files.
+    """
+
+    def __init__(self, deck_name, address):
+        self.deck_name = deck_name
+        self.path = "/decks/" + quote(deck_name, safe="")
+        self.conn = http.client.HTTPConnection(address[0], address[1], timeout=REQUEST_TIMEOUT)
+
+        # the GUI answers on its own thread and closes decks on a worker
+        self.lock = threading.Lock()
+
+        # cards handed out but not answered yet, mapped to their handout id
+        self.in_flight = {}
+
+        self.srs_method = self.request("GET", "stats")['srs_method']
+
+    def request(self, method, operation, body=None):
+        """ send a request to the server and return its JSON reply """
+
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8") if body is not None else None
+        headers = {"Content-Type": "application/json"} if data is not None else {}
+
+        with self.lock:
+            try:
+                self.conn.request(method, self.path + "/" + operation, data, headers)
+                response = self.conn.getresponse()
+                reply = json.loads(response.read())
+            except (OSError, http.client.HTTPException):
+                # reconnect on the next request
+                self.conn.close()
+                raise
+
+        # a card rejected as a duplicate by the server's deck
+        if response.status == HTTPStatus.CONFLICT:
+            raise DuplicateCardError(reply['card'], body['front'])
+
+        # a card id the server's deck doesn't know, as a local deck would raise
+        if response.status == HTTPStatus.NOT_FOUND and operation in ("get_cards", "edit", "delete"):
+            raise KeyError(reply['error'])
+
+        if response.status != 200:
+            raise RuntimeError("deck server: " + reply.get('error', response.reason))
+
+        return reply
+
+    def get_total_number_of_cards(self):
+        """ return total number of cards in deck """
+        return self.request("GET", "stats")['card_total']
+
+    def get_number_pending(self):
+        """ return number of cards pending for review """
+        return self.request("GET", "stats")['pending']
+
+    def get_next_due_time(self):
+        """ return the time the next scheduled card becomes due, if any """
+
+        next_due = self.request("GET", "stats")['next_due']
+        if next_due is None:
+            return None
+
+        return datetime.strptime(next_due, TIME_FORMAT)
+
+    def find_cards(self, text="", mem_level=None, sort_by="due_time", descending=False):
+        """ return the ids of the matching cards, see FlashcardDeck.find_cards """
+
+        body = {'text': text, 'mem_level': mem_level, 'sort_by': sort_by, 'descending': descending}
+        return self.request("POST", "find", body)['ids']
+
+    def get_flashcards(self, card_ids):
+        """ return the cards with the given ids, in the same order """
+
+        cards = []
+        for card_dict in self.request("POST", "get_cards", {'ids': list(card_ids)})['cards']:
+            card = Flashcard(card_dict)
+            card.set_due_time(parse_review_time(card_dict['due_time']))
+            cards.append(card)
+
+        return cards
+
+    def get_flashcard(self, card_id):
+        """ return the card with the given id """
+        return self.get_flashcards([card_id])[0]
+
+    def edit_flashcard(self, card_id, front, back, notes):
+        """ replace the front, back and notes of a card """
+        self.request("POST", "edit", {'id': card_id, 'front': front, 'back': back, 'notes': notes})
+
+    def delete_flashcard(self, card_id):
+        """ remove a card from the deck, raises KeyError if there is none """
+        self.request("POST", "delete", {'id': card_id})
+
+    def get_stats(self):
+        """ return the server's current stats of the deck """
+        return DeckStats.from_dict(self.request("GET", "review_stats"))
+
+    def set_stats(self, stats):
+        """ the server keeps the stats of its decks """
+
+    def get_review_history(self):
+        """ the history is kept next to the server's deck files """
+        raise self.server_only("the review history")
+
+    def set_srs_params(self, srs_params):
+        """ the server owns the deck file the parameters are written to """
+        raise self.server_only("changing the srs parameters")
+
+    def server_only(self, what):
+        """ the error for operations the deck server doesn't serve """
+        return NotImplementedError(what + " of a deck isn't available through the deck server, "
+                                   "stop the server or open the deck with use_server=False")
+
+    def hand_out(self, operation):
+        """ return the card handed out by the server, or None """
+
+        reply = self.request("GET", operation)
+        if reply['card'] is None:
+            return None
+
+        card = Flashcard(reply['card'])
+        card.set_due_time(parse_review_time(reply['due_time']))
+        self.in_flight[card] = reply['id']
+        return card
+
+    def get_next_flashcard(self):
+        """ return the next available pending flashcard """
+        return self.hand_out("next")
+
+    def get_earliest_flashcard(self):
+        """ like get_next_flashcard, but hand out the card that has been due the longest """
+        return self.hand_out("earliest")
+
+    def put_back_flashcard(self, card):
+        """ return a card handed out by get_next_flashcard but not answered """
+
+        handout_id = self.in_flight.pop(card, None)
+        if handout_id is not None:
+            self.request("POST", "put_back", {'id': handout_id})
+
+    def log_answer(self, curr_card, answer):
+        """ send the answer to a card handed out by get_next_flashcard """
+
+        handout_id = self.in_flight.pop(curr_card, None)
+        if handout_id is not None:
+            self.request("POST", "answer", {'id': handout_id, 'answer': bool(answer)})
+
+    def add_flashcard(self, front, back, notes, on_duplicate=KEEP):
+        """ add flashcard to deck, returns the new card's id, see FlashcardDeck.add_flashcard """
+
+        body = {'front': front, 'back': back, 'notes': notes, 'on_duplicate': on_duplicate}
+        return self.request("POST", "cards", body)['card']
+
+    def add_flashcards(self, card_dicts, on_duplicate=KEEP):
+        """ add a batch of flashcard dicts, journaled by the server right away, returns the number added """
+
+        cards = [dict(card) for card in card_dicts]
+        for card in cards:
+            if type(card['last_review']) != str:
+                card['last_review'] = card['last_review'].strftime(TIME_FORMAT)
+
+        return self.request("POST", "cards", {'cards': cards, 'on_duplicate': on_duplicate})['added']
+
+    def enable_background_writes(self):
+        """ the server already writes in the background """
+
+    def save_deck(self):
+        """ ask the server to write the deck file """
+        self.request("POST", "save")
+
+    def close(self):
+        """ return any cards still handed out and disconnect """
+
+        for card in list(self.in_flight):
+            self.put_back_flashcard(card)
+
+        self.conn.close()
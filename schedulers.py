@@ -0,0 +1,314 @@
+import math
+
+# numpy is only imported by the batch functions below, which are used by
+# the simulator, so importing deck for a headless start doesn't load it
+
+# keys correspond to the memory level of the flashcard
+# values correspond to the number of days that must pass
+#     before the next time the flashcard is shown
+SRS_KEYS = {
+    # Fibonacci: there are 9 memory levels, after which
+    #            the flashcard will be shown every 21 days
+    "Fibonacci": {0:0, 1:1, 2:1, 3:2, 4:3, 5:5, 6:8, 7:13, 8:21},
+}
+
+MAX_MEM_LEVEL = 9
+
+def get_srs_interval(srs_key, mem_level):
+    """ return the number of days to wait at a given mem level """
+
+    # cards past the last level keep the longest interval
+    return srs_key[min(mem_level, max(srs_key))]
+
+def next_mem_level(mem_level, answer):
+    """ move a mem level up on a right answer and down on a wrong one """
+
+    if answer:
+        return min(mem_level + 1, MAX_MEM_LEVEL)
+
+    return max(mem_level - 1, 0)
+
+def next_mem_levels(mem_levels, answers):
+    """ next_mem_level for arrays of mem levels and answers """
+
+    import numpy as np
+
+    return np.clip(mem_levels + np.where(answers, 1, -1), 0, MAX_MEM_LEVEL)
+
+class Scheduler:
+    """
+    Scheduler Class
+        Base class of the spaced repetition methods. A scheduler works on
+        a card's mem level and its own per-card state (srs_data, a small
+        dict or None) and returns the number of days until the card is
+        next due, so the deck computes a due time once per answer.
+    """
+
+    name = None
+
+    def __init__(self, params=None):
+        self.params = params
+
+    def get_interval(self, mem_level, srs_data):
+        """ return the days between a card's last review and its next one """
+        raise NotImplementedError
+
+    def review(self, mem_level, srs_data, answer, elapsed_days):
+        """ return the new (mem_level, srs_data, interval) after an answer """
+        raise NotImplementedError
+
+    def new_states(self, number_of_cards):
+        """ return the state of new cards for review_batch, a dict of arrays """
+
+        import numpy as np
+
+        return {
+            'mem_level': np.zeros(number_of_cards, dtype=np.int64),
+            'srs_data': np.full(number_of_cards, None, dtype=object),
+        }
+
+    def review_batch(self, states, index, answers, elapsed_days):
+        """
+        Answer the cards at index all at once, with arrays of answers and
+        elapsed days, update their states and return their intervals. This
+        one calls review() for each card, schedulers override it with array
+        operations (see simulator.py).
+        """
+
+        import numpy as np
+
+        intervals = np.empty(len(index))
+        srs_data = states['srs_data']
+        for j, i in enumerate(index):
+            mem_level, srs_data[i], intervals[j] = self.review(
+                int(states['mem_level'][i]), srs_data[i], bool(answers[j]), float(elapsed_days[j]))
+            states['mem_level'][i] = mem_level
+
+        return intervals
+
+class FibonacciScheduler(Scheduler):
+    """ intervals looked up from the mem level in SRS_KEYS["Fibonacci"] """
+
+    name = "Fibonacci"
+
+    def __init__(self, params=None):
+        super().__init__(params)
+        self.srs_key = SRS_KEYS["Fibonacci"]
+
+    def get_interval(self, mem_level, srs_data):
+        return get_srs_interval(self.srs_key, mem_level)
+
+    def review(self, mem_level, srs_data, answer, elapsed_days):
+        mem_level = next_mem_level(mem_level, answer)
+        return mem_level, None, get_srs_interval(self.srs_key, mem_level)
+
+    def new_states(self, number_of_cards):
+        import numpy as np
+
+        return {'mem_level': np.zeros(number_of_cards, dtype=np.int64)}
+
+    def review_batch(self, states, index, answers, elapsed_days):
+        import numpy as np
+
+        intervals = np.array([get_srs_interval(self.srs_key, level) for level in range(MAX_MEM_LEVEL + 1)])
+
+        mem_levels = next_mem_levels(states['mem_level'][index], answers)
+        states['mem_level'][index] = mem_levels
+        return intervals[mem_levels]
+
+class SM2Scheduler(Scheduler):
+    """
+    SM-2 (SuperMemo 2) with right answers graded 4 and wrong ones 2.
+    srs_data holds the card's ease factor, repetition count and interval.
+    """
+
+    name = "SM-2"
+
+    def get_interval(self, mem_level, srs_data):
+        if srs_data is None:
+            return 0
+        return srs_data['interval']
+
+    def review(self, mem_level, srs_data, answer, elapsed_days):
+        if srs_data is None:
+            srs_data = {'ease': 2.5, 'repetitions': 0, 'interval': 0}
+
+        ease = srs_data['ease']
+        repetitions = srs_data['repetitions']
+        interval = srs_data['interval']
+
+        quality = 4 if answer else 2
+        if quality >= 3:
+            if repetitions == 0:
+                interval = 1
+            elif repetitions == 1:
+                interval = 6
+            else:
+                interval = round(interval * ease)
+            repetitions += 1
+        else:
+            # start over without touching the ease factor
+            repetitions = 0
+            interval = 1
+
+        ease = max(1.3, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+
+        srs_data = {'ease': round(ease, 4), 'repetitions': repetitions, 'interval': interval}
+        return next_mem_level(mem_level, answer), srs_data, interval
+
+    def new_states(self, number_of_cards):
+        import numpy as np
+
+        return {
+            'mem_level': np.zeros(number_of_cards, dtype=np.int64),
+            'ease': np.full(number_of_cards, 2.5),
+            'repetitions': np.zeros(number_of_cards, dtype=np.int64),
+            'interval': np.zeros(number_of_cards),
+        }
+
+    def review_batch(self, states, index, answers, elapsed_days):
+        import numpy as np
+
+        ease = states['ease'][index]
+        repetitions = states['repetitions'][index]
+        interval = states['interval'][index]
+
+        # same steps as review(), a right answer is quality 4 and a wrong one 2
+        quality = np.where(answers, 4, 2)
+        interval = np.where(answers, np.select([repetitions == 0, repetitions == 1], [1, 6], np.round(interval * ease)), 1)
+        repetitions = np.where(answers, repetitions + 1, 0)
+        ease = np.maximum(1.3, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+
+        states['ease'][index] = np.round(ease, 4)
+        states['repetitions'][index] = repetitions
+        states['interval'][index] = interval
+        states['mem_level'][index] = next_mem_levels(states['mem_level'][index], answers)
+        return interval
+
+# FSRS v4 default weights, see https://github.com/open-spaced-repetition/fsrs4anki
+FSRS_DEFAULT_WEIGHTS = [0.4, 0.6, 2.4, 5.8, 4.93, 0.94, 0.86, 0.01, 1.49, 0.14, 0.94, 2.18, 0.05, 0.34, 1.26, 0.29, 2.61]
+
+# answers are binary, a wrong answer is graded "again" and a right one "good"
+FSRS_AGAIN = 1
+FSRS_GOOD = 3
+
+def fsrs_recall(stability, elapsed_days):
+    """ return the probability of recalling a card with the given stability after elapsed_days """
+    return (1 + elapsed_days / (9 * stability)) ** -1
+
+class FSRSScheduler(Scheduler):
+    """
+    FSRS-style scheduler: every card has a stability (days until recall
+    drops to 90%) and a difficulty between 1 and 10, updated from the
+    recall probability at the time of each review. The weights can be
+    fitted to a deck's review history with optimizer.py.
+    """
+
+    name = "FSRS"
+
+    def __init__(self, params=None):
+        super().__init__(params)
+        params = params or {}
+        self.weights = params.get('weights', FSRS_DEFAULT_WEIGHTS)
+        self.retention = params.get('retention', 0.9)
+        self.maximum_interval = params.get('maximum_interval', 36500)
+
+    def get_interval(self, mem_level, srs_data):
+        if srs_data is None:
+            return 0
+        return srs_data['interval']
+
+    def initial_difficulty(self, grade):
+        w = self.weights
+        return min(max(w[4] - (grade - 3) * w[5], 1), 10)
+
+    def review(self, mem_level, srs_data, answer, elapsed_days):
+        w = self.weights
+        grade = FSRS_GOOD if answer else FSRS_AGAIN
+
+        if srs_data is None:
+            stability = w[grade - 1]
+            difficulty = self.initial_difficulty(grade)
+        else:
+            stability = srs_data['stability']
+            difficulty = srs_data['difficulty']
+            recall = fsrs_recall(stability, elapsed_days)
+
+            if answer:
+                stability = stability * (1 + math.exp(w[8]) * (11 - difficulty)
+                                         * stability ** -w[9] * (math.exp(w[10] * (1 - recall)) - 1))
+            else:
+                stability = min(stability, w[11] * difficulty ** -w[12]
+                                * ((stability + 1) ** w[13] - 1) * math.exp(w[14] * (1 - recall)))
+
+            difficulty = difficulty - w[6] * (grade - 3)
+            difficulty = w[7] * self.initial_difficulty(FSRS_GOOD) + (1 - w[7]) * difficulty
+            difficulty = min(max(difficulty, 1), 10)
+
+        # days until recall probability falls to the target retention
+        interval = round(9 * stability * (1 / self.retention - 1))
+        interval = min(max(interval, 1), self.maximum_interval)
+
+        srs_data = {'stability': round(stability, 4), 'difficulty': round(difficulty, 4), 'interval': interval}
+        return next_mem_level(mem_level, answer), srs_data, interval
+
+    def new_states(self, number_of_cards):
+        import numpy as np
+
+        # cards not reviewed yet have no stability
+        return {
+            'mem_level': np.zeros(number_of_cards, dtype=np.int64),
+            'stability': np.full(number_of_cards, np.nan),
+            'difficulty': np.full(number_of_cards, np.nan),
+            'interval': np.zeros(number_of_cards),
+        }
+
+    def review_batch(self, states, index, answers, elapsed_days):
+        import numpy as np
+
+        w = self.weights
+        stability = states['stability'][index]
+        difficulty = states['difficulty'][index]
+        grade = np.where(answers, FSRS_GOOD, FSRS_AGAIN)
+        first = np.isnan(stability)
+
+        # same steps as review(), new cards come out as nan and are set below
+        with np.errstate(invalid="ignore"):
+            recall = fsrs_recall(stability, elapsed_days)
+            right = stability * (1 + math.exp(w[8]) * (11 - difficulty)
+                                 * stability ** -w[9] * (np.exp(w[10] * (1 - recall)) - 1))
+            wrong = np.minimum(stability, w[11] * difficulty ** -w[12]
+                               * ((stability + 1) ** w[13] - 1) * np.exp(w[14] * (1 - recall)))
+            stability = np.where(answers, right, wrong)
+
+            difficulty = difficulty - w[6] * (grade - 3)
+            difficulty = w[7] * self.initial_difficulty(FSRS_GOOD) + (1 - w[7]) * difficulty
+            difficulty = np.clip(difficulty, 1, 10)
+
+        stability = np.where(first, np.where(answers, w[FSRS_GOOD - 1], w[FSRS_AGAIN - 1]), stability)
+        difficulty = np.where(first, np.clip(w[4] - (grade - 3) * w[5], 1, 10), difficulty)
+
+        interval = np.clip(np.round(9 * stability * (1 / self.retention - 1)), 1, self.maximum_interval)
+
+        states['stability'][index] = np.round(stability, 4)
+        states['difficulty'][index] = np.round(difficulty, 4)
+        states['interval'][index] = interval
+        states['mem_level'][index] = next_mem_levels(states['mem_level'][index], answers)
+        return interval
+
+SCHEDULERS = {
+    scheduler.name: scheduler
+    for scheduler in (FibonacciScheduler, SM2Scheduler, FSRSScheduler)
+}
+
+def register_scheduler(scheduler):
+    """ make a Scheduler subclass available as an srs_method """
+    SCHEDULERS[scheduler.name] = scheduler
+
+def get_scheduler(srs_method, params=None):
+    """ return the scheduler for a deck's srs_method """
+
+    if srs_method not in SCHEDULERS:
+        raise ValueError("unknown srs_method: " + str(srs_method))
+
+    return SCHEDULERS[srs_method](params)
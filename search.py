@@ -0,0 +1,281 @@
+import re
+import sys
+import json
+import time
+import sqlite3
+import threading
+
+from deck import DECK_DIRECTORY, list_decks, open_deck
+from catalog import get_deck_stamp
+
+SEARCH_FILE_NAME = ".search.sqlite"
+
+# default number of results returned by a search
+SEARCH_LIMIT = 50
+
+# cards inserted per statement when a deck is (re)indexed
+INDEX_BATCH_SIZE = 10000
+
+# matches ranked per search. A query matching more cards than this (e.g. a
+# common word or a short prefix) only ranks the first ones in the index, in
+# the order their decks were indexed, and its results say so
+MAX_RANKED_MATCHES = 1000
+
+# cards are stored once in "docs", the full-text index only holds the terms;
+# diacritics are removed and prefix indexes make short prefixes fast. The
+# index is written next to "docs" rather than by triggers, which are several
+# times slower when a large deck is indexed
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS indexed_decks (
+    deck  TEXT PRIMARY KEY,
+    stamp TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS docs (
+    id    INTEGER PRIMARY KEY,
+    deck  TEXT NOT NULL,
+    card  INTEGER NOT NULL,
+    front TEXT,
+    back  TEXT,
+    notes TEXT
+);
+CREATE INDEX IF NOT EXISTS docs_deck_card ON docs (deck, card);
+CREATE VIRTUAL TABLE IF NOT EXISTS docs_fts USING fts5(
+    front, back, notes,
+    content = 'docs',
+    content_rowid = 'id',
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+);
+"""
+
+def build_match_query(text):
+    """ turn search box text into an FTS5 query matching every word as a prefix """
+
+    # quoting each word keeps FTS5 operators typed by the user literal;
+    # single letters match whole words, as a prefix they match nearly everything
+    words = re.findall(r"\w+", text)
+    return " ".join('"' + word + '"' + ("*" if len(word) > 1 else "") for word in words)
+
+class SearchIndex:
+    """
+    SearchIndex Class
+        Full-text index over the front, back and notes of the cards of
+        every deck, kept in a SQLite database next to the decks. Decks are
+        reindexed when their files change, and cards added in the app are
+        indexed as they are added. Matching ignores case and accents and
+        treats every word of a query as a prefix.
+    """
+
+    def __init__(self, directory=DECK_DIRECTORY):
+        self.directory = directory
+        self.file_name = directory + SEARCH_FILE_NAME
+
+        # searches run on the GUI thread while a worker updates the index,
+        # so every thread gets its own connection
+        self.local = threading.local()
+
+        conn = self.connect()
+        conn.executescript(SCHEMA)
+
+    def connect(self):
+        """ return the calling thread's connection to the index """
+
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.file_name)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+
+        return conn
+
+    def get_stamp(self, deck_name):
+        """ return the stamp of a deck's files when it was last indexed """
+
+        row = self.connect().execute("SELECT stamp FROM indexed_decks WHERE deck = ?", (deck_name,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def store_stamp(self, deck_name, previous_stamp):
+        """
+        Mark a deck as up to date after it has been written, if it was up to
+        date at previous_stamp and every card added since went through add_card.
+        """
+
+        conn = self.connect()
+        with conn:
+            conn.execute(
+                "UPDATE indexed_decks SET stamp = ? WHERE deck = ? AND stamp = ?",
+                (json.dumps(get_deck_stamp(deck_name, self.directory)), deck_name, json.dumps(previous_stamp)),
+            )
+
+    def index_deck(self, deck_name):
+        """ replace the indexed cards of a deck with the ones in its files """
+
+        # the deck is only read, never closed, so nothing is written to it
+        deck = open_deck(deck_name, directory=self.directory)
+        stamp = get_deck_stamp(deck_name, self.directory)
+
+        conn = self.connect()
+        with conn:
+            self.delete_docs(conn, deck_name)
+
+            # ids are assigned here so the same rows can go into both tables
+            next_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM docs").fetchone()[0]
+
+            batch = []
+            for card_id, card in deck.iter_flashcards():
+                batch.append((next_id, deck_name, card_id, card.get_front(), card.get_back(), card.get_notes()))
+                next_id += 1
+                if len(batch) >= INDEX_BATCH_SIZE:
+                    self.insert_docs(conn, batch)
+                    batch = []
+
+            self.insert_docs(conn, batch)
+            conn.execute(
+                "INSERT OR REPLACE INTO indexed_decks (deck, stamp) VALUES (?, ?)",
+                (deck_name, json.dumps(stamp)),
+            )
+
+    def insert_docs(self, conn, rows):
+        """ add rows of (id, deck, card, front, back, notes) to the index """
+
+        conn.executemany("INSERT INTO docs (id, deck, card, front, back, notes) VALUES (?, ?, ?, ?, ?, ?)", rows)
+        conn.executemany(
+            "INSERT INTO docs_fts (rowid, front, back, notes) VALUES (?, ?, ?, ?)",
+            [(row[0], row[3], row[4], row[5]) for row in rows],
+        )
+
+    def delete_docs(self, conn, deck_name, card_id=None):
+        """ remove the indexed cards of a deck, or a single one of them """
+
+        where = "deck = ?" if card_id is None else "deck = ? AND card = ?"
+        params = (deck_name,) if card_id is None else (deck_name, card_id)
+
+        # the full-text index needs the old text to remove its terms
+        conn.execute(
+            "INSERT INTO docs_fts (docs_fts, rowid, front, back, notes)"
+            " SELECT 'delete', id, front, back, notes FROM docs WHERE " + where,
+            params,
+        )
+        conn.execute("DELETE FROM docs WHERE " + where, params)
+
+    def remove_deck(self, deck_name):
+        """ drop a deck from the index """
+
+        conn = self.connect()
+        with conn:
+            self.delete_docs(conn, deck_name)
+            conn.execute("DELETE FROM indexed_decks WHERE deck = ?", (deck_name,))
+
+    def update(self):
+        """ reindex the decks whose files changed and drop removed decks, returns the reindexed names """
+
+        deck_names = list_decks(self.directory)
+
+        updated = []
+        for deck_name in deck_names:
+            if self.get_stamp(deck_name) != get_deck_stamp(deck_name, self.directory):
+                self.index_deck(deck_name)
+                updated.append(deck_name)
+
+        indexed = [row[0] for row in self.connect().execute("SELECT deck FROM indexed_decks")]
+        for deck_name in set(indexed) - set(deck_names):
+            self.remove_deck(deck_name)
+
+        return updated
+
+    def add_card(self, deck_name, card_id, front, back, notes, replace=False):
+        """ index a card as it is added to a deck, or replace the indexed text of an edited card """
+
+        conn = self.connect()
+        with conn:
+            if replace:
+                self.delete_docs(conn, deck_name, card_id)
+            doc_id = conn.execute(
+                "INSERT INTO docs (deck, card, front, back, notes) VALUES (?, ?, ?, ?, ?)",
+                (deck_name, card_id, front, back, notes),
+            ).lastrowid
+            conn.execute(
+                "INSERT INTO docs_fts (rowid, front, back, notes) VALUES (?, ?, ?, ?)",
+                (doc_id, front, back, notes),
+            )
+
+    def remove_card(self, deck_name, card_id):
+        """ drop a card deleted from a deck """
+
+        conn = self.connect()
+        with conn:
+            self.delete_docs(conn, deck_name, card_id)
+
+    def mark_stale(self, deck_name):
+        """ have a deck reindexed by the next update, e.g. after one of its cards changed """
+
+        conn = self.connect()
+        with conn:
+            conn.execute("UPDATE indexed_decks SET stamp = 'null' WHERE deck = ?", (deck_name,))
+
+    def search(self, text, deck_name=None, limit=SEARCH_LIMIT):
+        """
+        Return the best matching cards as dicts with deck, card, front, back
+        and notes, and whether they were ranked among all the matches. For
+        a query matching more than MAX_RANKED_MATCHES cards they are the
+        best of the first MAX_RANKED_MATCHES matches in the index instead.
+        """
+
+        query = build_match_query(text)
+        if not query:
+            return [], True
+
+        sql = ("SELECT docs.deck, docs.card, docs.front, docs.back, docs.notes, docs_fts.rank"
+               " FROM docs_fts JOIN docs ON docs.id = docs_fts.rowid"
+               " WHERE docs_fts MATCH ?")
+        params = [query]
+
+        if deck_name is not None:
+            sql += " AND docs.deck = ?"
+            params.append(deck_name)
+
+        # ORDER BY rank scores every match, which on 1M cards takes over a
+        # second for a word in half of them, against tens of milliseconds
+        # for the first matches; one more is read to tell if there are others
+        sql += " LIMIT ?"
+        params.append(MAX_RANKED_MATCHES + 1)
+
+        rows = self.connect().execute(sql, params).fetchall()
+        all_ranked = len(rows) <= MAX_RANKED_MATCHES
+        rows = sorted(rows[:MAX_RANKED_MATCHES], key=lambda row: row[-1])
+
+        results = [dict(zip(("deck", "card", "front", "back", "notes"), row)) for row in rows[:limit]]
+        return results, all_ranked
+
+    def close(self):
+        """ close the calling thread's connection """
+
+        conn = getattr(self.local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+def main():
+    """ update the search index and print the cards matching a query """
+
+    if len(sys.argv) < 2:
+        sys.exit("usage: python search.py WORDS...")
+
+    index = SearchIndex()
+    updated = index.update()
+    if updated:
+        print("indexed", ", ".join(updated))
+
+    start = time.perf_counter()
+    results, all_ranked = index.search(" ".join(sys.argv[1:]))
+    search_time = time.perf_counter() - start
+
+    for result in results:
+        print("{}: {} | {}".format(result['deck'], result['front'], result['back']))
+    print("{} results in {:.1f} ms".format(len(results), search_time * 1000))
+    if not all_ranked:
+        print("more than {} cards match, these are the best of the first ones found".format(MAX_RANKED_MATCHES))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,440 @@
+import os
+import sys
+import json
+import time
+import signal
+import asyncio
+import argparse
+import itertools
+from http import HTTPStatus
+from urllib.parse import urlsplit, unquote
+
+from deck import DECK_DIRECTORY, SORT_COLUMNS, TIME_FORMAT, list_decks, open_deck
+from catalog import DeckCatalog, summarize_deck
+from journal import write_json_atomic
+from duplicates import KEEP, DuplicateCardError
+from remote_deck import SERVER_FILE_NAME, get_server_address
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# cards handed out and never answered go back to their deck after this long
+HANDOUT_TIMEOUT = 30 * 60
+
+MAX_BODY_SIZE = 16 * 1024 * 1024
+
+class RequestError(Exception):
+    """ error answered to the client with an HTTP status, and optionally more fields """
+
+    def __init__(self, status, message, fields=None):
+        super().__init__(message)
+        self.status = status
+        self.fields = fields or {}
+
+class DeckServer:
+    """
+    DeckServer Class
+        Holds decks in memory and serves them over a small local HTTP/JSON
+        API, so several front ends share one copy of each deck instead of
+        racing on the deck files. Decks are loaded on first use and written
+        by their background writers, which batch changes made close together.
+        Requests to the same deck take turns, those to different decks don't.
+
+        GET  /decks                     summary of every deck
+        GET  /decks/<name>/stats        card total, pending count, next due time
+        GET  /decks/<name>/next         next pending card and its handout id, or null
+        GET  /decks/<name>/earliest     like next, but the card due the longest
+        GET  /decks/<name>/review_stats due forecast, memory levels and answers per day
+        POST /decks/<name>/answer       {"id": ..., "answer": true|false}
+        POST /decks/<name>/put_back     {"id": ...}
+        POST /decks/<name>/cards        {"front", "back", "notes"} or {"cards": [...]},
+                                        optional "on_duplicate": "keep", "reject" or "merge"
+        POST /decks/<name>/find         {"text", "mem_level", "sort_by", "descending"}, all
+                                        optional, ids of the matching cards in order
+        POST /decks/<name>/get_cards    {"ids": [...]}, the cards with those ids
+        POST /decks/<name>/edit         {"id", "front", "back", "notes"}, id from find
+        POST /decks/<name>/delete       {"id"}, id from find
+        POST /decks/<name>/save         write the deck file now
+    """
+
+    def __init__(self):
+        self.decks = {}
+        self.loading = {}
+        self.catalog = DeckCatalog()
+
+        # deck name -> lock held while a request reads or changes the deck,
+        # also while a slow operation runs on a worker thread
+        self.deck_locks = {}
+
+        # handout id -> (deck name, card, time handed out)
+        self.handouts = {}
+        self.handout_ids = itertools.count(1)
+
+        # open client connections, closed when the server stops
+        self.connections = {}
+
+        self.routes = {
+            ("GET", "stats"): self.get_stats,
+            ("GET", "next"): self.get_next_card,
+            ("GET", "earliest"): self.get_earliest_card,
+            ("GET", "review_stats"): self.get_review_stats,
+            ("POST", "answer"): self.answer_card,
+            ("POST", "put_back"): self.put_back_card,
+            ("POST", "cards"): self.add_cards,
+            ("POST", "find"): self.find_cards,
+            ("POST", "get_cards"): self.get_cards,
+            ("POST", "edit"): self.edit_card,
+            ("POST", "delete"): self.delete_card,
+            ("POST", "save"): self.save_deck,
+        }
+
+        # operations that scan a whole deck run on worker threads, so they
+        # don't hold up the requests of other clients
+        self.slow_routes = {self.find_cards, self.get_review_stats}
+
+    async def get_deck(self, deck_name):
+        """ return a loaded deck, loading it off the event loop on first use """
+
+        deck = self.decks.get(deck_name)
+        if deck is not None:
+            return deck
+
+        # only names of existing decks, never arbitrary paths
+        if deck_name not in list_decks():
+            raise RequestError(HTTPStatus.NOT_FOUND, "no deck named " + deck_name)
+
+        # concurrent first requests for a deck wait for a single load
+        lock = self.loading.setdefault(deck_name, asyncio.Lock())
+        async with lock:
+            if deck_name not in self.decks:
+                deck = await asyncio.to_thread(self.load_deck, deck_name)
+                deck.enable_background_writes()
+                self.deck_locks[deck_name] = asyncio.Lock()
+                self.decks[deck_name] = deck
+
+        return self.decks[deck_name]
+
+    def load_deck(self, deck_name):
+        """ open a deck along with its stats, runs off the event loop """
+
+        deck = self.catalog.attach_stats(open_deck(deck_name))
+
+        # built now, before requests can change the deck, if they weren't cached
+        deck.get_stats()
+        return deck
+
+    def get_handout(self, deck_name, body):
+        """ return the card of a handout id sent by the client """
+
+        handout = self.handouts.pop(body.get('id'), None)
+        if handout is None or handout[0] != deck_name:
+            raise RequestError(HTTPStatus.NOT_FOUND, "unknown card id")
+
+        return handout[1]
+
+    def expire_handouts(self, deck_name):
+        """ return cards of a deck that were handed out too long ago """
+
+        # only the deck whose lock the request holds is changed
+        cutoff = time.monotonic() - HANDOUT_TIMEOUT
+        for handout_id, (name, card, handed_out) in list(self.handouts.items()):
+            if name == deck_name and handed_out < cutoff:
+                del self.handouts[handout_id]
+                self.decks[deck_name].put_back_flashcard(card)
+
+    async def list_summaries(self):
+        """ return the summary of every deck, from memory or the catalog """
+
+        summaries = {}
+        for deck_name in list_decks():
+            if deck_name in self.decks:
+                # summarizing refreshes the pending cards, which changes the deck
+                async with self.deck_locks[deck_name]:
+                    summaries[deck_name] = summarize_deck(self.decks[deck_name])
+            else:
+                summaries[deck_name] = self.catalog.get_summary(deck_name)
+
+        return {'decks': summaries}
+
+    def get_stats(self, deck_name, deck, body):
+        summary = summarize_deck(deck)
+        summary['srs_method'] = deck.srs_method
+        return summary
+
+    def get_review_stats(self, deck_name, deck, body):
+        return deck.get_stats().to_dict()
+
+    def hand_out(self, deck_name, deck, card):
+        """ return a card handed out by a deck along with its handout id """
+
+        if card is None:
+            return {'id': None, 'card': None, 'due_time': None}
+
+        handout_id = next(self.handout_ids)
+        self.handouts[handout_id] = (deck_name, card, time.monotonic())
+        return {
+            'id': handout_id,
+            'card': card.get_as_dict(),
+            'due_time': deck.get_due_time(card).strftime(TIME_FORMAT),
+        }
+
+    def get_next_card(self, deck_name, deck, body):
+        self.expire_handouts(deck_name)
+        return self.hand_out(deck_name, deck, deck.get_next_flashcard())
+
+    def get_earliest_card(self, deck_name, deck, body):
+        self.expire_handouts(deck_name)
+        return self.hand_out(deck_name, deck, deck.get_earliest_flashcard())
+
+    def answer_card(self, deck_name, deck, body):
+        if 'answer' not in body:
+            raise RequestError(HTTPStatus.BAD_REQUEST, "missing answer")
+
+        card = self.get_handout(deck_name, body)
+        deck.log_answer(card, bool(body['answer']))
+        return {'pending': deck.get_number_pending()}
+
+    def put_back_card(self, deck_name, deck, body):
+        deck.put_back_flashcard(self.get_handout(deck_name, body))
+        return {'pending': deck.get_number_pending()}
+
+    def add_cards(self, deck_name, deck, body):
+        on_duplicate = body.get('on_duplicate', KEEP)
+        card_total = deck.get_total_number_of_cards()
+        try:
+            if 'cards' in body:
+                # journaled and written by the deck's background writer, a
+                # deck write per batch would make large imports quadratic
+                deck.add_flashcards(body['cards'], on_duplicate, journal=True)
+                card_id = None
+            else:
+                card_id = deck.add_flashcard(body['front'], body['back'], body.get('notes', ""), on_duplicate)
+        except DuplicateCardError as e:
+            raise RequestError(HTTPStatus.CONFLICT, str(e), {'card': e.card_id})
+        except (KeyError, TypeError, ValueError) as e:
+            raise RequestError(HTTPStatus.BAD_REQUEST, "invalid card: " + str(e))
+
+        # duplicates merged into existing cards don't add to the total
+        added = deck.get_total_number_of_cards() - card_total
+        return {'card': card_id, 'added': added, 'card_total': card_total + added}
+
+    def get_card_id(self, body):
+        """ check a card id sent by the client, unknown ids raise KeyError in the deck """
+
+        if type(body.get('id')) != int:
+            raise RequestError(HTTPStatus.BAD_REQUEST, "missing card id")
+
+        return body['id']
+
+    def unknown_card(self, error):
+        """ the error answered for an id the deck raised KeyError for """
+        return RequestError(HTTPStatus.NOT_FOUND, "no card with id " + str(error))
+
+    def find_cards(self, deck_name, deck, body):
+        sort_by = body.get('sort_by') or "due_time"
+        if sort_by not in SORT_COLUMNS:
+            raise RequestError(HTTPStatus.BAD_REQUEST, "cards can't be sorted by " + str(sort_by))
+
+        ids = deck.find_cards(body.get('text') or "", body.get('mem_level'), sort_by, bool(body.get('descending')))
+        return {'ids': ids}
+
+    def get_cards(self, deck_name, deck, body):
+        card_ids = body.get('ids', [])
+        if any(type(card_id) != int for card_id in card_ids):
+            raise RequestError(HTTPStatus.BAD_REQUEST, "card ids must be integers")
+
+        try:
+            found = deck.get_flashcards(card_ids)
+        except KeyError as e:
+            raise self.unknown_card(e)
+
+        cards = []
+        for card in found:
+            card_dict = card.get_as_dict()
+            card_dict['due_time'] = deck.get_due_time(card).strftime(TIME_FORMAT)
+            cards.append(card_dict)
+
+        return {'cards': cards}
+
+    def edit_card(self, deck_name, deck, body):
+        card_id = self.get_card_id(body)
+        if 'front' not in body or 'back' not in body:
+            raise RequestError(HTTPStatus.BAD_REQUEST, "invalid card: missing front or back")
+
+        try:
+            deck.edit_flashcard(card_id, str(body['front']), str(body['back']), str(body.get('notes', "")))
+        except KeyError as e:
+            raise self.unknown_card(e)
+
+        return {}
+
+    def delete_card(self, deck_name, deck, body):
+        try:
+            deck.delete_flashcard(self.get_card_id(body))
+        except KeyError as e:
+            raise self.unknown_card(e)
+
+        return {'card_total': deck.get_total_number_of_cards()}
+
+    def save_deck(self, deck_name, deck, body):
+        deck.save_deck()
+        return {}
+
+    async def respond(self, method, target, body):
+        """ return the status and JSON payload answering a request """
+
+        parts = [unquote(part) for part in urlsplit(target).path.strip("/").split("/")]
+
+        try:
+            if parts == ["decks"] and method == "GET":
+                return HTTPStatus.OK, await self.list_summaries()
+
+            if len(parts) != 3 or parts[0] != "decks":
+                raise RequestError(HTTPStatus.NOT_FOUND, "unknown path")
+
+            route = self.routes.get((method, parts[2]))
+            if route is None:
+                raise RequestError(HTTPStatus.NOT_FOUND, "unknown operation")
+
+            try:
+                body = json.loads(body) if body else {}
+            except json.JSONDecodeError:
+                raise RequestError(HTTPStatus.BAD_REQUEST, "body is not valid JSON")
+
+            if not isinstance(body, dict):
+                raise RequestError(HTTPStatus.BAD_REQUEST, "body must be a JSON object")
+
+            deck = await self.get_deck(parts[1])
+
+            # the deck isn't changed by other requests while a worker thread reads it
+            async with self.deck_locks[parts[1]]:
+                if route in self.slow_routes:
+                    loop = asyncio.get_running_loop()
+                    return HTTPStatus.OK, await loop.run_in_executor(None, route, parts[1], deck, body)
+
+                return HTTPStatus.OK, route(parts[1], deck, body)
+
+        except RequestError as e:
+            return e.status, dict(e.fields, error=str(e))
+
+        except Exception as e:
+            print("error handling", method, target, repr(e), file=sys.stderr)
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {'error': repr(e)}
+
+    async def handle_connection(self, reader, writer):
+        """ answer HTTP/1.1 requests on a connection until the client closes it """
+
+        self.connections[writer] = asyncio.current_task()
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+
+                method, target, version = request_line.decode("latin-1").split()
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY_SIZE:
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                status, payload = await self.respond(method, target, body)
+                data = json.dumps(payload, default=str, ensure_ascii=False).encode("utf-8")
+
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                head = "HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\n{}\r\n".format(
+                    status.value, status.phrase, len(data), "" if keep_alive else "Connection: close\r\n")
+
+                writer.write(head.encode("latin-1") + data)
+                await writer.drain()
+
+                if not keep_alive:
+                    break
+
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+
+        finally:
+            del self.connections[writer]
+            writer.close()
+
+    async def close_connections(self):
+        """ disconnect idle clients and wait for requests in progress """
+
+        tasks = list(self.connections.values())
+        for writer in list(self.connections):
+            writer.close()
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def close(self):
+        """ return handed out cards, write every deck and update the catalog """
+
+        for deck_name, card, _ in self.handouts.values():
+            self.decks[deck_name].put_back_flashcard(card)
+        self.handouts = {}
+
+        for deck_name, deck in self.decks.items():
+            summary = summarize_deck(deck)
+            deck.close()
+            self.catalog.store(deck_name, summary)
+
+        self.decks = {}
+
+def get_server_file_name(directory=DECK_DIRECTORY):
+    return directory + SERVER_FILE_NAME
+
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """ run the deck server until interrupted """
+
+    server = DeckServer()
+    tcp_server = await asyncio.start_server(server.handle_connection, host, port)
+    host, port = tcp_server.sockets[0].getsockname()[:2]
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signal_number, stop.set)
+        except NotImplementedError:
+            # not available on Windows, Ctrl+C still stops the loop there
+            pass
+
+    # written while the server runs, so that open_deck() finds it
+    write_json_atomic(get_server_file_name(), {'host': host, 'port': port, 'pid': os.getpid()}, indent=None)
+    print("serving decks from {} on http://{}:{}".format(DECK_DIRECTORY, host, port))
+
+    try:
+        async with tcp_server:
+            await stop.wait()
+            await server.close_connections()
+    finally:
+        os.remove(get_server_file_name())
+        server.close()
+
+def main():
+    """ serve the decks in DECK_DIRECTORY to local front ends """
+
+    parser = argparse.ArgumentParser(description="Serve decks from memory to local front ends.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="0 picks a free port")
+    args = parser.parse_args()
+
+    if get_server_address() is not None:
+        sys.exit("a deck server is already running for " + DECK_DIRECTORY)
+
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
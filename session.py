@@ -0,0 +1,343 @@
+import heapq
+import random
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from deck import list_decks, open_deck
+from catalog import DeckCatalog, summarize_deck, has_pending
+
+SESSION_NAME = "All decks"
+
+# number of due cards shuffled together before they are shown
+SESSION_WINDOW = 20
+
+# decks kept open at once, beyond these the decks without cards out are closed
+MAX_OPEN_DECKS = 4
+
+def get_earliest_due(summary):
+    """ return a time no later than the earliest due card of a summarized deck """
+
+    # the stats count cards by due day, cards are due no earlier than their day
+    due_days = summary['stats']['due_per_day']
+    if not due_days:
+        return datetime.min
+
+    return datetime.fromisoformat(min(due_days))
+
+class ReviewSession:
+    """
+    ReviewSession Class
+        Reviews the due cards of every deck as a single stream. Each deck
+        hands out its cards earliest due first, the session merges the
+        decks on due time and shuffles the cards within a small window, so
+        it holds one card per deck plus the window at any time. Answers go
+        back to the deck each card came from.
+
+        Decks are only opened once their cards come up in the merge, which
+        until then uses the earliest due day in their catalog summary, and
+        no more than MAX_OPEN_DECKS are kept open: the others are closed as
+        soon as none of their cards are out, and reopened when they come up
+        again, so the decks in memory are the few the window draws from.
+    """
+
+    def __init__(self, deck_names=None, window=SESSION_WINDOW, catalog=None, max_open_decks=MAX_OPEN_DECKS):
+        self.deck_names = list_decks() if deck_names is None else deck_names
+        self.window_size = window
+        self.max_open_decks = max_open_decks
+        self.catalog = DeckCatalog() if catalog is None else catalog
+
+        self.decks = {}
+        self.background_writes = False
+        self.card_total = 0
+
+        # summaries of the decks with cards due that aren't open
+        self.summaries = {}
+
+        # the next card of every deck, [due time, sequence, deck name, card],
+        # with no card and the earliest its cards can be due for closed decks
+        self.heads = []
+        self.head_decks = set()
+        self.counter = itertools.count()
+
+        # cards ready to be shown, kept in random order
+        self.window = []
+
+        # deck of every card taken from a deck and not answered yet
+        self.card_decks = {}
+        self.outstanding = {}
+
+        # closed decks are written out on threads of their own
+        self.closing = {}
+        self.closed_decks = []
+
+        # the next closed deck in the merge is loaded before it comes up
+        self.loader = ThreadPoolExecutor(max_workers=1)
+        self.loading = {}
+
+    def start(self):
+        """ put every deck with cards due into the merge """
+
+        now = datetime.now()
+        for deck_name in self.deck_names:
+            # decks the catalog knows have nothing due are never opened
+            summary = self.catalog.get_summary(deck_name)
+            if summary is not None and not has_pending(summary, now):
+                self.card_total += summary['card_total']
+                continue
+
+            if summary is not None:
+                self.card_total += summary['card_total']
+                self.add_closed_deck(deck_name, summary, get_earliest_due(summary))
+                continue
+
+            # decks without a summary are opened to find their first card
+            self.card_total += self.open_deck(deck_name).get_total_number_of_cards()
+            if not self.pull(deck_name):
+                self.retire_deck(deck_name)
+
+        self.release_decks()
+        self.load_ahead()
+        return self
+
+    def add_closed_deck(self, deck_name, summary, earliest_due):
+        """ put a deck that isn't open into the merge """
+
+        self.summaries[deck_name] = summary
+        heapq.heappush(self.heads, [earliest_due, next(self.counter), deck_name, None])
+        self.head_decks.add(deck_name)
+
+    def load_deck(self, deck_name, closing):
+        """ open a deck, waiting for it to be written if it was just closed """
+
+        if closing is not None:
+            closing.join()
+
+        # cached stats keep summarizing the deck cheap once it is done
+        return self.catalog.attach_stats(open_deck(deck_name, use_server=True))
+
+    def load_ahead(self):
+        """ start loading the next deck of the merge if it isn't open """
+
+        if self.heads and self.heads[0][3] is None:
+            deck_name = self.heads[0][2]
+            if deck_name not in self.loading:
+                self.loading[deck_name] = self.loader.submit(
+                    self.load_deck, deck_name, self.closing.pop(deck_name, None))
+
+    def open_deck(self, deck_name):
+        """ open a deck of the session, usually already loaded by load_ahead """
+
+        loading = self.loading.pop(deck_name, None)
+        if loading is not None:
+            deck = loading.result()
+        else:
+            deck = self.load_deck(deck_name, self.closing.pop(deck_name, None))
+
+        if self.background_writes:
+            deck.enable_background_writes()
+
+        self.decks[deck_name] = deck
+        self.outstanding[deck_name] = 0
+        self.summaries.pop(deck_name, None)
+        return deck
+
+    def pull(self, deck_name):
+        """ take a deck's earliest due card into the merge, returns False if it has none """
+
+        if deck_name not in self.decks:
+            self.open_deck(deck_name)
+
+        card = self.decks[deck_name].get_earliest_flashcard()
+        if card is None:
+            return False
+
+        self.card_decks[card] = deck_name
+        self.outstanding[deck_name] += 1
+
+        due_time = card.get_due_time() or datetime.min
+        heapq.heappush(self.heads, [due_time, next(self.counter), deck_name, card])
+        self.head_decks.add(deck_name)
+        return True
+
+    def add_to_window(self, card):
+        """ insert a card at a random position of the window """
+
+        self.window.append(card)
+        i = random.randrange(len(self.window))
+        self.window[i], self.window[-1] = self.window[-1], self.window[i]
+
+    def fill_window(self):
+        """ move the earliest due cards of all decks into the window """
+
+        waiting = []
+        while len(self.window) < self.window_size and self.heads:
+            head = heapq.heappop(self.heads)
+            due_time, _, deck_name, card = head
+
+            # a closed deck has come up, its own first card takes its place
+            # once an open deck makes room, unless no open deck has cards left
+            if card is None:
+                if not self.make_room(due_time) and (self.window or any(h[3] is not None for h in self.heads)):
+                    waiting.append(head)
+                    continue
+
+                self.head_decks.discard(deck_name)
+                if not self.pull(deck_name):
+                    self.retire_deck(deck_name)
+                continue
+
+            self.head_decks.discard(deck_name)
+            self.add_to_window(card)
+            self.pull(deck_name)
+
+        for head in waiting:
+            heapq.heappush(self.heads, head)
+
+        self.release_decks()
+        self.load_ahead()
+
+    def get_idle_heads(self):
+        """ return the merge entries of open decks whose only card out is that entry's """
+
+        idle = [head for head in self.heads
+                if head[3] is not None and self.outstanding[head[2]] == 1]
+
+        # the decks needed last first
+        idle.sort(reverse=True)
+        return idle
+
+    def release_deck(self, head):
+        """ close an idle deck, which keeps its place in the merge without its card """
+
+        due_time, _, deck_name, card = head
+        self.decks[deck_name].put_back_flashcard(card)
+        del self.card_decks[card]
+
+        head[3] = None
+        self.summaries[deck_name] = self.retire_deck(deck_name)
+
+    def make_room(self, due_time):
+        """
+        Returns True if a deck whose cards are due from due_time on can be
+        opened, closing an idle deck that is needed later if there is one.
+        """
+
+        if len(self.decks) < self.max_open_decks:
+            return True
+
+        # decks due at the same time would otherwise keep closing each other
+        idle = self.get_idle_heads()
+        if not idle or idle[0][0] <= due_time:
+            return False
+
+        self.release_deck(idle[0])
+        return True
+
+    def release_decks(self):
+        """ close idle decks while more than max_open_decks are open """
+
+        excess = len(self.decks) - self.max_open_decks
+        if excess > 0:
+            for head in self.get_idle_heads()[:excess]:
+                self.release_deck(head)
+
+    def retire_deck(self, deck_name):
+        """ close a deck in the background, returns its summary """
+
+        deck = self.decks.pop(deck_name)
+        del self.outstanding[deck_name]
+        summary = summarize_deck(deck)
+
+        thread = threading.Thread(target=self.close_deck, args=(deck_name, deck, summary))
+        thread.start()
+        self.closing[deck_name] = thread
+        return summary
+
+    def close_deck(self, deck_name, deck, summary):
+        """ write out a deck and cache its summary """
+
+        deck.close()
+        self.catalog.store(deck_name, summary)
+        self.closed_decks.append(deck_name)
+
+    def get_deck_name(self):
+        return SESSION_NAME
+
+    def get_total_number_of_cards(self):
+        """ return the number of cards in all decks of the session """
+        return self.card_total
+
+    def get_number_pending(self):
+        """ return number of cards left to review in the session """
+
+        # cards taken into the merge are no longer pending in their decks
+        pending = len(self.window) + sum(1 for head in self.heads if head[3] is not None)
+        pending += sum(summary['pending'] for summary in self.summaries.values())
+        return pending + sum(deck.get_number_pending() for deck in self.decks.values())
+
+    def enable_background_writes(self):
+        """ hand journal appends and deck writes of every deck to background threads """
+
+        self.background_writes = True
+        for deck in self.decks.values():
+            deck.enable_background_writes()
+
+    def get_next_flashcard(self):
+        """ return the next card to review, from any deck """
+
+        self.fill_window()
+
+        if not self.window:
+            return None
+
+        return self.window.pop()
+
+    def put_back_flashcard(self, card):
+        """ return a card handed out by get_next_flashcard but not answered """
+
+        if card in self.card_decks and card not in self.window:
+            self.add_to_window(card)
+
+    def log_answer(self, card, answer):
+        """ log an answer with the deck the card came from """
+
+        deck_name = self.card_decks.pop(card, None)
+        if deck_name is None:
+            return
+
+        self.decks[deck_name].log_answer(card, answer)
+        self.outstanding[deck_name] -= 1
+
+        # a wrong answer makes the card pending in its deck again
+        if deck_name not in self.head_decks and not self.pull(deck_name):
+            if self.outstanding[deck_name] == 0:
+                self.retire_deck(deck_name)
+
+    def close(self):
+        """ return unanswered cards to their decks and write every deck, returns their names """
+
+        for card, deck_name in self.card_decks.items():
+            self.decks[deck_name].put_back_flashcard(card)
+
+        self.card_decks = {}
+        self.heads = []
+        self.head_decks = set()
+        self.window = []
+        self.summaries = {}
+
+        for deck_name in list(self.decks):
+            self.retire_deck(deck_name)
+
+        # decks loaded ahead but never reached are left as they were
+        for loading in self.loading.values():
+            loading.result().close()
+        self.loading = {}
+        self.loader.shutdown()
+
+        for thread in self.closing.values():
+            thread.join()
+
+        # decks closed and reopened during the session are listed once
+        return list(dict.fromkeys(self.closed_decks))
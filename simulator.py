@@ -0,0 +1,249 @@
+import csv
+import time
+import argparse
+from datetime import datetime
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from schedulers import SCHEDULERS, FSRSScheduler, FSRS_DEFAULT_WEIGHTS, get_scheduler, fsrs_recall
+from columnar import MICROSECONDS_PER_DAY, to_epoch
+
+DEFAULT_DAYS = 3 * 365
+DEFAULT_CARDS = 10000
+DEFAULT_NEW_CARDS_PER_DAY = 20
+
+# chance of getting a card right the first time it is shown
+FIRST_RECALL = 0.7
+
+# days per row of the comparison table
+REPORT_PERIOD = 30
+
+# reviews needed before a deck's history is used to fit the recall model
+MIN_FIT_REVIEWS = 1000
+
+class Simulation:
+    """
+    Simulation Class
+        Simulated reviews of a deck under one scheduler, one day at a
+        time and every card due that day at once. Whether a card is
+        recalled is drawn from a recall model, the FSRS memory model with
+        its own weights, which stands for the learner and is updated by
+        every answer whatever the scheduler. Cards start out new and are
+        introduced a number per day, or from a deck's recorded reviews.
+    """
+
+    def __init__(self, scheduler, number_of_cards, recall_weights=None, first_recall=FIRST_RECALL, seed=0):
+        if np is None:
+            raise ImportError("the simulator requires numpy (pip install numpy)")
+
+        self.scheduler = scheduler
+        self.states = scheduler.new_states(number_of_cards)
+
+        self.memory = FSRSScheduler({'weights': recall_weights or FSRS_DEFAULT_WEIGHTS})
+        self.memory_states = self.memory.new_states(number_of_cards)
+
+        self.number_of_cards = number_of_cards
+        self.first_recall = first_recall
+        self.rng = np.random.default_rng(seed)
+
+        # days since the start of the simulation, cards not introduced yet are never due
+        self.last_review = np.zeros(number_of_cards)
+        self.due = np.full(number_of_cards, np.inf)
+
+        # cards before this one have been introduced
+        self.introduced = 0
+
+    def answer(self, index, answers, elapsed_days):
+        """ record answers with the scheduler and the recall model, returns the intervals """
+
+        self.memory.review_batch(self.memory_states, index, answers, elapsed_days)
+        return self.scheduler.review_batch(self.states, index, answers, elapsed_days)
+
+    def replay(self, sequences, start_time):
+        """
+        Replay recorded reviews, an optimizer.ReviewSequences, so the
+        simulation starts at start_time from where those cards are.
+        """
+
+        n = min(len(sequences.starts), self.number_of_cards)
+        index = np.arange(n)
+
+        intervals = self.answer(index, sequences.first_answers[:n], np.zeros(n))
+        for elapsed, answers, _, _ in sequences.steps:
+            active = min(len(answers), n)
+            intervals[:active] = self.answer(index[:active], answers[:active], elapsed[:active])
+
+        self.last_review[:n] = (sequences.last_times[:n] - to_epoch(start_time)) / MICROSECONDS_PER_DAY
+        self.due[:n] = self.last_review[:n] + np.maximum(intervals, 1)
+        self.introduced = n
+
+    def run(self, days, new_cards_per_day=DEFAULT_NEW_CARDS_PER_DAY, max_reviews_per_day=None):
+        """
+        Simulate a number of days. Returns a dict of arrays with, for each
+        day, the reviews of cards already introduced, the new cards, the
+        reviews answered right and the expected number of cards the learner
+        would recall at the end of the day.
+        """
+
+        results = {
+            'reviews': np.zeros(days, dtype=np.int64),
+            'new': np.zeros(days, dtype=np.int64),
+            'right': np.zeros(days, dtype=np.int64),
+            'memorized': np.zeros(days),
+        }
+
+        for day in range(days):
+            due = np.flatnonzero(self.due < day + 1)
+
+            # over the limit, the cards due the longest are reviewed first
+            if max_reviews_per_day is not None and len(due) > max_reviews_per_day:
+                due = due[np.argsort(self.due[due], kind="stable")[:max_reviews_per_day]]
+
+            elapsed = day - self.last_review[due]
+            answers = self.rng.random(len(due)) < fsrs_recall(self.memory_states['stability'][due], elapsed)
+            self.schedule(due, answers, elapsed, day)
+
+            new = np.arange(self.introduced, min(self.introduced + new_cards_per_day, self.number_of_cards))
+            self.schedule(new, self.rng.random(len(new)) < self.first_recall, np.zeros(len(new)), day)
+            self.introduced += len(new)
+
+            results['reviews'][day] = len(due)
+            results['new'][day] = len(new)
+            results['right'][day] = np.count_nonzero(answers)
+
+            learned = slice(0, self.introduced)
+            results['memorized'][day] = fsrs_recall(
+                self.memory_states['stability'][learned], day + 1 - self.last_review[learned]).sum()
+
+        return results
+
+    def schedule(self, index, answers, elapsed_days, day):
+        """ answer cards on a day and set when they are next due """
+
+        intervals = self.answer(index, answers, elapsed_days)
+
+        # a card due again the same day is seen the next day, reviews are
+        # simulated a day at a time
+        self.last_review[index] = day
+        self.due[index] = day + np.maximum(intervals, 1)
+
+def simulate(srs_method, srs_params=None, days=DEFAULT_DAYS, number_of_cards=DEFAULT_CARDS,
+             new_cards_per_day=DEFAULT_NEW_CARDS_PER_DAY, max_reviews_per_day=None,
+             recall_weights=None, history=None, seed=0):
+    """
+    Simulate reviewing a deck with an srs method for a number of days,
+    starting from a review history of (card, review time, answer) if
+    given. Returns the daily results of Simulation.run.
+    """
+
+    simulation = Simulation(get_scheduler(srs_method, srs_params), number_of_cards, recall_weights, seed=seed)
+
+    if history:
+        from optimizer import ReviewSequences
+        simulation.replay(ReviewSequences(history), datetime.now())
+
+    return simulation.run(days, new_cards_per_day, max_reviews_per_day)
+
+def summarize(results, first_day=0, last_day=None):
+    """ return reviews per day, retention and cards memorized at the end, over a range of days """
+
+    days = slice(first_day, last_day)
+    reviews = results['reviews'][days].sum()
+
+    return {
+        'reviews_per_day': (reviews + results['new'][days].sum()) / len(results['reviews'][days]),
+        'retention': results['right'][days].sum() / reviews if reviews else None,
+        'memorized': results['memorized'][days][-1],
+    }
+
+def print_comparison(results_by_method, period=REPORT_PERIOD):
+    """ print the workload, retention and cards memorized of each method, side by side """
+
+    methods = list(results_by_method)
+    days = len(next(iter(results_by_method.values()))['reviews'])
+
+    print("{:>9}".format("days") + "".join("  {:>30}".format(method) for method in methods))
+    print("{:>9}".format("") + "  {:>8} {:>9} {:>11}".format("reviews", "retained", "memorized") * len(methods))
+
+    rows = [(first_day, min(first_day + period, days)) for first_day in range(0, days, period)]
+    if len(rows) > 1:
+        rows.append((0, days))
+
+    for first_day, last_day in rows:
+        label = "{}-{}".format(first_day + 1, last_day) if (first_day, last_day) != (0, days) else "all"
+        line = "{:>9}".format(label)
+        for method in methods:
+            summary = summarize(results_by_method[method], first_day, last_day)
+            retention = "{:.1%}".format(summary['retention']) if summary['retention'] is not None else "-"
+            line += "  {:>8.1f} {:>9} {:>11.0f}".format(summary['reviews_per_day'], retention, summary['memorized'])
+        print(line)
+
+def write_csv(file_name, results_by_method):
+    """ write the daily results of every method to a CSV file """
+
+    columns = ['reviews', 'new', 'right', 'memorized']
+    days = len(next(iter(results_by_method.values()))['reviews'])
+
+    with open(file_name, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["day"] + [method + " " + column for method in results_by_method for column in columns])
+        for day in range(days):
+            writer.writerow([day + 1] + [round(results[column][day].item(), 2)
+                                         for results in results_by_method.values() for column in columns])
+
+def main():
+    """ compare srs methods on a synthetic deck, or on a deck and its review history """
+
+    parser = argparse.ArgumentParser(description="Compare spaced repetition methods on simulated reviews.")
+    parser.add_argument("deck_name", nargs="?", help="start from this deck's cards and recorded reviews")
+    parser.add_argument("--methods", nargs="+", default=list(SCHEDULERS), choices=list(SCHEDULERS))
+    parser.add_argument("--days", type=int, default=DEFAULT_DAYS)
+    parser.add_argument("--cards", type=int, default=DEFAULT_CARDS, help="cards of a synthetic deck")
+    parser.add_argument("--new-per-day", type=int, default=DEFAULT_NEW_CARDS_PER_DAY)
+    parser.add_argument("--max-reviews", type=int, help="reviews per day at most, beyond new cards")
+    parser.add_argument("--csv", help="also write the daily results to this file")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    history = None
+    recall_weights = None
+    srs_params = {}
+    number_of_cards = args.cards
+
+    if args.deck_name:
+        from deck import open_deck
+        from optimizer import fit_fsrs
+
+        # the deck is only read, never closed, so nothing is written to it
+        deck = open_deck(args.deck_name)
+        history = deck.get_review_history()
+        number_of_cards = max(deck.get_total_number_of_cards(), len({card for card, _, _ in history}))
+        srs_params[deck.srs_method] = deck.deck.get("srs_params")
+
+        # the learner is modelled on the deck's own answers, if there are enough of them
+        if len(history) >= MIN_FIT_REVIEWS:
+            recall_weights, _, _ = fit_fsrs(history)
+            print("recall model fitted to {} reviews".format(len(history)))
+        else:
+            print("{} reviews recorded, using the default recall model".format(len(history)))
+
+    results_by_method = {}
+    for method in args.methods:
+        start = time.perf_counter()
+        results_by_method[method] = simulate(
+            method, srs_params.get(method), args.days, number_of_cards, args.new_per_day,
+            args.max_reviews, recall_weights, history, args.seed)
+        print("{}: {} cards over {} days simulated in {:.2f}s".format(
+            method, number_of_cards, args.days, time.perf_counter() - start))
+
+    print()
+    print_comparison(results_by_method)
+
+    if args.csv:
+        write_csv(args.csv, results_by_method)
+
+if __name__ == "__main__":
+    main()
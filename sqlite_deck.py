@@ -0,0 +1,671 @@
+import os
+import sys
+import json
+import random
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+from deck import (
+    DECK_DIRECTORY,
+    SCHEMA_VERSION,
+    TIME_FORMAT,
+    Flashcard,
+    FlashcardDeck,
+    assign_card_ids,
+    check_sort_column,
+    parse_review_time,
+    get_scheduler,
+)
+from duplicates import KEEP, check_policy, merge_text
+from stats import DeckStats, day_of
+from instrumentation import timed
+
+# fields stored in their own columns, anything else goes in "extra"
+CARD_FIELDS = ("front", "back", "notes", "last_review", "mem_level")
+
+# a due card is drawn by random id when at least one id in this many is
+# due, trying this many ids before walking the due_time index instead
+DRAW_RATIO = 4
+MAX_DRAWS = 32
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS deck_info (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS flashcards (
+    id          INTEGER PRIMARY KEY,
+    front       TEXT,
+    back        TEXT,
+    notes       TEXT,
+    last_review TEXT,
+    mem_level   INTEGER NOT NULL,
+    due_time    TEXT NOT NULL,
+    extra       TEXT
+);
+CREATE INDEX IF NOT EXISTS flashcards_due_time ON flashcards (due_time);
+CREATE INDEX IF NOT EXISTS flashcards_mem_level ON flashcards (mem_level);
+CREATE TABLE IF NOT EXISTS reviews (
+    id          INTEGER PRIMARY KEY,
+    card_id     INTEGER NOT NULL REFERENCES flashcards (id),
+    reviewed_at TEXT NOT NULL,
+    answer      INTEGER NOT NULL,
+    mem_level   INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reviews_card_id ON reviews (card_id);
+"""
+
+def connect(sqlite_file_name):
+    """ open a deck database, creating the schema if needed """
+
+    # each thread of a deck uses its own connection, but the thread closing
+    # the deck closes all of them
+    conn = sqlite3.connect(sqlite_file_name, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+
+    # sqlite's own lower() and LIKE only know the case of ASCII letters
+    conn.create_function("casefold", 1, lambda text: text.casefold() if text else "", deterministic=True)
+    conn.executescript(SCHEMA)
+    return conn
+
+def format_time(t):
+    """ format a datetime so that stored times sort chronologically """
+    return t.strftime(TIME_FORMAT)
+
+def compute_due_time(scheduler, last_review, mem_level, srs_data=None):
+    """ return the sortable due time of a card as a string """
+
+    last_review_time = parse_review_time(last_review)
+    interval = scheduler.get_interval(mem_level, srs_data)
+    return format_time(last_review_time + timedelta(days=interval))
+
+class SQLiteFlashcardDeck(FlashcardDeck):
+    """
+    SQLiteFlashcardDeck Class
+        A deck stored in a SQLite database instead of a JSON file.
+        Cards are only read from disk when they are shown, and the
+        pending count and next card come from indexed queries. Each
+        thread using the deck, such as the GUI thread and the browser
+        and loader workers, has a connection of its own.
+    """
+
+    @timed("deck.load")
+    def __init__(self, deck_name, directory=DECK_DIRECTORY):
+        self.deck_name = deck_name
+        self.deck_file_name = directory + self.deck_name + ".sqlite"
+
+        # a connection must not run statements for two threads at once
+        self.local = threading.local()
+        self.connections = []
+        self.connections_lock = threading.Lock()
+
+        rows = self.conn.execute("SELECT key, value FROM deck_info")
+        self.deck = {key: json.loads(value) for key, value in rows}
+
+        # get srs_method and load scheduler
+        self.load_srs_method()
+
+        self.total = self.conn.execute("SELECT COUNT(*) FROM flashcards").fetchone()[0]
+
+        # cards handed out but not answered yet, mapped to their row id
+        self.in_flight = {}
+
+        # row ids answered wrong this session, shown again before they are due
+        self.retry_ids = []
+
+        # fronts of the cards for duplicate checks, built when first needed
+        self.duplicate_index = None
+
+        # forecast and retention counts, built when first needed
+        self.stats = None
+
+    @property
+    def conn(self):
+        """ the calling thread's connection to the database """
+
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = connect(self.deck_file_name)
+            self.local.conn = conn
+            with self.connections_lock:
+                self.connections.append(conn)
+
+        return conn
+
+    def get_total_number_of_cards(self):
+        """ return total number of cards in deck """
+        return self.total
+
+    def iter_flashcards(self):
+        """ yield (card id, flashcard) for every card of the deck, reading them as it goes """
+
+        rows = self.conn.execute(
+            "SELECT id, front, back, notes, last_review, mem_level, extra FROM flashcards ORDER BY id"
+        )
+        for row in rows:
+            card = dict(zip(CARD_FIELDS, row[1:]), id=row[0])
+            if row[-1]:
+                card.update(json.loads(row[-1]))
+            yield row[0], Flashcard(card)
+
+    def iter_fronts(self):
+        """ yield (card id, front) for every card of the deck """
+        yield from self.conn.execute("SELECT id, front FROM flashcards ORDER BY id")
+
+    def get_flashcard(self, card_id):
+        """ return the card with the given id """
+        return self.load_card(card_id)
+
+    def get_flashcards(self, card_ids):
+        """ return the cards with the given ids, in the same order, reading them in one query """
+
+        card_ids = list(card_ids)
+        rows = self.conn.execute(
+            "SELECT id, front, back, notes, last_review, mem_level, extra, due_time FROM flashcards"
+            " WHERE id IN ({})".format(",".join("?" * len(card_ids))),
+            card_ids,
+        )
+
+        cards = {}
+        for row in rows:
+            card = dict(zip(CARD_FIELDS, row[1:6]), id=row[0])
+            if row[6]:
+                card.update(json.loads(row[6]))
+            cards[row[0]] = Flashcard(card)
+            cards[row[0]].set_due_time(parse_review_time(row[7]))
+
+        # a missing card raises KeyError, as with the other decks
+        return [cards[card_id] for card_id in card_ids]
+
+    @timed("deck.find_cards")
+    def find_cards(self, text="", mem_level=None, sort_by="due_time", descending=False):
+        """ return the ids of the matching cards, see FlashcardDeck.find_cards """
+
+        check_sort_column(sort_by)
+        conditions = []
+        args = []
+
+        if mem_level is not None:
+            conditions.append("mem_level = ?")
+            args.append(mem_level)
+
+        if text:
+            conditions.append("(" + " OR ".join(
+                "instr(casefold({}), ?)".format(column) for column in ("front", "back", "notes")) + ")")
+            args += [text.casefold()] * 3
+
+        query = "SELECT id FROM flashcards"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+
+        # text columns are sorted ignoring case, like the other decks
+        order = sort_by + " COLLATE NOCASE" if sort_by in ("front", "back") else sort_by
+        query += " ORDER BY {0} {1}, id {1}".format(order, "DESC" if descending else "ASC")
+
+        return [row[0] for row in self.conn.execute(query, args)]
+
+    @timed("deck.build_stats")
+    def build_stats(self):
+        """ count the deck's cards by due day and memory level, and its answers by day """
+
+        # times are stored as text, so their first 10 characters are the day
+        due_per_day = self.conn.execute(
+            "SELECT substr(due_time, 1, 10), COUNT(*) FROM flashcards GROUP BY 1")
+        mem_levels = self.conn.execute(
+            "SELECT mem_level, COUNT(*) FROM flashcards GROUP BY 1")
+        reviews_per_day = self.conn.execute(
+            "SELECT substr(reviewed_at, 1, 10), COUNT(*), SUM(answer) FROM reviews GROUP BY 1")
+
+        return DeckStats(
+            {day_of(day): n for day, n in due_per_day},
+            dict(mem_levels.fetchall()),
+            {day_of(day): [n, right] for day, n, right in reviews_per_day},
+        )
+
+    def excluded_ids(self):
+        """ row ids the due-time queries should skip """
+        return list(self.in_flight.values()) + self.retry_ids
+
+    def count_due(self):
+        """ return the number of due cards that are not retried or in flight """
+
+        excluded = self.excluded_ids()
+        placeholders = ",".join("?" * len(excluded))
+        query = ("SELECT COUNT(*) FROM flashcards WHERE due_time <= ?"
+                 " AND id NOT IN (" + placeholders + ")")
+
+        now = format_time(datetime.now())
+        return self.conn.execute(query, [now] + excluded).fetchone()[0]
+
+    @timed("deck.get_number_pending")
+    def get_number_pending(self):
+        """ return number of cards pending for review """
+        return self.count_due() + len(self.retry_ids)
+
+    def get_next_due_time(self):
+        """ return the time the next scheduled card becomes due, if any """
+
+        now = format_time(datetime.now())
+        row = self.conn.execute(
+            "SELECT MIN(due_time) FROM flashcards WHERE due_time > ?", (now,)
+        ).fetchone()
+
+        if row[0] is None:
+            return None
+
+        return datetime.strptime(row[0], TIME_FORMAT)
+
+    @timed("deck.get_next_flashcard")
+    def get_next_flashcard(self):
+        """ return a random pending flashcard """
+
+        number_due = self.count_due()
+        number_pending = number_due + len(self.retry_ids)
+        if not number_pending:
+            return None
+
+        # pick uniformly between retried cards and due cards
+        i = random.randrange(number_pending)
+        if i < len(self.retry_ids):
+            row_id = self.retry_ids.pop(i)
+        else:
+            row_id = self.pick_due_id(number_due)
+
+        card = self.load_card(row_id)
+        self.in_flight[card] = row_id
+        return card
+
+    def pick_due_id(self, number_due):
+        """ return the row id of a due card, chosen uniformly like FlashcardDeck does """
+
+        excluded = self.excluded_ids()
+        now = format_time(datetime.now())
+
+        # when many cards are due, drawing ids until one is due costs a few
+        # lookups by primary key, and any due card is as likely as another
+        low, high = self.conn.execute(
+            "SELECT (SELECT MIN(id) FROM flashcards), (SELECT MAX(id) FROM flashcards)"
+        ).fetchone()
+        if number_due * DRAW_RATIO >= high - low + 1:
+            excluded_ids = set(excluded)
+            for _ in range(MAX_DRAWS):
+                row_id = random.randint(low, high)
+                row = self.conn.execute("SELECT due_time FROM flashcards WHERE id = ?", (row_id,)).fetchone()
+                if row is not None and row[0] <= now and row_id not in excluded_ids:
+                    return row_id
+
+        # otherwise the due cards are few, and a random offset into them
+        # walks no more of the due_time index than counting them did
+        placeholders = ",".join("?" * len(excluded))
+        query = ("SELECT id FROM flashcards WHERE due_time <= ?"
+                 " AND id NOT IN (" + placeholders + ")"
+                 " ORDER BY due_time LIMIT 1 OFFSET ?")
+        offset = random.randrange(number_due)
+        return self.conn.execute(query, [now] + excluded + [offset]).fetchone()[0]
+
+    def load_card(self, row_id):
+        """ build a Flashcard object from a row of the database """
+
+        row = self.conn.execute(
+            "SELECT front, back, notes, last_review, mem_level, extra, due_time FROM flashcards WHERE id = ?",
+            (row_id,),
+        ).fetchone()
+        if row is None:
+            raise KeyError(row_id)
+
+        # the scheduler's per-card state is kept in "extra"
+        card = dict(zip(CARD_FIELDS, row), id=row_id)
+        if row[-2]:
+            card.update(json.loads(row[-2]))
+
+        flashcard = Flashcard(card)
+        flashcard.set_due_time(parse_review_time(row[-1]))
+        return flashcard
+
+    def get_earliest_flashcard(self):
+        """ like get_next_flashcard, but hand out the card that has been due the longest """
+
+        excluded = self.excluded_ids()
+        placeholders = ",".join("?" * len(excluded))
+        query = ("SELECT id FROM flashcards WHERE due_time <= ?"
+                 " AND id NOT IN (" + placeholders + ")"
+                 " ORDER BY due_time LIMIT 1")
+
+        now = format_time(datetime.now())
+        row = self.conn.execute(query, [now] + excluded).fetchone()
+
+        # cards answered wrong this session come after the due ones
+        if row is not None:
+            row_id = row[0]
+        elif self.retry_ids:
+            row_id = self.retry_ids.pop(0)
+        else:
+            return None
+
+        card = self.load_card(row_id)
+        self.in_flight[card] = row_id
+        return card
+
+    @timed("deck.add_flashcard")
+    def add_flashcard(self, front, back, notes, on_duplicate=KEEP):
+        """ add flashcard to deck, returns the new card's id, see FlashcardDeck.add_flashcard """
+
+        merged_id = self.check_duplicate(front, back, notes, on_duplicate)
+        if merged_id is not None:
+            return merged_id
+
+        last_review = format_time(datetime.now())
+        due_time = compute_due_time(self.scheduler, last_review, 0)
+
+        card_id = self.get_next_card_id()
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO flashcards (id, front, back, notes, last_review, mem_level, due_time)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (card_id, front, back, notes, last_review, 0, due_time),
+            )
+
+        self.total += 1
+        if self.duplicate_index is not None:
+            self.duplicate_index.add(card_id, front)
+        if self.stats is not None:
+            self.stats.add_card(due_time, 0)
+
+        return card_id
+
+    def add_flashcards(self, card_dicts, on_duplicate=KEEP, journal=False):
+        """
+        Add a batch of flashcard dicts in a single transaction, see
+        FlashcardDeck.add_flashcards. The transaction already makes them
+        durable, so there is no journal to write them to.
+        """
+
+        check_policy(on_duplicate)
+        if on_duplicate != KEEP:
+            card_dicts = self.filter_duplicates(card_dicts, on_duplicate)
+
+        rows = []
+        for card_id, card in enumerate(card_dicts, self.get_next_card_id()):
+            last_review = card['last_review']
+            if type(last_review) != str:
+                last_review = format_time(last_review)
+
+            srs_data = card.get('srs_data')
+            due_time = compute_due_time(self.scheduler, last_review, card['mem_level'], srs_data)
+            extra = json.dumps({'srs_data': srs_data}) if srs_data is not None else None
+            rows.append((card_id, card['front'], card['back'], card['notes'], last_review, card['mem_level'],
+                         due_time, extra))
+
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO flashcards (id, front, back, notes, last_review, mem_level, due_time, extra)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+        if self.duplicate_index is not None:
+            for row in rows:
+                self.duplicate_index.add(row[0], row[1])
+        if self.stats is not None:
+            for row in rows:
+                self.stats.add_card(row[6], row[5])
+
+        self.total += len(rows)
+        return len(rows)
+
+    def get_next_card_id(self):
+        """ return the id for a new card, ids of deleted cards are never reused """
+
+        # sqlite itself would reuse the id of the last card once it is deleted
+        last_id = self.conn.execute("SELECT MAX(id) FROM flashcards").fetchone()[0]
+        return max(last_id + 1 if last_id is not None else 0, self.deck.get("next_card_id", 0))
+
+    def merge_flashcard(self, card_id, back, notes):
+        """ add the back and notes of a duplicate card to an existing card, raises KeyError if there is none """
+
+        row = self.conn.execute(
+            "SELECT back, notes FROM flashcards WHERE id = ?", (card_id,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(card_id)
+
+        old_back, old_notes = row
+
+        with self.conn:
+            self.conn.execute(
+                "UPDATE flashcards SET back = ?, notes = ? WHERE id = ?",
+                (merge_text(old_back, back), merge_text(old_notes, notes), card_id),
+            )
+
+    def edit_flashcard(self, card_id, front, back, notes):
+        """ replace the front, back and notes of a card, raises KeyError if there is none """
+
+        row = self.conn.execute("SELECT front FROM flashcards WHERE id = ?", (card_id,)).fetchone()
+        if row is None:
+            raise KeyError(card_id)
+
+        if self.duplicate_index is not None and front != row[0]:
+            self.duplicate_index.remove(card_id, row[0])
+            self.duplicate_index.add(card_id, front)
+
+        with self.conn:
+            self.conn.execute(
+                "UPDATE flashcards SET front = ?, back = ?, notes = ? WHERE id = ?",
+                (front, back, notes, card_id),
+            )
+
+    def delete_flashcard(self, card_id):
+        """ remove a card from the deck, raises KeyError if there is none """
+
+        row = self.conn.execute(
+            "SELECT front, mem_level, due_time FROM flashcards WHERE id = ?", (card_id,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(card_id)
+
+        # its reviews are kept, they still count for fitting the scheduler
+        self.deck["next_card_id"] = self.get_next_card_id()
+        with self.conn:
+            self.conn.execute("DELETE FROM flashcards WHERE id = ?", (card_id,))
+            self.conn.execute(
+                "INSERT OR REPLACE INTO deck_info (key, value) VALUES (?, ?)",
+                ("next_card_id", json.dumps(self.deck["next_card_id"])),
+            )
+
+        self.total -= 1
+        if card_id in self.retry_ids:
+            self.retry_ids.remove(card_id)
+        for card, row_id in list(self.in_flight.items()):
+            if row_id == card_id:
+                del self.in_flight[card]
+
+        if self.duplicate_index is not None:
+            self.duplicate_index.remove(card_id, row[0])
+        if self.stats is not None:
+            self.stats.remove_card(row[2], row[1])
+
+    def put_back_flashcard(self, card):
+        """ return a card handed out by get_next_flashcard but not answered """
+
+        row_id = self.in_flight.pop(card, None)
+        if row_id is None:
+            return
+
+        # a retried card isn't due yet and has to go back in the retry list
+        due_time = format_time(self.get_due_time(card))
+        if due_time > format_time(datetime.now()):
+            self.retry_ids.append(row_id)
+
+    @timed("deck.log_answer")
+    def log_answer(self, curr_card, answer):
+        """ update flashcard with time last reviewed and new mem level """
+
+        row_id = self.in_flight.pop(curr_card, None)
+        if row_id is None:
+            return
+
+        # the scheduler decides the next due time once, here
+        now = datetime.now()
+        elapsed_days = (now - curr_card.get_last_review()) / timedelta(days=1)
+        mem_level, srs_data, interval = self.scheduler.review(
+            curr_card.get_mem_level(), curr_card.get_srs_data(), answer, elapsed_days)
+
+        if self.stats is not None:
+            self.stats.reschedule_card(
+                self.get_due_time(curr_card), curr_card.get_mem_level(),
+                now + timedelta(days=interval), mem_level, now, answer)
+
+        curr_card.set_last_review(now)
+        curr_card.set_mem_level(mem_level)
+        curr_card.set_srs_data(srs_data)
+        curr_card.set_due_time(now + timedelta(days=interval))
+
+        last_review = format_time(now)
+        due_time = format_time(curr_card.get_due_time())
+
+        with self.conn:
+            self.conn.execute(
+                "UPDATE flashcards SET last_review = ?, mem_level = ?, due_time = ? WHERE id = ?",
+                (last_review, mem_level, due_time, row_id),
+            )
+            if srs_data is not None:
+                self.conn.execute(
+                    "UPDATE flashcards SET extra = json_set(COALESCE(extra, '{}'), '$.srs_data', json(?))"
+                    " WHERE id = ?",
+                    (json.dumps(srs_data), row_id),
+                )
+            self.conn.execute(
+                "INSERT INTO reviews (card_id, reviewed_at, answer, mem_level) VALUES (?, ?, ?, ?)",
+                (row_id, last_review, int(answer), mem_level),
+            )
+
+        # the row already holds the rescheduled due_time, so a card answered
+        # wrong is only asked again this session, from its id kept in memory
+        if not answer:
+            self.retry_ids.append(row_id)
+
+    def get_review_history(self):
+        """ return (card, review time, answer) for every recorded review, oldest first """
+
+        rows = self.conn.execute("SELECT card_id, reviewed_at, answer FROM reviews ORDER BY id")
+        return [(card_id, reviewed_at, bool(answer)) for card_id, reviewed_at, answer in rows]
+
+    def set_srs_params(self, srs_params):
+        """ replace the parameters of the deck's scheduler, e.g. fitted FSRS weights """
+
+        self.deck["srs_params"] = srs_params
+        self.load_srs_method()
+
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO deck_info (key, value) VALUES (?, ?)",
+                ("srs_params", json.dumps(srs_params)),
+            )
+
+    def enable_background_writes(self):
+        """ each change is a small transaction, there is nothing to offload """
+
+    def save_deck(self):
+        """ every change is committed as it is made """
+        self.conn.commit()
+
+    def close(self):
+        """ close the connections of every thread to the database """
+
+        with self.connections_lock:
+            for conn in self.connections:
+                conn.close()
+            self.connections = []
+
+def json_to_sqlite(json_file_name, sqlite_file_name):
+    """ convert a JSON deck file to a SQLite deck """
+
+    with open(json_file_name, "r", encoding="utf-8") as f:
+        deck = json.load(f)
+
+    scheduler = get_scheduler(deck.get("srs_method"), deck.get("srs_params"))
+
+    # cards keep their ids, and cards without one are numbered like FlashcardDeck does
+    deck["next_card_id"] = assign_card_ids(deck["flashcards"], deck.get("next_card_id", 0))
+
+    def rows():
+        for card in deck.get("flashcards"):
+            extra = {k: v for k, v in card.items() if k not in CARD_FIELDS and k != "id"}
+            due_time = compute_due_time(scheduler, card["last_review"], card["mem_level"], card.get("srs_data"))
+            yield (
+                card["id"],
+                card.get("front"),
+                card.get("back"),
+                card.get("notes"),
+                card.get("last_review"),
+                card["mem_level"],
+                due_time,
+                json.dumps(extra, ensure_ascii=False) if extra else None,
+            )
+
+    conn = connect(sqlite_file_name)
+    with conn:
+        conn.executemany(
+            "INSERT INTO deck_info (key, value) VALUES (?, ?)",
+            [(k, json.dumps(v, ensure_ascii=False)) for k, v in deck.items() if k != "flashcards"],
+        )
+        conn.executemany(
+            "INSERT INTO flashcards (id, front, back, notes, last_review, mem_level, due_time, extra)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            rows(),
+        )
+    conn.close()
+
+def sqlite_to_json(sqlite_file_name, json_file_name):
+    """ convert a SQLite deck to a JSON deck file """
+
+    conn = connect(sqlite_file_name)
+
+    deck = {key: json.loads(value) for key, value in conn.execute("SELECT key, value FROM deck_info")}
+    deck["flashcards"] = []
+
+    rows = conn.execute(
+        "SELECT id, front, back, notes, last_review, mem_level, extra FROM flashcards ORDER BY id"
+    )
+    for row in rows:
+        card = {'id': row[0]}
+        # explicit nulls are kept, Flashcard expects every one of these fields
+        card.update(zip(CARD_FIELDS, row[1:]))
+        if row[-1]:
+            card.update(json.loads(row[-1]))
+        deck["flashcards"].append(card)
+
+    last_id = conn.execute("SELECT MAX(id) FROM flashcards").fetchone()[0]
+    deck["next_card_id"] = max(last_id + 1 if last_id is not None else 0, deck.get("next_card_id", 0))
+    deck["schema_version"] = SCHEMA_VERSION
+    conn.close()
+
+    with open(json_file_name, "w", encoding="utf-8") as f:
+        json.dump(deck, f, indent=4, ensure_ascii=False)
+
+def main():
+    """ convert a deck in DECK_DIRECTORY between the JSON and SQLite formats """
+
+    usage = "usage: python sqlite_deck.py (to-sqlite | to-json) DECK_NAME"
+    if len(sys.argv) != 3 or sys.argv[1] not in ("to-sqlite", "to-json"):
+        sys.exit(usage)
+
+    command, deck_name = sys.argv[1:]
+    json_file_name = DECK_DIRECTORY + deck_name + ".json"
+    sqlite_file_name = DECK_DIRECTORY + deck_name + ".sqlite"
+
+    if command == "to-sqlite":
+        if os.path.exists(sqlite_file_name):
+            sys.exit(sqlite_file_name + " already exists")
+
+        # fold any journaled changes into the deck file first
+        if os.path.exists(DECK_DIRECTORY + deck_name + ".journal"):
+            FlashcardDeck(deck_name).close()
+        json_to_sqlite(json_file_name, sqlite_file_name)
+    else:
+        sqlite_to_json(sqlite_file_name, json_file_name)
+
+if __name__ == "__main__":
+    main()
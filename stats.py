@@ -0,0 +1,189 @@
+import sys
+from datetime import date, datetime
+
+# days shown in a review forecast
+FORECAST_DAYS = 14
+
+# days of answers counted in the recent retention rate
+RETENTION_DAYS = 30
+
+def day_of(t):
+    """ return the day number of a datetime, or of a stored time string """
+
+    if type(t) == str:
+        return date.fromisoformat(t[:10]).toordinal()
+
+    return t.toordinal()
+
+def add_count(counts, key, n):
+    """ add n to a count, dropping the key once its count reaches zero """
+
+    total = counts.get(key, 0) + n
+    if total:
+        counts[key] = total
+    else:
+        counts.pop(key, None)
+
+class DeckStats:
+    """
+    DeckStats Class
+        Aggregates of a deck's cards and answers: the number of cards due
+        on each day, the number of cards at each memory level, and the
+        number of answers and right answers on each day. They are built
+        once from the whole deck and then updated as cards are added and
+        answered, so forecasts and rates never rescan the cards.
+    """
+
+    def __init__(self, due_per_day=None, mem_levels=None, reviews_per_day=None):
+        # day number -> cards due that day
+        self.due_per_day = due_per_day or {}
+
+        # memory level -> cards at that level
+        self.mem_levels = mem_levels or {}
+
+        # day number -> [answers, right answers] given that day
+        self.reviews_per_day = reviews_per_day or {}
+
+    def add_card(self, due_time, mem_level):
+        """ count a card due at due_time """
+
+        add_count(self.due_per_day, day_of(due_time), 1)
+        add_count(self.mem_levels, mem_level, 1)
+
+    def remove_card(self, due_time, mem_level):
+        """ stop counting a card, e.g. before it is rescheduled """
+
+        add_count(self.due_per_day, day_of(due_time), -1)
+        add_count(self.mem_levels, mem_level, -1)
+
+    def add_review(self, review_time, answer, n=1):
+        """ count n answers given at review_time """
+
+        reviews = self.reviews_per_day.setdefault(day_of(review_time), [0, 0])
+        reviews[0] += n
+        reviews[1] += n if answer else 0
+
+    def reschedule_card(self, old_due_time, old_mem_level, due_time, mem_level, review_time, answer):
+        """ move an answered card to its new due day and memory level """
+
+        self.remove_card(old_due_time, old_mem_level)
+        self.add_card(due_time, mem_level)
+        self.add_review(review_time, answer)
+
+    def get_forecast(self, days=FORECAST_DAYS, today=None):
+        """
+        Return how many cards come due on each of the next number of days,
+        today's count including every card that is already overdue.
+        """
+
+        today = day_of(today or datetime.now())
+        forecast = [self.due_per_day.get(today + i, 0) for i in range(days)]
+
+        # there is one entry per day with cards due, not per card
+        if forecast:
+            forecast[0] += sum(n for day, n in self.due_per_day.items() if day < today)
+
+        return forecast
+
+    def get_mem_level_histogram(self):
+        """ return the number of cards at each memory level, from 0 to the highest one in use """
+
+        if not self.mem_levels:
+            return []
+
+        return [self.mem_levels.get(level, 0) for level in range(max(self.mem_levels) + 1)]
+
+    def get_retention(self, days=None, today=None):
+        """
+        Return (answers, right answers) given over the last number of days,
+        or over the whole history if days is None.
+        """
+
+        first_day = day_of(today or datetime.now()) - days + 1 if days is not None else None
+
+        answers = right = 0
+        for day, (n, correct) in self.reviews_per_day.items():
+            if first_day is None or day >= first_day:
+                answers += n
+                right += correct
+
+        return answers, right
+
+    def merge(self, other):
+        """ add the counts of another deck's stats to these """
+
+        for day, n in other.due_per_day.items():
+            add_count(self.due_per_day, day, n)
+        for level, n in other.mem_levels.items():
+            add_count(self.mem_levels, level, n)
+        for day, (n, correct) in other.reviews_per_day.items():
+            reviews = self.reviews_per_day.setdefault(day, [0, 0])
+            reviews[0] += n
+            reviews[1] += correct
+
+        return self
+
+    def to_dict(self):
+        """ return the stats as a JSON friendly dict, days written as dates """
+
+        # the counts are copied first, the deck server converts them on a
+        # worker thread while answers keep updating them
+        return {
+            'due_per_day': {date.fromordinal(day).isoformat(): n for day, n in list(self.due_per_day.items())},
+            'mem_levels': {str(level): n for level, n in list(self.mem_levels.items())},
+            'reviews_per_day': {date.fromordinal(day).isoformat(): list(r)
+                                for day, r in list(self.reviews_per_day.items())},
+        }
+
+    @classmethod
+    def from_dict(cls, stats_dict):
+        """ rebuild stats written by to_dict """
+
+        return cls(
+            {day_of(day): n for day, n in stats_dict['due_per_day'].items()},
+            {int(level): n for level, n in stats_dict['mem_levels'].items()},
+            {day_of(day): list(r) for day, r in stats_dict['reviews_per_day'].items()},
+        )
+
+def combine_stats(stats_list):
+    """ return the stats of several decks taken together """
+
+    combined = DeckStats()
+    for stats in stats_list:
+        combined.merge(stats)
+
+    return combined
+
+def format_rate(answers, right):
+    """ return a retention rate as text, e.g. '87% of 230 answers' """
+
+    if not answers:
+        return "no answers"
+
+    return "{:.0%} of {} answers".format(right / answers, answers)
+
+def main():
+    """ print the forecast, memory levels and retention of one deck or of all decks """
+
+    from catalog import DeckCatalog
+    from deck import list_decks
+
+    deck_names = sys.argv[1:] or list_decks()
+
+    catalog = DeckCatalog()
+    stats = combine_stats(catalog.get_stats(deck_name) for deck_name in deck_names)
+
+    today = date.today()
+    print("Due in the next {} days:".format(FORECAST_DAYS))
+    for i, n in enumerate(stats.get_forecast()):
+        print("    {:%a %d %b}  {:>7}".format(date.fromordinal(today.toordinal() + i), n))
+
+    print("Cards per memory level:")
+    for level, n in enumerate(stats.get_mem_level_histogram()):
+        print("    {:>2}  {:>9}".format(level, n))
+
+    print("Retention over the last {} days: {}".format(RETENTION_DAYS, format_rate(*stats.get_retention(RETENTION_DAYS))))
+    print("Retention over all answers: {}".format(format_rate(*stats.get_retention())))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+import os
+import sys
+import json
+
+import pytest
+
+# the modules live at the top of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def deck_directory(tmp_path, monkeypatch):
+    """ run the test in an empty directory, with an empty ./decks/ """
+
+    monkeypatch.chdir(tmp_path)
+    os.mkdir("decks")
+    return tmp_path / "decks"
+
+@pytest.fixture
+def make_deck(deck_directory):
+    """ write a JSON deck of due cards, returns the name of the deck """
+
+    def make(deck_name, number_of_cards, srs_method="Fibonacci"):
+        cards = [{
+            'front': "front {}".format(i),
+            'back': "back {}".format(i),
+            'notes': "",
+            'last_review': "2000-01-01 00:00:00",
+            'mem_level': 0,
+        } for i in range(number_of_cards)]
+
+        deck = {'srs_method': srs_method, 'flashcards': cards}
+        with open(deck_directory / (deck_name + ".json"), "w", encoding="utf-8") as f:
+            json.dump(deck, f)
+        return deck_name
+
+    return make
@@ -0,0 +1,49 @@
+import os
+from datetime import datetime, timedelta
+
+from anki import export_deck
+from deck import FlashcardDeck, create_deck
+from importer import import_cards
+from media import MediaStore, media_reference
+
+def test_apkg_round_trip(deck_directory):
+    store = MediaStore()
+    picture = store.add_bytes(b"\x89PNG not really a picture", ".png")
+
+    create_deck("original", "Fibonacci")
+    deck = FlashcardDeck("original")
+    deck.add_flashcard("plain", "back", "notes")
+    deck.add_flashcard("with <b>markup</b> & symbols", "line one\nline two", "")
+    deck.add_flashcard("with a picture " + media_reference(picture), "back", "")
+
+    # a card reviewed a while ago, due again a few days from now
+    reviewed_id = deck.add_flashcard("reviewed", "back", "")
+    reviewed = deck.get_flashcard(reviewed_id)
+    reviewed.set_mem_level(3)
+    reviewed.set_last_review(datetime.now() - timedelta(days=1))
+    deck.save_deck()
+    deck = FlashcardDeck("original")
+
+    exported, media = export_deck(deck, str(deck_directory / "original.apkg"), store)
+    assert (exported, media) == (4, 1)
+
+    # the picture has to come back out of the package
+    os.remove(store.get_path(picture))
+
+    create_deck("copy", "Fibonacci")
+    copy = FlashcardDeck("copy")
+    imported, duplicates, errors = import_cards(copy, str(deck_directory / "original.apkg"))
+    assert (imported, duplicates, errors) == (4, 0, [])
+
+    cards = {card.get_front(): card for _, card in deck.iter_flashcards()}
+    copies = {card.get_front(): card for _, card in copy.iter_flashcards()}
+    assert copies.keys() == cards.keys()
+
+    for front, card in cards.items():
+        assert copies[front].get_back() == card.get_back()
+        assert copies[front].get_notes() == card.get_notes()
+
+    # the copy is never due later than the original
+    assert copy.get_due_time(copies["reviewed"]) <= deck.get_due_time(cards["reviewed"])
+    assert copy.get_due_time(copies["reviewed"]) > datetime.now()
+    assert store.exists(picture)
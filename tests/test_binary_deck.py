@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from deck import FlashcardDeck
+from binary_deck import BinaryFlashcardDeck, binary_to_json, json_to_binary
+
+def read_cards(file_name):
+    with open(file_name, encoding="utf-8") as f:
+        return json.load(f)["flashcards"]
+
+def test_round_trip(make_deck):
+    make_deck("trip", 20, srs_method="SM-2")
+
+    deck = FlashcardDeck("trip")
+    for answer in (True, False, True):
+        deck.log_answer(deck.get_next_flashcard(), answer)
+    deck.delete_flashcard(5)
+    deck.close()
+
+    json_to_binary("decks/trip.json", "decks/trip.deck")
+    binary_to_json("decks/trip.deck", "decks/back.json")
+
+    assert read_cards("decks/back.json") == read_cards("decks/trip.json")
+
+def test_changes_survive_reopening(make_deck):
+    make_deck("changes", 5)
+    json_to_binary("decks/changes.json", "decks/changes.deck")
+
+    deck = BinaryFlashcardDeck("changes")
+    card = deck.get_next_flashcard()
+    deck.log_answer(card, True)
+    edited, deleted = [card_id for card_id in range(5) if card_id != card.get_id()][:2]
+    deck.edit_flashcard(edited, "édité", "back", "notes")
+    deck.delete_flashcard(deleted)
+    new_id = deck.add_flashcard("new front", "new back", "")
+
+    # once from the journal, once more after it is folded into the deck file
+    for _ in range(2):
+        deck = BinaryFlashcardDeck("changes")
+        assert deck.get_total_number_of_cards() == 5
+        assert deck.get_flashcard(card.get_id()).get_mem_level() == 1
+        assert deck.get_flashcard(edited).get_front() == "édité"
+        assert deck.get_flashcard(new_id).get_front() == "new front"
+        with pytest.raises(KeyError):
+            deck.get_flashcard(deleted)
+        deck.close()
@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+from deck import FlashcardDeck
+from sqlite_deck import SQLiteFlashcardDeck, json_to_sqlite
+
+def open_backend(backend, deck_name):
+    """ open a JSON deck written by make_deck with the given backend, converting it first """
+
+    if backend == "json":
+        return FlashcardDeck(deck_name)
+
+    if backend == "sqlite":
+        json_to_sqlite("decks/" + deck_name + ".json", "decks/" + deck_name + ".sqlite")
+        return SQLiteFlashcardDeck(deck_name)
+
+    pytest.importorskip("numpy")
+    from binary_deck import BinaryFlashcardDeck, json_to_binary
+    json_to_binary("decks/" + deck_name + ".json", "decks/" + deck_name + ".deck")
+    return BinaryFlashcardDeck(deck_name)
+
+def reopen(deck):
+    deck.close()
+    return type(deck)(deck.get_deck_name())
+
+BACKENDS = ["json", "sqlite", "binary"]
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_legacy_cards_get_their_positions(make_deck, backend):
+    make_deck("legacy", 5)
+    deck = open_backend(backend, "legacy")
+
+    for card_id in range(5):
+        assert deck.get_flashcard(card_id).get_front() == "front {}".format(card_id)
+    assert deck.add_flashcard("new", "back", "") == 5
+
+def test_missing_ids_are_assigned_after_the_others(make_deck):
+    make_deck("mixed", 4)
+    with open("decks/mixed.json", encoding="utf-8") as f:
+        deck = json.load(f)
+    deck['flashcards'][1]['id'] = 7
+    deck['flashcards'][3]['id'] = 2
+    with open("decks/mixed.json", "w", encoding="utf-8") as f:
+        json.dump(deck, f)
+
+    deck = FlashcardDeck("mixed")
+
+    fronts = dict(deck.iter_fronts())
+    assert fronts == {8: "front 0", 7: "front 1", 9: "front 2", 2: "front 3"}
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_ids_are_not_reused(make_deck, backend):
+    make_deck("reuse", 3)
+    deck = open_backend(backend, "reuse")
+
+    new_id = deck.add_flashcard("new", "back", "")
+    deck.delete_flashcard(new_id)
+    deck.delete_flashcard(2)
+
+    # neither while the deck is open, nor once it is written and reopened
+    assert deck.add_flashcard("newer", "back", "") == new_id + 1
+    deck = reopen(deck)
+    assert deck.add_flashcard("newest", "back", "") == new_id + 2
+    assert deck.get_flashcard(1).get_front() == "front 1"
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_unknown_ids(make_deck, backend):
+    make_deck("unknown", 3)
+    deck = open_backend(backend, "unknown")
+    deck.delete_flashcard(1)
+
+    for card_id in (1, 3, -1):
+        with pytest.raises(KeyError):
+            deck.get_flashcard(card_id)
+        with pytest.raises(KeyError):
+            deck.edit_flashcard(card_id, "front", "back", "")
+        with pytest.raises(KeyError):
+            deck.delete_flashcard(card_id)
+
+    # nothing was journaled for the failed changes
+    deck = reopen(deck)
+    assert deck.get_total_number_of_cards() == 2
+    assert deck.get_flashcard(2).get_front() == "front 2"
@@ -0,0 +1,106 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+import deck as deck_module
+from deck import TIME_FORMAT, FlashcardDeck
+
+START = datetime(2020, 1, 1)
+
+class Clock(datetime):
+    """ stands in for datetime in deck.py, so the tests decide what now is """
+
+    current = START
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls.current
+
+@pytest.fixture
+def clock(monkeypatch):
+    monkeypatch.setattr(deck_module, "datetime", Clock)
+    Clock.current = START
+    return Clock
+
+def set_due_times(deck_name, due_times):
+    """ make the cards of a Fibonacci deck written by make_deck due at the given times """
+
+    with open("decks/" + deck_name + ".json", encoding="utf-8") as f:
+        deck = json.load(f)
+
+    # a card at mem level 1 is due a day after its last review
+    for card, due_time in zip(deck['flashcards'], due_times):
+        card['last_review'] = (due_time - timedelta(days=1)).strftime(TIME_FORMAT)
+        card['mem_level'] = 1
+
+    with open("decks/" + deck_name + ".json", "w", encoding="utf-8") as f:
+        json.dump(deck, f)
+
+def test_every_pending_card_once(make_deck):
+    make_deck("once", 50)
+    deck = FlashcardDeck("once")
+
+    card_ids = []
+    for _ in range(50):
+        card_ids.append(deck.get_next_flashcard().get_id())
+
+    assert sorted(card_ids) == list(range(50))
+    assert deck.get_next_flashcard() is None
+    assert deck.get_number_pending() == 0
+
+def test_cards_come_due_in_order(make_deck, clock):
+    make_deck("heap", 6)
+    minutes = [30, 10, -5, 50, 20, -15]
+    set_due_times("heap", [START + timedelta(minutes=m) for m in minutes])
+    deck = FlashcardDeck("heap")
+
+    assert deck.get_number_pending() == 2
+    assert deck.get_next_due_time() == START + timedelta(minutes=10)
+
+    clock.current = START + timedelta(minutes=25)
+    assert deck.get_number_pending() == 4
+    assert deck.get_next_due_time() == START + timedelta(minutes=30)
+
+    # a card answered right goes back into the heap, due a day later
+    card = deck.get_next_flashcard()
+    deck.log_answer(card, True)
+    assert deck.get_number_pending() == 3
+
+    answered = clock.current
+    clock.current = START + timedelta(hours=1)
+    assert deck.get_number_pending() == 5
+    assert deck.get_next_due_time() == answered + timedelta(days=1)
+
+def test_earliest_card_first(make_deck, clock):
+    make_deck("earliest", 5)
+    minutes = [-30, -10, -50, -20, -40]
+    set_due_times("earliest", [START + timedelta(minutes=m) for m in minutes])
+    deck = FlashcardDeck("earliest")
+
+    assert [deck.get_earliest_flashcard().get_id() for _ in range(3)] == [2, 4, 0]
+
+    # cards coming due later are handed out after the ones waiting longer
+    deck.add_flashcard("new", "back", "")
+    assert [deck.get_earliest_flashcard().get_id() for _ in range(3)] == [3, 1, 5]
+    assert deck.get_earliest_flashcard() is None
+
+def test_put_back(make_deck):
+    make_deck("put_back", 3)
+    deck = FlashcardDeck("put_back")
+
+    card = deck.get_next_flashcard()
+    assert deck.get_number_pending() == 2
+
+    # a card put back twice is still pending once
+    deck.put_back_flashcard(card)
+    deck.put_back_flashcard(card)
+    assert deck.get_number_pending() == 3
+
+    # answered cards are rescheduled, and deleted ones are gone for good
+    answered, deleted = deck.get_next_flashcard(), deck.get_next_flashcard()
+    deck.log_answer(answered, True)
+    deck.delete_flashcard(deleted.get_id())
+    deck.put_back_flashcard(answered)
+    deck.put_back_flashcard(deleted)
+    assert deck.get_number_pending() == 1
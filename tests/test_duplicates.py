@@ -0,0 +1,114 @@
+import pytest
+
+from deck import FlashcardDeck
+from duplicates import KEEP, MERGE, REJECT, DuplicateCardError, find_duplicate_groups, normalize_text
+
+def test_fronts_are_compared_normalized():
+    assert normalize_text("  Front\t 1 ") == normalize_text("front 1")
+    assert normalize_text("Straße") == normalize_text("STRASSE")
+    assert normalize_text("però") != normalize_text("pero")
+
+def test_keep_adds_the_card(make_deck):
+    make_deck("keep", 3)
+    deck = FlashcardDeck("keep")
+
+    card_id = deck.add_flashcard("Front 1", "other back", "", KEEP)
+
+    assert card_id == 3
+    assert deck.find_duplicates("front 1") == [1, 3]
+
+def test_reject_raises(make_deck):
+    make_deck("reject", 3)
+    deck = FlashcardDeck("reject")
+
+    with pytest.raises(DuplicateCardError) as error:
+        deck.add_flashcard("FRONT  2", "other back", "", REJECT)
+
+    assert error.value.card_id == 2
+    assert deck.get_total_number_of_cards() == 3
+
+def test_merge_adds_to_the_existing_card(make_deck):
+    make_deck("merge", 3)
+    deck = FlashcardDeck("merge")
+
+    assert deck.add_flashcard("front 0", "other back", "a note", MERGE) == 0
+    assert deck.add_flashcard("front 0", "Other  back", "", MERGE) == 0
+
+    card = deck.get_flashcard(0)
+    assert card.get_back() == "back 0\nother back"
+    assert card.get_notes() == "a note"
+    assert deck.get_total_number_of_cards() == 3
+
+    # the merge is journaled like any other edit
+    deck = FlashcardDeck("merge")
+    assert deck.get_flashcard(0).get_back() == "back 0\nother back"
+
+def test_new_fronts_are_added_whatever_the_policy(make_deck):
+    make_deck("policies", 1)
+    deck = FlashcardDeck("policies")
+
+    for policy in (KEEP, REJECT, MERGE):
+        deck.add_flashcard("new " + policy, "back", "", policy)
+
+    assert deck.get_total_number_of_cards() == 4
+
+def test_unknown_policy(make_deck):
+    make_deck("unknown", 1)
+    deck = FlashcardDeck("unknown")
+
+    with pytest.raises(ValueError):
+        deck.add_flashcard("front 0", "back", "", "replace")
+
+def test_batch_duplicates(make_deck):
+    batch = [
+        {'front': "front 0", 'back': "merged into the deck", 'notes': ""},
+        {'front': "new", 'back': "first", 'notes': ""},
+        {'front': "New", 'back': "merged into the batch", 'notes': "note"},
+    ]
+    for card in batch:
+        card.update(last_review="2000-01-01 00:00:00", mem_level=0)
+
+    make_deck("batch_reject", 2)
+    deck = FlashcardDeck("batch_reject")
+    assert deck.add_flashcards([dict(card) for card in batch], REJECT) == 1
+    assert deck.get_flashcard(0).get_back() == "back 0"
+
+    make_deck("batch_merge", 2)
+    deck = FlashcardDeck("batch_merge")
+    assert deck.add_flashcards([dict(card) for card in batch], MERGE) == 1
+    assert deck.get_flashcard(0).get_back() == "back 0\nmerged into the deck"
+    new = deck.get_flashcard(2)
+    assert (new.get_back(), new.get_notes()) == ("first\nmerged into the batch", "note")
+
+    make_deck("batch_keep", 2)
+    deck = FlashcardDeck("batch_keep")
+    assert deck.add_flashcards([dict(card) for card in batch], KEEP) == 3
+
+def test_edited_front_moves_in_the_index(make_deck):
+    make_deck("edited", 2)
+    deck = FlashcardDeck("edited")
+    assert deck.find_duplicates("front 0") == [0]
+
+    deck.edit_flashcard(0, "front 1", "back", "")
+    assert deck.find_duplicates("front 0") == []
+    # an edited card counts as the newest one with its front
+    assert deck.find_duplicates("front 1") == [1, 0]
+
+    deck.delete_flashcard(1)
+    assert deck.find_duplicates("front 1") == [0]
+
+def test_duplicate_groups(make_deck):
+    make_deck("first", 3)
+    make_deck("second", 2)
+    FlashcardDeck("first").add_flashcard("Front 2", "back", "")
+
+    assert find_duplicate_groups(["first", "second"]) == [
+        [("first", 2, "front 2"), ("first", 3, "Front 2")],
+    ]
+
+    groups = sorted(find_duplicate_groups(["first", "second"], across_decks=True))
+    assert groups == [
+        [("first", 0, "front 0"), ("second", 0, "front 0")],
+        [("first", 1, "front 1"), ("second", 1, "front 1")],
+        [("first", 2, "front 2"), ("first", 3, "Front 2")],
+    ]
@@ -0,0 +1,76 @@
+import os
+
+import pytest
+
+from deck import FlashcardDeck
+from journal import DeckJournal
+
+def answer_cards(deck, answers):
+    """ answer the next pending cards, returns their ids """
+
+    card_ids = []
+    for answer in answers:
+        card = deck.get_next_flashcard()
+        deck.log_answer(card, answer)
+        card_ids.append(card.get_id())
+    return card_ids
+
+def test_journal_is_replayed(make_deck):
+    make_deck("replay", 10)
+
+    deck = FlashcardDeck("replay")
+    right, wrong = answer_cards(deck, [True, False])
+    deck.add_flashcard("new front", "new back", "")
+    deleted = next(card_id for card_id in range(10) if card_id not in (right, wrong))
+    deck.delete_flashcard(deleted)
+
+    # reopened without being closed, so only the journal has the changes
+    assert os.path.exists("decks/replay.journal")
+    deck = FlashcardDeck("replay")
+
+    assert deck.get_total_number_of_cards() == 10
+    assert deck.get_flashcard(right).get_mem_level() == 1
+    assert "new front" in [front for _, front in deck.iter_fronts()]
+    with pytest.raises(KeyError):
+        deck.get_flashcard(deleted)
+    assert len(deck.get_review_history()) == 2
+
+def test_close_folds_journal_into_history(make_deck):
+    make_deck("fold", 5)
+
+    deck = FlashcardDeck("fold")
+    answer_cards(deck, [True, True, False])
+    deck.close()
+
+    assert not os.path.exists("decks/fold.journal")
+    assert len(FlashcardDeck("fold").get_review_history()) == 3
+
+def test_torn_tail_is_cut_on_open(make_deck):
+    make_deck("torn", 5)
+
+    deck = FlashcardDeck("torn")
+    answer_cards(deck, [True])
+
+    # a crash in the middle of an append
+    with open("decks/torn.journal", "ab") as f:
+        f.write(b'{"op": "review", "card": 3, "last_re')
+
+    deck = FlashcardDeck("torn")
+    answer_cards(deck, [True])
+
+    # the second review starts on its own line instead of after the torn one
+    deck = FlashcardDeck("torn")
+    assert len(deck.get_review_history()) == 2
+    with open("decks/torn.journal", "rb") as f:
+        assert b"last_re\n" not in f.read()
+
+def test_truncate_keeps_complete_lines(deck_directory):
+    file_name = str(deck_directory / "lines.journal")
+    with open(file_name, "wb") as f:
+        f.write(b'{"op": "delete", "card": 1}\n{"op": "del')
+
+    journal = DeckJournal(file_name)
+
+    assert journal.size == len(b'{"op": "delete", "card": 1}\n')
+    assert os.path.getsize(file_name) == journal.size
+    assert journal.read_records() == [{'op': "delete", 'card': 1}]
@@ -0,0 +1,23 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from optimizer import fit_fsrs, simulate_history
+from schedulers import FSRS_DEFAULT_WEIGHTS
+
+def test_fit_never_ends_worse_than_it_started():
+    history = simulate_history(500, 10)
+
+    weights, initial_loss, final_loss = fit_fsrs(history, iterations=20)
+
+    assert final_loss <= initial_loss
+    assert len(weights) == len(FSRS_DEFAULT_WEIGHTS)
+
+def test_starting_weights_are_kept_when_no_step_helps():
+    history = simulate_history(500, 10)
+
+    # steps this large only overshoot
+    weights, initial_loss, final_loss = fit_fsrs(history, iterations=5, learning_rate=50)
+
+    assert weights == FSRS_DEFAULT_WEIGHTS
+    assert final_loss == initial_loss
@@ -0,0 +1,32 @@
+import os
+import sys
+import subprocess
+
+import pytest
+
+from schedulers import SCHEDULERS, get_scheduler
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_deck_import_loads_neither_numpy_nor_qt():
+    # a headless start only needs the standard library
+    code = "import sys, deck; print(sorted({'numpy', 'PyQt6'} & set(sys.modules)))"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                            cwd=REPOSITORY)
+    assert result.stdout.strip() == "[]"
+
+@pytest.mark.parametrize("srs_method", sorted(SCHEDULERS))
+def test_batch_review_matches_single_reviews(srs_method):
+    np = pytest.importorskip("numpy")
+    scheduler = get_scheduler(srs_method)
+
+    answers = [True, True, False, True, True]
+    states = scheduler.new_states(1)
+    mem_level, srs_data = 0, None
+    for step, answer in enumerate(answers):
+        elapsed_days = 0 if step == 0 else interval
+        mem_level, srs_data, interval = scheduler.review(mem_level, srs_data, answer, elapsed_days)
+        intervals = scheduler.review_batch(states, np.array([0]), np.array([answer]), np.array([float(elapsed_days)]))
+
+        assert states['mem_level'][0] == mem_level
+        assert intervals[0] == pytest.approx(interval, rel=1e-3)
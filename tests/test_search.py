@@ -0,0 +1,118 @@
+import os
+
+import search
+from deck import DECK_DIRECTORY, FlashcardDeck
+from search import SearchIndex
+
+def add_deck(deck_name, cards, directory=DECK_DIRECTORY):
+    """ write a deck of (front, back, notes) cards to a directory """
+
+    with open(directory + deck_name + ".json", "w", encoding="utf-8") as f:
+        f.write('{"srs_method": "Fibonacci", "flashcards": []}')
+
+    deck = FlashcardDeck(deck_name, directory)
+    for front, back, notes in cards:
+        deck.add_flashcard(front, back, notes)
+    deck.close()
+
+def test_index_of_another_directory(deck_directory, tmp_path):
+    other = str(tmp_path / "other") + "/"
+    (tmp_path / "other").mkdir()
+    add_deck("elsewhere", [("città", "city", "")], other)
+    add_deck("here", [("casa", "house", "")])
+
+    index = SearchIndex(other)
+    assert index.update() == ["elsewhere"]
+
+    assert [r["front"] for r in index.search("citta")[0]] == ["città"]
+    assert index.search("casa") == ([], True)
+
+def test_broad_queries_say_they_are_not_fully_ranked(make_deck, monkeypatch):
+    monkeypatch.setattr(search, "MAX_RANKED_MATCHES", 10)
+    make_deck("many", 20)
+    add_deck("next", [("back back back", "back", "back")])
+    index = SearchIndex()
+    index.update()
+
+    # decks are indexed by name, so the best card comes after the first ten matches
+    results, all_ranked = index.search("back", limit=5)
+    assert len(results) == 5 and not all_ranked
+    assert "next" not in [r["deck"] for r in results]
+
+    results, all_ranked = index.search("back", deck_name="next")
+    assert [r["deck"] for r in results] == ["next"] and all_ranked
+
+def fronts(results):
+    return sorted(result["front"] for result in results[0])
+
+def test_words_match_as_prefixes(deck_directory):
+    add_deck("words", [
+        ("Café crème", "coffee", ""),
+        ("caffè", "coffee", "Italian"),
+        ("a cat", "un chat", "AND OR NOT"),
+    ])
+    index = SearchIndex()
+    index.update()
+
+    assert fronts(index.search("cafe cr")) == ["Café crème"]
+    assert fronts(index.search("CAF")) == ["Café crème", "caffè"]
+    assert fronts(index.search("italian")) == ["caffè"]
+
+    # single letters are whole words, and query syntax is taken as text
+    assert fronts(index.search("a")) == ["a cat"]
+    assert fronts(index.search('cat OR "NOT')) == ["a cat"]
+    assert index.search("  ?! ") == ([], True)
+
+def test_search_in_a_deck(make_deck):
+    make_deck("first", 3)
+    make_deck("second", 3)
+    index = SearchIndex()
+    index.update()
+
+    assert len(index.search("front 1")[0]) == 2
+    assert index.search("front 1", deck_name="second")[0] == [
+        {'deck': "second", 'card': 1, 'front': "front 1", 'back': "back 1", 'notes': ""}]
+
+def test_cards_changed_in_the_app(make_deck):
+    make_deck("changes", 3)
+    index = SearchIndex()
+    index.update()
+
+    index.add_card("changes", 3, "nuovo", "new", "")
+    index.add_card("changes", 0, "edited", "back 0", "", replace=True)
+    index.remove_card("changes", 1)
+
+    assert fronts(index.search("front")) == ["front 2"]
+    assert fronts(index.search("nuovo edited")) == []
+    assert fronts(index.search("nuovo")) == ["nuovo"]
+    assert index.search("edited")[0][0]["card"] == 0
+
+def test_only_changed_decks_are_reindexed(make_deck):
+    make_deck("same", 2)
+    make_deck("changed", 2)
+    make_deck("removed", 2)
+    index = SearchIndex()
+    assert index.update() == ["changed", "removed", "same"]
+    assert index.update() == []
+
+    deck = FlashcardDeck("changed")
+    deck.add_flashcard("added", "back", "")
+    deck.close()
+    os.remove("decks/removed.json")
+
+    assert index.update() == ["changed"]
+    assert fronts(index.search("added")) == ["added"]
+    assert sorted(result["deck"] for result in index.search("front 0")[0]) == ["changed", "same"]
+
+    # a deck written after its new cards went through add_card is kept
+    deck = FlashcardDeck("same")
+    stamp = index.get_stamp("same")
+    card_id = deck.add_flashcard("kept", "back", "")
+    index.add_card("same", card_id, "kept", "back", "")
+    deck.close()
+    index.store_stamp("same", stamp)
+    assert index.update() == []
+
+    index.mark_stale("same")
+    assert index.update() == ["same"]
+    assert fronts(index.search("kept")) == ["kept"]
@@ -0,0 +1,103 @@
+import json
+import asyncio
+import threading
+import http.client
+
+import pytest
+
+from deck import FlashcardDeck
+from duplicates import REJECT, DuplicateCardError
+from remote_deck import RemoteFlashcardDeck
+from server import DeckServer
+
+@pytest.fixture
+def server(deck_directory):
+    """ run a DeckServer on a free port on its own thread, returns its address """
+
+    loop = asyncio.new_event_loop()
+    deck_server = DeckServer()
+    tcp_server = loop.run_until_complete(asyncio.start_server(deck_server.handle_connection, "127.0.0.1", 0))
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+
+    yield tcp_server.sockets[0].getsockname()[:2]
+
+    async def stop():
+        tcp_server.close()
+        await deck_server.close_connections()
+
+    asyncio.run_coroutine_threadsafe(stop(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+    deck_server.close()
+
+def post(address, path, data):
+    """ send a raw POST and return the status and decoded reply """
+
+    conn = http.client.HTTPConnection(*address)
+    conn.request("POST", path, data, {"Content-Type": "application/json"})
+    response = conn.getresponse()
+    reply = json.loads(response.read())
+    conn.close()
+    return response.status, reply
+
+def test_remote_round_trip(make_deck, server):
+    make_deck("remote", 10)
+    deck = RemoteFlashcardDeck("remote", server)
+    assert deck.get_total_number_of_cards() == 10
+    assert deck.get_number_pending() == 10
+
+    card = deck.get_next_flashcard()
+    deck.log_answer(card, True)
+    assert deck.get_number_pending() == 9
+
+    card_id = deck.add_flashcard("new front", "new back", "")
+    with pytest.raises(DuplicateCardError):
+        deck.add_flashcard("New Front", "other back", "", REJECT)
+    deck.edit_flashcard(card_id, "edited front", "new back", "notes")
+    assert deck.find_cards("edited") == [card_id]
+
+    deleted = 1 if card.get_id() == 0 else 0
+    deck.delete_flashcard(deleted)
+    with pytest.raises(KeyError):
+        deck.delete_flashcard(deleted)
+    assert deck.get_stats().get_retention() == (1, 1)
+
+    deck.save_deck()
+    local = FlashcardDeck("remote")
+    assert local.get_total_number_of_cards() == 10
+    assert local.get_flashcard(card_id).get_front() == "edited front"
+    assert local.get_flashcard(card.get_id()).get_mem_level() == 1
+
+def test_requests_while_searching(make_deck, server):
+    make_deck("busy", 20000)
+    searcher = RemoteFlashcardDeck("busy", server)
+    reviewer = RemoteFlashcardDeck("busy", server)
+    results = []
+
+    def search():
+        for _ in range(5):
+            results.append(len(searcher.find_cards("front")))
+
+    # cards are answered and added for as long as the searches run
+    thread = threading.Thread(target=search)
+    thread.start()
+    added = 0
+    while thread.is_alive():
+        reviewer.log_answer(reviewer.get_next_flashcard(), True)
+        reviewer.add_flashcard("added while searching " + str(added), "back", "")
+        added += 1
+    thread.join()
+
+    assert results == [20000] * 5
+    assert reviewer.get_total_number_of_cards() == 20000 + added
+
+@pytest.mark.parametrize("data", [b"[]", b"1", b'"text"', b"null"])
+def test_body_must_be_an_object(make_deck, server, data):
+    make_deck("bodies", 1)
+
+    status, reply = post(server, "/decks/bodies/find", data)
+
+    assert status == 400
+    assert reply["error"] == "body must be a JSON object"
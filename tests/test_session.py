@@ -0,0 +1,112 @@
+import json
+from collections import Counter
+from datetime import datetime, timedelta
+
+from deck import TIME_FORMAT, FlashcardDeck
+from session import ReviewSession
+
+def set_last_reviews(deck_name, minutes_ago):
+    """ make the cards of a deck written by make_deck due the given minutes ago """
+
+    with open("decks/" + deck_name + ".json", encoding="utf-8") as f:
+        deck = json.load(f)
+
+    # cards at mem level 0 are due when they were last reviewed
+    now = datetime.now()
+    for card, minutes in zip(deck['flashcards'], minutes_ago):
+        card['last_review'] = (now - timedelta(minutes=minutes)).strftime(TIME_FORMAT)
+
+    with open("decks/" + deck_name + ".json", "w", encoding="utf-8") as f:
+        json.dump(deck, f)
+
+def review_all(session, answer=lambda card: True):
+    """ answer every card of a session, returns the (deck, front) of the cards in the order shown """
+
+    shown = []
+    while True:
+        card = session.get_next_flashcard()
+        if card is None:
+            return shown
+        shown.append((session.card_decks[card], card.get_front()))
+        session.log_answer(card, answer(card))
+
+def test_decks_are_merged_on_due_time(make_deck):
+    minutes_ago = {'a': [60, 30, 5], 'b': [50, 40, 10], 'c': [70, 20, 15]}
+    for deck_name, minutes in minutes_ago.items():
+        make_deck(deck_name, 3)
+        set_last_reviews(deck_name, minutes)
+
+    session = ReviewSession(["a", "b", "c"], window=1).start()
+    assert session.get_number_pending() == 9
+
+    shown = review_all(session)
+
+    assert shown == [
+        ("c", "front 0"), ("a", "front 0"), ("b", "front 0"),
+        ("b", "front 1"), ("a", "front 1"), ("c", "front 1"),
+        ("c", "front 2"), ("b", "front 2"), ("a", "front 2"),
+    ]
+    assert sorted(session.close()) == ["a", "b", "c"]
+
+    for deck_name in minutes_ago:
+        deck = FlashcardDeck(deck_name)
+        assert deck.get_number_pending() == 0
+        assert [card.get_mem_level() for _, card in deck.iter_flashcards()] == [1, 1, 1]
+
+def test_open_decks_are_capped(make_deck):
+    deck_names = ["deck{}".format(i) for i in range(6)]
+    for i, deck_name in enumerate(deck_names):
+        make_deck(deck_name, 5)
+        set_last_reviews(deck_name, [i + 6 * j for j in range(5)])
+
+    session = ReviewSession(deck_names, window=3, max_open_decks=2).start()
+    most_open = len(session.decks)
+    shown = Counter()
+    while True:
+        card = session.get_next_flashcard()
+        if card is None:
+            break
+        shown[session.card_decks[card], card.get_front()] += 1
+        session.log_answer(card, True)
+        most_open = max(most_open, len(session.decks))
+
+    assert most_open <= 2
+    assert len(shown) == 30 and set(shown.values()) == {1}
+    assert sorted(session.close()) == deck_names
+    assert all(FlashcardDeck(deck_name).get_number_pending() == 0 for deck_name in deck_names)
+
+def test_wrong_and_unanswered_cards_come_back(make_deck):
+    make_deck("first", 2)
+    make_deck("second", 2)
+    session = ReviewSession(["first", "second"], window=2).start()
+
+    card = session.get_next_flashcard()
+    session.put_back_flashcard(card)
+    assert session.get_number_pending() == 4
+
+    # a card answered wrong is due again right away
+    answered = set()
+
+    def answer(card):
+        seen = (session.card_decks[card], card.get_front()) in answered
+        answered.add((session.card_decks[card], card.get_front()))
+        return seen
+
+    shown = review_all(session, answer)
+    assert len(shown) == 8
+    assert Counter(shown) == {card: 2 for card in shown}
+    session.close()
+
+def test_decks_with_nothing_due_are_not_opened(make_deck):
+    make_deck("done", 3)
+    make_deck("due", 3)
+    set_last_reviews("done", [-60] * 3)
+
+    session = ReviewSession(["done", "due"]).start()
+    assert review_all(session) and session.get_total_number_of_cards() == 6
+    session.close()
+
+    # the catalog now knows neither deck has cards due
+    session = ReviewSession(["done", "due"]).start()
+    assert session.decks == {} and session.get_next_flashcard() is None
+    assert session.close() == []
@@ -0,0 +1,138 @@
+import json
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from deck import TIME_FORMAT, FlashcardDeck
+from sqlite_deck import SQLiteFlashcardDeck, json_to_sqlite, sqlite_to_json
+
+def read_cards(file_name):
+    with open(file_name, encoding="utf-8") as f:
+        return json.load(f)["flashcards"]
+
+def test_round_trip(make_deck):
+    make_deck("trip", 20)
+
+    deck = FlashcardDeck("trip")
+    for answer in (True, False, True):
+        deck.log_answer(deck.get_next_flashcard(), answer)
+    deck.delete_flashcard(5)
+    deck.close()
+
+    json_to_sqlite("decks/trip.json", "decks/trip.sqlite")
+    sqlite_to_json("decks/trip.sqlite", "decks/back.json")
+
+    assert read_cards("decks/back.json") == read_cards("decks/trip.json")
+    assert FlashcardDeck("back").get_next_flashcard() is not None
+
+def test_round_trip_keeps_nulls(make_deck):
+    make_deck("nulls", 2)
+    with open("decks/nulls.json", encoding="utf-8") as f:
+        deck = json.load(f)
+    deck["flashcards"][0].update(notes=None, source=None)
+    with open("decks/nulls.json", "w", encoding="utf-8") as f:
+        json.dump(deck, f)
+
+    json_to_sqlite("decks/nulls.json", "decks/nulls.sqlite")
+    sqlite_to_json("decks/nulls.sqlite", "decks/back.json")
+
+    card = read_cards("decks/back.json")[0]
+    assert card["notes"] is None
+    assert card["source"] is None
+
+def test_unknown_ids_raise(make_deck):
+    make_deck("ids", 3)
+    json_to_sqlite("decks/ids.json", "decks/ids.sqlite")
+    deck = SQLiteFlashcardDeck("ids")
+
+    with pytest.raises(KeyError):
+        deck.merge_flashcard(99, "back", "notes")
+    with pytest.raises(KeyError):
+        deck.edit_flashcard(99, "front", "back", "notes")
+    with pytest.raises(KeyError):
+        deck.delete_flashcard(99)
+
+    deck.edit_flashcard(1, "edited", "back", "notes")
+    assert deck.load_card(1).get_front() == "edited"
+
+def test_every_due_card_is_handed_out(make_deck):
+    make_deck("due", 200)
+    json_to_sqlite("decks/due.json", "decks/due.sqlite")
+    deck = SQLiteFlashcardDeck("due")
+
+    seen = set()
+    card = deck.get_next_flashcard()
+    while card is not None:
+        seen.add(card.get_id())
+        deck.log_answer(card, True)
+        card = deck.get_next_flashcard()
+
+    assert seen == set(range(200))
+    assert deck.get_number_pending() == 0
+
+def test_threads_use_their_own_connection(make_deck):
+    make_deck("threads", 500)
+    json_to_sqlite("decks/threads.json", "decks/threads.sqlite")
+    deck = SQLiteFlashcardDeck("threads")
+    errors = []
+
+    def browse():
+        try:
+            for _ in range(20):
+                assert len(deck.find_cards("front")) >= 500
+        except Exception as e:
+            errors.append(e)
+
+    # the GUI thread answers and adds while a worker searches the same deck
+    workers = [threading.Thread(target=browse) for _ in range(2)]
+    for worker in workers:
+        worker.start()
+    for i in range(100):
+        deck.log_answer(deck.get_next_flashcard(), True)
+        deck.add_flashcard("added {}".format(i), "back", "")
+    for worker in workers:
+        worker.join()
+
+    assert errors == []
+    assert len(deck.connections) == 3
+    deck.close()
+    assert deck.connections == []
+    assert SQLiteFlashcardDeck("threads").get_total_number_of_cards() == 600
+
+def spread_due_times(deck_name, number_due):
+    """ make card i due i hours ago if it is among the first number_due, else not due """
+
+    with open("decks/" + deck_name + ".json", encoding="utf-8") as f:
+        deck = json.load(f)
+
+    now = datetime.now()
+    for i, card in enumerate(deck["flashcards"]):
+        if i < number_due:
+            card["last_review"] = (now - timedelta(hours=i + 1)).strftime(TIME_FORMAT)
+        else:
+            card["last_review"] = now.strftime(TIME_FORMAT)
+            card["mem_level"] = 8
+
+    with open("decks/" + deck_name + ".json", "w", encoding="utf-8") as f:
+        json.dump(deck, f)
+    json_to_sqlite("decks/" + deck_name + ".json", "decks/" + deck_name + ".sqlite")
+
+@pytest.mark.parametrize("number_due", [1000, 50])
+def test_next_card_is_any_due_card(make_deck, number_due):
+    # every card due draws random ids, few cards due walk the due_time index
+    make_deck("uniform", 1000)
+    spread_due_times("uniform", number_due)
+    deck = SQLiteFlashcardDeck("uniform")
+    assert deck.get_number_pending() == number_due
+
+    picks = []
+    for _ in range(400):
+        card = deck.get_next_flashcard()
+        picks.append(card.get_id())
+        deck.put_back_flashcard(card)
+
+    # the cards due the longest don't come first, all of them are as likely
+    assert all(card_id < number_due for card_id in picks)
+    assert min(picks) < number_due // 4 and max(picks) >= number_due * 3 // 4
+    assert len(set(picks)) > min(number_due, 400) // 2
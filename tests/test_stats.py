@@ -0,0 +1,51 @@
+import pytest
+
+from deck import FlashcardDeck
+from stats import DeckStats
+
+def open_json(deck_name):
+    return FlashcardDeck(deck_name)
+
+def open_sqlite(deck_name):
+    from sqlite_deck import SQLiteFlashcardDeck, json_to_sqlite
+    json_to_sqlite("decks/" + deck_name + ".json", "decks/" + deck_name + ".sqlite")
+    return SQLiteFlashcardDeck(deck_name)
+
+def open_binary(deck_name):
+    pytest.importorskip("numpy")
+    from binary_deck import BinaryFlashcardDeck, json_to_binary
+    json_to_binary("decks/" + deck_name + ".json", "decks/" + deck_name + ".deck")
+    return BinaryFlashcardDeck(deck_name)
+
+BACKENDS = [open_json, open_sqlite, open_binary]
+
+@pytest.mark.parametrize("open_backend", BACKENDS)
+def test_incremental_stats_match_rebuilt(make_deck, open_backend):
+    make_deck("stats", 30)
+    deck = open_backend("stats")
+    deck.get_stats()
+
+    for answer in (True, True, False, True, False):
+        deck.log_answer(deck.get_next_flashcard(), answer)
+    deck.add_flashcard("new front", "new back", "")
+
+    assert deck.get_stats().to_dict() == deck.build_stats().to_dict()
+
+    stats = deck.get_stats()
+    assert sum(stats.get_forecast(days=1000)) == 31
+    assert stats.get_retention() == (5, 3)
+
+@pytest.mark.parametrize("open_backend", BACKENDS)
+def test_stats_survive_reopening(make_deck, open_backend):
+    make_deck("reopen", 10)
+    deck = open_backend("reopen")
+
+    for answer in (True, False, True):
+        deck.log_answer(deck.get_next_flashcard(), answer)
+    stats = deck.get_stats().to_dict()
+    deck.close()
+
+    # the backend is reopened from its own file, not converted again
+    deck = type(deck)("reopen")
+    assert deck.build_stats().to_dict() == stats
+    assert DeckStats.from_dict(stats).to_dict() == stats
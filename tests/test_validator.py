@@ -0,0 +1,147 @@
+import json
+from datetime import datetime
+
+from deck import SCHEMA_VERSION, FlashcardDeck
+from validator import INVALID, OK, OUTDATED, UPGRADED, check_deck, normalize_time, validate_deck_file, validate_decks
+
+NOW = "2020-01-01 12:00:00.000000"
+
+def read_deck(deck_name):
+    with open("decks/" + deck_name + ".json", encoding="utf-8") as f:
+        return json.load(f)
+
+def write_deck(deck_name, deck_dict):
+    with open("decks/" + deck_name + ".json", "w", encoding="utf-8") as f:
+        json.dump(deck_dict, f)
+
+def card(**fields):
+    """ a valid card dict with the given fields changed, None removes a field """
+
+    card_dict = {'id': 0, 'front': "front", 'back': "back", 'notes': "",
+                 'last_review': "2000-01-01 00:00:00.000000", 'mem_level': 0}
+    card_dict.update(fields)
+    return {field: value for field, value in card_dict.items() if value is not None}
+
+def test_times_are_normalized():
+    assert normalize_time("2000-01-02 03:04:05") == "2000-01-02 03:04:05.000000"
+    assert normalize_time("2000-01-02T03:04:05.5") == "2000-01-02 03:04:05.500000"
+    assert normalize_time(datetime(2000, 1, 2, 3, 4, 5).timestamp()) == "2000-01-02 03:04:05.000000"
+
+def test_legacy_deck_is_upgraded(make_deck):
+    make_deck("legacy", 3)
+    deck_dict = read_deck("legacy")
+
+    fixes, errors = check_deck(deck_dict)
+
+    assert errors == []
+    # make_deck writes its times without microseconds
+    assert fixes == {"id missing": 3, "last_review normalized": 3}
+    assert list(deck_dict) == ["schema_version", "srs_method", "next_card_id", "flashcards"]
+    assert deck_dict['schema_version'] == SCHEMA_VERSION
+    assert deck_dict['next_card_id'] == 3
+
+    # the cards keep the ids the app gives them when it loads the old file
+    assert [list(card_dict)[:2] for card_dict in deck_dict['flashcards']] == [["id", "front"]] * 3
+    write_deck("legacy", deck_dict)
+    assert dict(FlashcardDeck("legacy").iter_fronts()) == {0: "front 0", 1: "front 1", 2: "front 2"}
+
+def test_card_fixes():
+    deck_dict = {'srs_method': "Fibonacci", 'flashcards': [
+        card(notes=None),
+        card(id=1, last_review=None),
+        card(id=2, last_review="2000-01-01T00:00:00.5"),
+        card(id=3, mem_level=2.0),
+        card(id=4, mem_level=None),
+    ]}
+
+    fixes, errors = check_deck(deck_dict, NOW)
+
+    assert errors == []
+    assert fixes == {
+        "notes missing": 1,
+        "last_review missing, set to now": 1,
+        "last_review normalized": 1,
+        "mem_level written as a float": 1,
+        "mem_level missing, set to 0": 1,
+    }
+    cards = deck_dict['flashcards']
+    assert cards[0]['notes'] == ""
+    assert cards[1]['last_review'] == NOW
+    assert cards[2]['last_review'] == "2000-01-01 00:00:00.500000"
+    assert type(cards[3]['mem_level']) == int
+    assert cards[4]['mem_level'] == 0
+
+def test_card_errors():
+    deck_dict = {'srs_method': "Fibonacci", 'flashcards': [
+        card(front=None),
+        card(id=1, back=3),
+        card(id=2, last_review="yesterday"),
+        card(id=3, mem_level=-1),
+        card(id="4"),
+        card(id=5),
+        card(id=5),
+        "not a card",
+    ]}
+
+    fixes, errors = check_deck(deck_dict, NOW)
+
+    assert errors == [
+        "card 0: front is missing",
+        "card 1: back is not text",
+        "card 2: last_review is not a time: 'yesterday'",
+        "card 3: mem_level is not a level: -1",
+        "card 4: id is not a card id: '4'",
+        "card 6: id 5 is used by another card",
+        "card 7: is not an object",
+    ]
+
+    # a deck with errors is not laid out again
+    assert "schema_version" not in deck_dict
+
+def test_deck_errors():
+    assert check_deck([])[1] == ["the file is not a deck object"]
+    assert check_deck({'schema_version': SCHEMA_VERSION + 1, 'flashcards': []})[1] == [
+        "written with schema version {}, newer than this version of the app ({})".format(
+            SCHEMA_VERSION + 1, SCHEMA_VERSION)]
+    assert check_deck({'srs_method': "Leitner", 'next_card_id': -1, 'flashcards': {}})[1] == [
+        "unknown srs_method: 'Leitner'",
+        "next_card_id is not a card id: -1",
+        "flashcards is not a list",
+    ]
+
+def test_migrate_deck_file(make_deck):
+    make_deck("old", 2)
+    file_name = "decks/old.json"
+
+    assert validate_deck_file(file_name)['status'] == OUTDATED
+    assert "schema_version" not in read_deck("old")
+
+    report = validate_deck_file(file_name, migrate=True)
+    assert (report['status'], report['version'], report['cards']) == (UPGRADED, 0, 2)
+    assert report['fixes'] == {"id missing": 2, "last_review normalized": 2}
+    assert validate_deck_file(file_name)['status'] == OK
+
+def test_invalid_deck_file_is_left_alone(make_deck):
+    make_deck("broken", 2)
+    deck_dict = read_deck("broken")
+    deck_dict['flashcards'][1]['mem_level'] = "high"
+    write_deck("broken", deck_dict)
+
+    report = validate_deck_file("decks/broken.json", migrate=True)
+
+    assert report['status'] == INVALID
+    assert report['errors'] == ["card 1: mem_level is not a level: 'high'"]
+    assert read_deck("broken") == deck_dict
+
+    with open("decks/torn.json", "w", encoding="utf-8") as f:
+        f.write('{"flashcards": [')
+    assert validate_deck_file("decks/torn.json")['status'] == INVALID
+
+def test_decks_checked_in_workers(make_deck):
+    make_deck("first", 10)
+    make_deck("second", 20)
+
+    reports = list(validate_decks(["decks/first.json", "decks/second.json"], migrate=True, processes=2))
+
+    assert sorted((report['cards'], report['status']) for report in reports) == [(10, UPGRADED), (20, UPGRADED)]
+    assert read_deck("second")['next_card_id'] == 20
@@ -0,0 +1,80 @@
+import os
+
+import pytest
+
+import writer
+from deck import FlashcardDeck
+from writer import DeckWriteError
+
+def fail_appends(monkeypatch, journal, times):
+    """ make the journal's next appends fail with an OSError """
+
+    append_many = journal.append_many
+    failures = [times]
+
+    def flaky_append_many(records):
+        if failures[0]:
+            failures[0] -= 1
+            raise OSError("disk full")
+        append_many(records)
+
+    monkeypatch.setattr(journal, "append_many", flaky_append_many)
+
+def test_failed_write_is_reported_and_retried(make_deck, monkeypatch):
+    make_deck("flaky", 10)
+    deck = FlashcardDeck("flaky")
+    deck.enable_background_writes()
+    fail_appends(monkeypatch, deck.journal, 1)
+
+    deck.add_flashcard("first", "back", "")
+    with pytest.raises(DeckWriteError):
+        deck.writer.flush()
+
+    # the writer thread survived, and kept the failed record for the next write
+    assert deck.writer.thread.is_alive()
+    deck.add_flashcard("second", "back", "")
+    deck.writer.flush()
+
+    fronts = [front for _, front in FlashcardDeck("flaky").iter_fronts()]
+    assert "first" in fronts and "second" in fronts
+    deck.close()
+
+def test_close_reports_a_failure(make_deck, monkeypatch):
+    make_deck("broken", 3)
+    deck = FlashcardDeck("broken")
+    deck.enable_background_writes()
+    fail_appends(monkeypatch, deck.journal, 100)
+
+    deck.add_flashcard("lost", "back", "")
+    with pytest.raises(DeckWriteError):
+        deck.close()
+
+    assert deck.writer is None or not deck.writer.thread.is_alive()
+
+def test_close_folds_the_journal(make_deck):
+    make_deck("closed", 5)
+    deck = FlashcardDeck("closed")
+    deck.enable_background_writes()
+
+    card = deck.get_next_flashcard()
+    deck.log_answer(card, True)
+    thread = deck.writer.thread
+    deck.close()
+
+    assert not thread.is_alive()
+    assert not os.path.exists("decks/closed.journal")
+    assert FlashcardDeck("closed").get_flashcard(card.get_id()).get_mem_level() == 1
+
+def test_unclosed_writers_are_closed_at_exit(make_deck):
+    make_deck("unclosed", 5)
+    deck = FlashcardDeck("unclosed")
+    deck.enable_background_writes()
+    deck.add_flashcard("kept", "back", "")
+
+    # the writer thread doesn't keep the interpreter alive
+    assert deck.writer.thread.daemon
+    writer.close_writers()
+
+    assert deck.writer not in writer.running_writers
+    assert not os.path.exists("decks/unclosed.journal")
+    assert "kept" in [front for _, front in FlashcardDeck("unclosed").iter_fronts()]
@@ -0,0 +1,304 @@
+import os
+import sys
+import json
+import time
+import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from deck import DECK_DIRECTORY, SCHEMA_VERSION, TIME_FORMAT, assign_card_ids, list_decks
+from journal import write_json_atomic
+from schedulers import SCHEDULERS
+
+# states of a checked deck file
+OK = "ok"
+OUTDATED = "outdated"
+UPGRADED = "upgraded"
+INVALID = "invalid"
+
+# problems listed for each deck, the rest are only counted
+MAX_REPORTED_ERRORS = 20
+
+# card fields in the order the app writes them, other fields follow
+CARD_FIELDS = ("id", "front", "back", "notes", "last_review", "mem_level", "srs_data")
+
+def normalize_time(value):
+    """
+    Return a stored review time in TIME_FORMAT. Accepts the ISO times
+    written by str() or by other tools, with or without microseconds or a
+    time zone, and POSIX timestamps. Raises ValueError for anything else.
+    """
+
+    if type(value) == str:
+        t = datetime.fromisoformat(value.strip())
+    elif type(value) in (int, float):
+        try:
+            t = datetime.fromtimestamp(value)
+        except (OverflowError, OSError):
+            raise ValueError("timestamp out of range")
+    else:
+        raise ValueError("not a time")
+
+    # the app keeps local times without a zone
+    if t.tzinfo is not None:
+        t = t.astimezone().replace(tzinfo=None)
+
+    return t.strftime(TIME_FORMAT)
+
+def check_card(card, fixes, errors, now):
+    """
+    Check a card dict of a deck file and upgrade it in place, counting
+    what was changed in fixes and adding what can't be fixed to errors.
+    """
+
+    if type(card) != dict:
+        errors.append("is not an object")
+        return
+
+    for field in ("front", "back"):
+        if field not in card:
+            errors.append(field + " is missing")
+        elif type(card[field]) != str:
+            errors.append(field + " is not text")
+
+    # early decks, like the example decks, had no notes
+    if card.get('notes') is None:
+        card['notes'] = ""
+        fixes["notes missing"] += 1
+    elif type(card['notes']) != str:
+        errors.append("notes is not text")
+
+    last_review = card.get('last_review')
+    if last_review is None:
+        card['last_review'] = now
+        fixes["last_review missing, set to now"] += 1
+    else:
+        try:
+            normalized = normalize_time(last_review)
+        except ValueError:
+            errors.append("last_review is not a time: {!r}".format(last_review))
+        else:
+            if normalized != last_review:
+                card['last_review'] = normalized
+                fixes["last_review normalized"] += 1
+
+    mem_level = card.get('mem_level')
+    if mem_level is None:
+        card['mem_level'] = 0
+        fixes["mem_level missing, set to 0"] += 1
+    elif type(mem_level) == float and mem_level.is_integer() and mem_level >= 0:
+        card['mem_level'] = int(mem_level)
+        fixes["mem_level written as a float"] += 1
+    elif type(mem_level) != int or mem_level < 0:
+        errors.append("mem_level is not a level: {!r}".format(mem_level))
+
+    card_id = card.get('id')
+    if card_id is None:
+        fixes["id missing"] += 1
+    elif type(card_id) != int or card_id < 0:
+        errors.append("id is not a card id: {!r}".format(card_id))
+
+    if card.get('srs_data') is not None and type(card['srs_data']) != dict:
+        errors.append("srs_data is not an object")
+
+def order_card_fields(card):
+    """ return a card dict with its fields in the order the app writes them """
+
+    ordered = {field: card[field] for field in CARD_FIELDS if field in card}
+    ordered.update(card)
+    return ordered
+
+def check_deck(deck_dict, now=None):
+    """
+    Check the contents of a deck file and upgrade them in place to the
+    current schema. Returns (fixes, errors): a Counter of the cards
+    changed for each reason and a list of the problems that can't be
+    fixed, in which case the deck may be partly upgraded and shouldn't
+    be written.
+    """
+
+    fixes = Counter()
+    errors = []
+
+    if type(deck_dict) != dict:
+        return fixes, ["the file is not a deck object"]
+
+    version = deck_dict.get('schema_version', 0)
+    if type(version) != int:
+        return fixes, ["schema_version is not a number: {!r}".format(version)]
+    if version > SCHEMA_VERSION:
+        return fixes, ["written with schema version {}, newer than this version of the app ({})".format(
+            version, SCHEMA_VERSION)]
+
+    if 'srs_method' not in deck_dict:
+        errors.append("srs_method is missing")
+    elif deck_dict['srs_method'] not in SCHEDULERS:
+        errors.append("unknown srs_method: {!r}".format(deck_dict['srs_method']))
+
+    next_card_id = deck_dict.get('next_card_id', 0)
+    if type(next_card_id) != int or next_card_id < 0:
+        errors.append("next_card_id is not a card id: {!r}".format(next_card_id))
+
+    cards = deck_dict.get('flashcards')
+    if type(cards) != list:
+        errors.append("flashcards is not a list")
+        return fixes, errors
+
+    now = now or datetime.now().strftime(TIME_FORMAT)
+    card_errors = []
+    seen_ids = set()
+
+    for i, card in enumerate(cards):
+        check_card(card, fixes, card_errors, now)
+
+        if card_errors:
+            errors.extend("card {}: {}".format(i, error) for error in card_errors)
+            card_errors.clear()
+            continue
+
+        card_id = card.get('id')
+        if card_id is not None:
+            if card_id in seen_ids:
+                errors.append("card {}: id {} is used by another card".format(i, card_id))
+            seen_ids.add(card_id)
+
+    if errors:
+        return fixes, errors
+
+    # ids are given the same way as when the deck is loaded, so the card
+    # numbers in the deck's journal and history stay the same
+    next_card_id = assign_card_ids(cards, next_card_id)
+
+    # laid out like a deck file written by the app
+    settings = {key: value for key, value in deck_dict.items()
+                if key not in ("schema_version", "next_card_id", "flashcards")}
+    deck_dict.clear()
+    deck_dict['schema_version'] = SCHEMA_VERSION
+    deck_dict.update(settings)
+    deck_dict['next_card_id'] = next_card_id
+    deck_dict['flashcards'] = [order_card_fields(card) for card in cards]
+
+    return fixes, errors
+
+def validate_deck_file(file_name, migrate=False):
+    """
+    Check a JSON deck file and, if migrate is set and nothing is wrong
+    with it, rewrite it upgraded to the current schema. Runs in a worker
+    process, so it returns a small report rather than the deck.
+    """
+
+    report = {'file_name': file_name, 'status': OK, 'version': None, 'cards': 0,
+              'fixes': {}, 'errors': [], 'error_count': 0}
+
+    try:
+        with open(file_name, "r", encoding="utf-8") as f:
+            deck_dict = json.load(f)
+    except (OSError, ValueError) as e:
+        report.update(status=INVALID, errors=["can't be read: " + str(e)], error_count=1)
+        return report
+
+    if type(deck_dict) == dict:
+        report['version'] = deck_dict.get('schema_version', 0)
+        if type(deck_dict.get('flashcards')) == list:
+            report['cards'] = len(deck_dict['flashcards'])
+
+    fixes, errors = check_deck(deck_dict)
+    report['fixes'] = dict(fixes)
+    report['errors'] = errors[:MAX_REPORTED_ERRORS]
+    report['error_count'] = len(errors)
+
+    if errors:
+        report['status'] = INVALID
+    elif fixes or report['version'] != SCHEMA_VERSION:
+        report['status'] = OUTDATED
+
+    if report['status'] == OUTDATED and migrate:
+        # the old file stays intact until the new one is renamed over it
+        write_json_atomic(file_name, deck_dict)
+        report['status'] = UPGRADED
+
+    return report
+
+def validate_decks(file_names, migrate=False, processes=None):
+    """
+    Check deck files in a pool of worker processes, one deck per task,
+    yielding each report as soon as its deck is done.
+    """
+
+    # the largest decks go first, so no worker is left with one at the end
+    file_names = sorted(file_names, key=lambda name: -os.path.getsize(name) if os.path.exists(name) else 0)
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [executor.submit(validate_deck_file, file_name, migrate) for file_name in file_names]
+        for future in as_completed(futures):
+            yield future.result()
+
+def format_report(report):
+    """ return the lines describing a deck's report """
+
+    deck_name = os.path.splitext(os.path.basename(report['file_name']))[0]
+    status = report['status']
+    if status in (OUTDATED, UPGRADED):
+        status += " from schema version {}".format(report['version'])
+    lines = ["{}: {} ({} cards)".format(deck_name, status, report['cards'])]
+
+    # an invalid deck is left as it is, whatever could have been fixed
+    if report['status'] != INVALID:
+        for fix, n in sorted(report['fixes'].items()):
+            lines.append("    {}: {} card{}".format(fix, n, "s" if n != 1 else ""))
+
+    for error in report['errors']:
+        lines.append("    error: " + error)
+    if report['error_count'] > len(report['errors']):
+        lines.append("    ... and {} more errors".format(report['error_count'] - len(report['errors'])))
+
+    return lines
+
+def main():
+    """ check every deck file, or the given ones, and upgrade them if asked """
+
+    parser = argparse.ArgumentParser(description="Check deck files and upgrade them to the current schema.")
+    parser.add_argument("deck_names", nargs="*", help="decks to check (default: all)")
+    parser.add_argument("--migrate", action="store_true", help="rewrite outdated decks in the current schema")
+    parser.add_argument("--directory", default=DECK_DIRECTORY, help="deck directory (default: %(default)s)")
+    parser.add_argument("--processes", type=int, help="worker processes (default: one per core)")
+    args = parser.parse_args()
+
+    directory = os.path.join(args.directory, "")
+
+    # a running deck server holds the decks in memory and would write
+    # the old cards back over the upgraded files
+    if args.migrate:
+        from remote_deck import get_server_address
+        if get_server_address(directory) is not None:
+            sys.exit("the deck server is running, stop it before migrating decks")
+
+    # SQLite and binary decks are written in their current layout by
+    # their converters, only JSON deck files are checked
+    file_names = []
+    for deck_name in args.deck_names or list_decks(directory):
+        file_name = directory + deck_name + ".json"
+        if os.path.exists(file_name):
+            file_names.append(file_name)
+        else:
+            print("{}: no JSON deck file, skipped".format(deck_name))
+
+    start = time.perf_counter()
+    statuses = Counter()
+    for report in validate_decks(file_names, args.migrate, args.processes):
+        statuses[report['status']] += 1
+        for line in format_report(report):
+            print(line)
+
+    print("{} decks checked in {:.2f}s: {}".format(
+        len(file_names), time.perf_counter() - start,
+        ", ".join("{} {}".format(statuses[status], status) for status in (OK, OUTDATED, UPGRADED, INVALID))))
+    if statuses[OUTDATED]:
+        print("run again with --migrate to upgrade the outdated decks")
+
+    if statuses[INVALID]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
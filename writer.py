@@ -0,0 +1,141 @@
+import sys
+import queue
+import atexit
+import threading
+import time
+
+# how long to wait for more changes before writing them out together
+WRITE_DELAY = 0.25
+
+# writers that haven't been closed, closed at exit by close_writers
+running_writers = set()
+
+class DeckWriteError(Exception):
+    """ raised by flush() and close() when writing a deck in the background failed """
+
+class DeckWriter:
+    """
+    DeckWriter Class
+        Writes a deck's journal records and deck file on a background
+        thread, so answering or adding a card never waits on the disk.
+        Changes arriving close together are written in a single append,
+        and repeated save requests are folded into a single deck write.
+    """
+
+    def __init__(self, deck):
+        self.deck = deck
+        self.queue = queue.Queue()
+
+        # the last write error, cleared once a write succeeds again
+        self.error = None
+
+        # a daemon thread, so a script that never closes its deck can still
+        # exit, with what it left queued written by close_writers
+        self.thread = threading.Thread(target=self.run, name="DeckWriter-" + deck.get_deck_name(), daemon=True)
+        self.thread.start()
+        running_writers.add(self)
+
+    def log_change(self, record):
+        """ queue a journal record """
+        self.queue.put(("record", record))
+
+    def request_save(self):
+        """ queue a write of the whole deck file """
+        self.queue.put(("save", None))
+
+    def flush(self):
+        """ block until everything queued so far is on disk, raises DeckWriteError if it couldn't be """
+
+        if self.thread.is_alive():
+            done = threading.Event()
+            self.queue.put(("flush", done))
+            done.wait()
+
+        self.check_error()
+
+    def close(self):
+        """ write out everything queued, fold the journal into the deck file and stop """
+
+        self.queue.put(("close", None))
+        self.thread.join()
+        running_writers.discard(self)
+
+        self.check_error()
+
+    def check_error(self):
+        """ raise DeckWriteError if the last write failed """
+
+        if self.error is not None:
+            raise DeckWriteError("writing deck {} failed: {}".format(
+                self.deck.get_deck_name(), self.error)) from self.error
+
+    def collect(self):
+        """ wait for a change, then gather the ones that follow shortly after """
+
+        items = [self.queue.get()]
+        deadline = time.monotonic() + WRITE_DELAY
+
+        while items[-1][0] == "record":
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                items.append(self.queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+
+        # anything else already queued can go out in the same write
+        while True:
+            try:
+                items.append(self.queue.get_nowait())
+            except queue.Empty:
+                return items
+
+    def run(self):
+        """ write queued changes until the writer is closed """
+
+        journal = self.deck.journal
+        closing = False
+
+        # records not in the journal yet and a deck write not done yet, kept
+        # when a write fails and tried again along with the next change
+        records = []
+        save = False
+
+        while not closing:
+            items = self.collect()
+            records += [value for kind, value in items if kind == "record"]
+            kinds = {kind for kind, _ in items}
+            save = save or "save" in kinds
+            closing = "close" in kinds
+
+            try:
+                if records:
+                    journal.append_many(records)
+                    records = []
+
+                if save or journal.needs_compaction() or (closing and not journal.is_empty()):
+                    self.deck.write_deck()
+                    save = False
+
+                self.error = None
+
+            except Exception as e:
+                self.error = e
+                print("error writing deck {}, {} changes kept to retry: {!r}".format(
+                    self.deck.get_deck_name(), len(records), e), file=sys.stderr)
+
+            # never leave a caller of flush() waiting, even if a write failed
+            for kind, value in items:
+                if kind == "flush":
+                    value.set()
+
+@atexit.register
+def close_writers():
+    """ write out the changes of decks a script didn't close before exiting """
+
+    for writer in list(running_writers):
+        try:
+            writer.close()
+        except DeckWriteError as e:
+            print(e, file=sys.stderr)